@@ -0,0 +1,52 @@
+"""jwt签名算法性能测试
+
+python -m benchmarks.crypto [--seconds 1]
+"""
+from typing import Callable
+
+import time
+import argparse
+
+from catm import jws
+
+
+def throughput(func: Callable[[], object], seconds: float) -> float:
+    """在指定时间内重复执行, 返回每秒执行次数.
+
+    Args:
+        func (Callable[[], object]): 测试函数.
+        seconds (float): 测试时长.
+
+    Returns:
+        float: 每秒执行次数.
+    """
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(10):
+            func()
+        count += 10
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=1.0, help="每项测试时长(秒)")
+    args = parser.parse_args()
+    # 与jwt签名的消息长度相近
+    message = b"e" * 64 + b"." + b"p" * 160
+    print(f"{'alg':<8}{'sign/s':>12}{'verify/s':>12}{'signature':>12}")
+    for name, algorithm in jws.ALGORITHMS.items():
+        private_key = algorithm.generate()
+        public_key = private_key.public_key()
+        signature = algorithm.sign(private_key, message)
+        sign = throughput(lambda: algorithm.sign(private_key, message), args.seconds)
+        verify = throughput(lambda: algorithm.verify(public_key, signature, message), args.seconds)
+        print(f"{name:<8}{sign:>12.0f}{verify:>12.0f}{len(signature):>11}B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""接口压测
+
+在进程内启动 catm.main.app, 数据库使用SQLite, redis使用fakeredis, 文件存储使用临时目录,
+不依赖外部服务. 每个场景按指定并发执行, 输出吞吐量和延迟分位数, 可与基线比较.
+
+python -m benchmarks.load [--requests 200] [--concurrency 16] [--scenario music_reads]
+                          [--baseline benchmarks/baseline.json] [--save-baseline] [--threshold 0.2]
+"""
+from typing import Awaitable, Callable, Dict, List
+
+import os
+import sys
+import json
+import time
+import base64
+import struct
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+from dataclasses import dataclass, asdict
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+
+
+PASSWORD = "benchmark-password"
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def make_m4a(duration: int, size: int) -> bytes:
+    """生成能通过结构校验的m4a文件, 音频数据随机.
+
+    Args:
+        duration (int): 时长(秒).
+        size (int): 音频数据大小.
+
+    Returns:
+        bytes: 文件内容.
+    """
+    ftyp = _box(b"ftyp", b"M4A \x00\x00\x00\x00M4A mp42isom")
+    mvhd = _box(b"mvhd", b"\x00" * 4 + struct.pack(">IIII", 0, 0, 1000, duration * 1000) + b"\x00" * 80)
+
+    def moov(offset: int) -> bytes:
+        stco = _box(b"stco", b"\x00" * 4 + struct.pack(">II", 1, offset))
+        return _box(b"moov", mvhd + _box(b"trak", _box(b"mdia", _box(b"minf", _box(b"stbl", stco)))))
+
+    offset = len(ftyp) + len(moov(0)) + 8
+    return ftyp + moov(offset) + _box(b"mdat", random.randbytes(size))
+
+
+@dataclass
+class Result:
+    """场景结果"""
+
+    requests: int
+    errors: int
+    rps: float
+    p50: float
+    p95: float
+    p99: float
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    """延迟分位数(毫秒).
+
+    Args:
+        latencies (List[float]): 已排序的延迟(秒).
+        q (float): 分位, 0~1.
+
+    Returns:
+        float: 延迟(毫秒).
+    """
+    if not latencies:
+        return 0.0
+    index = min(len(latencies) - 1, max(0, round(q * len(latencies)) - 1))
+    return latencies[index] * 1000
+
+
+async def measure(request: Callable[[int], Awaitable[bool]], requests: int, concurrency: int) -> Result:
+    """并发执行请求并统计.
+
+    Args:
+        request (Callable[[int], Awaitable[bool]]): 请求函数, 参数为序号, 返回是否成功.
+        requests (int): 请求总数.
+        concurrency (int): 并发数.
+
+    Returns:
+        Result: 统计结果.
+    """
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ok = await request(i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return Result(
+        requests=requests,
+        errors=errors,
+        rps=round(requests / elapsed, 1),
+        p50=round(percentile(latencies, 0.50), 2),
+        p95=round(percentile(latencies, 0.95), 2),
+        p99=round(percentile(latencies, 0.99), 2),
+    )
+
+
+class Benchmark:
+    """压测场景, 准备数据后逐个执行"""
+
+    def __init__(self, client, music_count: int = 200, audio_size: int = 1024 * 1024) -> None:
+        """初始化.
+
+        Args:
+            client (httpx.AsyncClient): 连接到app的客户端.
+            music_count (int, optional): 预先创建的音乐数量.
+            audio_size (int, optional): 播放场景的音频大小.
+        """
+        self.client = client
+        self.music_count = music_count
+        self.audio_size = audio_size
+        self.music_ids: List[str] = []
+        self.audio_id = ""
+        self.users = 0
+
+    async def encrypt(self, password: str) -> Dict[str, str]:
+        """获取RSA公钥加密密码, 与前端一致.
+
+        Returns:
+            Dict[str, str]: {"kid", "password"}.
+        """
+        key = (await self.client.get("/rsa")).json()
+        public_key = serialization.load_pem_public_key(key["public_key"].encode())
+        encrypted = public_key.encrypt(
+            password.encode(),
+            padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None),
+        )
+        return {"kid": key["kid"], "password": base64.b64encode(encrypted).decode()}
+
+    async def register(self) -> str:
+        """注册新用户.
+
+        Returns:
+            str: 用户名.
+        """
+        self.users += 1
+        username = f"bench{self.users}-{random.randbytes(4).hex()}"
+        response = await self.client.post("/user", json={"username": username, **await self.encrypt(PASSWORD)})
+        response.raise_for_status()
+        # 已登录用户的jwt通过请求头传递, 不使用cookie
+        self.client.cookies.clear()
+        return username
+
+    async def wait_ready(self, music_id: str) -> None:
+        """确认音频已通过校验."""
+        music = (await self.client.get(f"/music/read/{music_id}")).json()
+        if music.get("status") != "ready":
+            raise RuntimeError(f"audio {music_id} not verified")
+
+    async def setup(self) -> None:
+        """创建用户, 音乐和一个可播放的音频."""
+        response = await self.client.post(
+            "/user",
+            json={"username": f"bench-owner-{random.randbytes(4).hex()}", **await self.encrypt(PASSWORD)},
+        )
+        self.client.headers["jwt"] = response.cookies["jwt"]
+        self.client.cookies.clear()
+        for i in range(self.music_count):
+            response = await self.client.post(
+                "/music",
+                json={"name": f"music {i}", "play_url": "", "singer": [f"singer {i % 20}"]},
+            )
+            self.music_ids.append(response.json()["id"])
+        self.audio_id = self.music_ids[0]
+        await self.client.post(
+            f"/music/upload/audio/{self.audio_id}",
+            files={"audio": ("audio.m4a", make_m4a(180, self.audio_size), "audio/mp4")},
+        )
+        # 直接处理校验队列, fakeredis的阻塞读取被取消后无法退出, 不启动后台消费者
+        from catm.verify import MediaVerifier
+
+        verifier = MediaVerifier(block=None)
+        await verifier.ensure_group()
+        await verifier.process(await verifier.read())
+        await self.wait_ready(self.audio_id)
+
+    async def register_login(self, _: int) -> bool:
+        """注册后登录, 每次包含两次RSA解密和argon2."""
+        username = await self.register()
+        response = await self.client.post(
+            "/user/login",
+            json={"username": username, **await self.encrypt(PASSWORD)},
+        )
+        self.client.cookies.clear()
+        return response.status_code == 200 and "code" not in response.json()
+
+    async def user_read(self, _: int) -> bool:
+        """已登录用户查询信息, 包含jwt验签."""
+        response = await self.client.get("/user")
+        return response.status_code == 200
+
+    async def music_reads(self, _: int) -> bool:
+        """批量获取50首音乐."""
+        response = await self.client.post("/music/reads", json=random.sample(self.music_ids, 50))
+        return response.status_code == 200 and len(response.json()) == 50
+
+    async def audio_range(self, _: int) -> bool:
+        """播放时的Range请求, 每次64KB."""
+        start = random.randrange(0, self.audio_size - 65536)
+        response = await self.client.get(
+            f"/music/resources/audio/{self.audio_id}",
+            headers={"range": f"bytes={start}-{start + 65535}"},
+        )
+        return response.status_code == 206 and len(response.content) == 65536
+
+    async def upload(self, i: int) -> bool:
+        """上传不同内容的音频到各自的音乐."""
+        music_id = self.music_ids[1 + i % (len(self.music_ids) - 1)]
+        response = await self.client.post(
+            f"/music/upload/audio/{music_id}",
+            files={"audio": ("audio.m4a", make_m4a(180, 256 * 1024), "audio/mp4")},
+        )
+        return response.status_code == 200 and response.json() == "ok"
+
+
+SCENARIOS = ["register_login", "user_read", "music_reads", "audio_range", "upload"]
+
+
+def compare(results: Dict[str, Result], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """与基线比较, 吞吐量下降或p95上升超过阈值视为退化.
+
+    Args:
+        results (Dict[str, Result]): 本次结果.
+        baseline (Dict[str, dict]): 基线.
+        threshold (float): 阈值, 0.2 表示20%.
+
+    Returns:
+        List[str]: 退化说明.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result.rps < base["rps"] * (1 - threshold):
+            regressions.append(f"{name} rps {result.rps} < baseline {base['rps']}")
+        if result.p95 > base["p95"] * (1 + threshold):
+            regressions.append(f"{name} p95 {result.p95}ms > baseline {base['p95']}ms")
+    return regressions
+
+
+def prepare_env(storage: str) -> None:
+    """导入catm之前配置本地数据库和存储."""
+    os.environ["MYSQL_DB_URL"] = f"sqlite://{os.path.join(storage, 'catm.sqlite3')}"
+    os.environ["FILE_STORAGE"] = storage
+    os.environ["MEDIA_VERIFY_WORKERS"] = "0"
+    os.environ.setdefault("KEY_PAIR_COUNT", "4")
+    os.environ.setdefault("JWT_KEY_COUNT", "4")
+    os.environ.setdefault("TRACE_SLOW_THRESHOLD", "60000")
+    # 压测从同一个IP反复注册登录, 放开限流
+    os.environ.setdefault("AUTH_RATE_IP_LIMIT", "1000000")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Result]:
+    import httpx
+    import fakeredis
+    from tortoise import Tortoise
+
+    from aerich.models import Aerich
+
+    from catm import redis
+    from catm.main import app
+    from catm.startup import Startup
+    from catm.settings import APP_NAME, TORTOISE_ORM
+
+    # 模块均通过 redis.client 访问, 替换后生效
+    redis.client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    # 迁移为MySQL语法, 由模型直接建表后把全部迁移标记为已执行, 启动时的迁移检查直接通过
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+    await Aerich.bulk_create([
+        Aerich(version=version, app=APP_NAME, content={})
+        for version in Startup.migration_files()
+    ])
+    await Tortoise.close_connections()
+    results: Dict[str, Result] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            benchmark = Benchmark(client, audio_size=args.audio_size)
+            await benchmark.setup()
+            for name in args.scenario or SCENARIOS:
+                # 注册登录受argon2限制, 请求数减少
+                requests = max(args.concurrency, args.requests // 10) if name == "register_login" else args.requests
+                results[name] = await measure(getattr(benchmark, name), requests, args.concurrency)
+                result = results[name]
+                print(
+                    f"{name:<16}{result.requests:>8}{result.errors:>8}{result.rps:>10.1f}"
+                    f"{result.p50:>10.2f}{result.p95:>10.2f}{result.p99:>10.2f}"
+                )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发数")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="只执行指定场景, 可重复")
+    parser.add_argument("--audio-size", type=int, default=1024 * 1024, help="播放场景的音频大小")
+    parser.add_argument("--baseline", default=os.path.join(os.path.dirname(__file__), "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.2, help="退化阈值")
+    args = parser.parse_args()
+
+    storage = tempfile.mkdtemp(prefix="catm-bench-")
+    prepare_env(storage)
+    print(f"{'scenario':<16}{'requests':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(storage, ignore_errors=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump({name: asdict(result) for name, result in results.items()}, file, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        return
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
-from catm.api import rsa, user, music
+from catm.auth import TokenAuth
+from catm.api import rsa, user, music, event, admin, comment, playlist
 
 
 router = APIRouter()
@@ -23,3 +24,28 @@ router.include_router(
     prefix="/music",
     tags=["音乐"],
 )
+
+router.include_router(
+    playlist.router,
+    prefix="/playlist",
+    tags=["音乐推荐"],
+)
+
+router.include_router(
+    comment.router,
+    prefix="/comment",
+    tags=["评论"],
+)
+
+router.include_router(
+    event.router,
+    prefix="/events",
+    tags=["信息收集"],
+)
+
+router.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["管理"],
+    dependencies=[Depends(TokenAuth)],
+)
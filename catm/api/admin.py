@@ -0,0 +1,31 @@
+"""运维管理"""
+import structlog
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+
+from catm.profiler import profiler
+from catm.response import ErrorResponse
+
+
+router = APIRouter()
+log = structlog.getLogger()
+
+
+@router.get(
+    "/profile",
+    description="采样分析当前worker, 返回折叠栈, 可用 flamegraph.pl 或 speedscope 生成火焰图",
+    response_class=PlainTextResponse,
+)
+async def profile(seconds: float = Query(default=10, gt=0, le=profiler.max_seconds)):
+    """采样分析当前worker.
+
+    Args:
+        seconds (float): 采样秒数.
+
+    Returns:
+        PlainTextResponse: 折叠栈.
+    """
+    if profiler.running:
+        return ErrorResponse(code=600, msg="profiler is running", status_code=409)
+    log.info(f"profile {seconds}s")
+    return PlainTextResponse(await profiler.profile(seconds))
@@ -0,0 +1,166 @@
+"""评论"""
+from typing import List, Tuple
+from uuid import UUID
+from datetime import datetime
+
+from tortoise.expressions import F, Q
+from tortoise.transactions import in_transaction
+from fastapi import APIRouter, Depends, Body, Path, Query
+
+from catm import models
+from catm.db import read_replica
+from catm.auth import JwtAuth, Credential
+from catm.comments import comment_counter
+from catm.musiccache import music_cache
+from catm.response import ErrorResponse
+from catm.constants import CommentTargetType
+from catm.exceptions import InvalidCursorException
+from catm.pagination import encode_cursor, decode_cursor
+
+
+router = APIRouter()
+
+
+async def target_exists(target_type: CommentTargetType, target_id: UUID) -> bool:
+    """评论对象是否存在.
+
+    Args:
+        target_type (CommentTargetType): 评论对象类型.
+        target_id (UUID): 评论对象ID.
+
+    Returns:
+        bool: 是否存在.
+    """
+    if target_type == CommentTargetType.music:
+        return await music_cache.get(target_id) is not None
+    return await models.Playlist.filter(id=target_id).exists()
+
+
+def parse_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """解析 (created_at, id) 游标.
+
+    Args:
+        cursor (str): 游标.
+
+    Raises:
+        InvalidCursorException: 游标格式错误.
+
+    Returns:
+        Tuple[datetime, UUID]: 最后一条评论的创建时间和ID.
+    """
+    try:
+        created_at, id = decode_cursor(cursor, 2)
+        return datetime.fromisoformat(created_at), UUID(id)
+    except (TypeError, ValueError):
+        raise InvalidCursorException()
+
+
+def page(rows: List[dict], limit: int) -> dict:
+    """截取一页并生成下一页游标.
+
+    Args:
+        rows (List[dict]): 多查询一条的评论.
+        limit (int): 每页数量.
+
+    Returns:
+        dict: 评论列表和下一页游标.
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"].isoformat(), rows[-1]["id"])
+    return {"data": rows, "next_cursor": next_cursor}
+
+
+@router.post(
+    "",
+    description="发表评论或回复评论-(500 未查询到评论对象, 501 未查询到回复的评论)",
+)
+async def create(
+    credential: Credential = Depends(JwtAuth),
+    target_type: CommentTargetType = Body(),
+    target_id: UUID = Body(),
+    content: str = Body(min_length=1, max_length=1024),
+    parent_id: UUID | None = Body(default=None),
+):
+    if not await target_exists(target_type, target_id):
+        return ErrorResponse(code=500, msg="not found comment target")
+    # 回复数和评论在同一事务内写入, 评论写入失败时回复数不会多计
+    async with in_transaction() as conn:
+        if parent_id is not None:
+            # 只能回复同一对象下的一级评论
+            updated = await models.Comment.filter(
+                id=parent_id,
+                target_type=target_type.value,
+                target_id=target_id,
+                parent_id=None,
+            ).using_db(conn).update(reply_count=F("reply_count") + 1)
+            if not updated:
+                return ErrorResponse(code=501, msg="not found parent comment")
+        comment = await models.Comment.create(
+            target_type=target_type,
+            target_id=target_id,
+            user_id=credential.user_id,
+            parent_id=parent_id,
+            content=content,
+            using_db=conn,
+        )
+    await comment_counter.incr(target_type, target_id)
+    return comment
+
+
+@router.get(
+    "/list",
+    description="获取评论对象的一级评论, 按时间倒序游标分页-(301 游标错误)",
+    dependencies=[Depends(read_replica)],
+)
+async def list_comments(
+    target_type: CommentTargetType = Query(),
+    target_id: UUID = Query(),
+    cursor: str | None = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    query = models.Comment.filter(target_type=target_type.value, target_id=target_id, parent_id=None)
+    if cursor is not None:
+        try:
+            created_at, id = parse_cursor(cursor)
+        except InvalidCursorException:
+            return ErrorResponse(code=301, msg="invalid cursor")
+        # (created_at, id) < cursor
+        query = query.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id))
+    rows = await query.order_by("-created_at", "-id").limit(limit + 1).values()
+    return page(rows, limit)
+
+
+@router.get(
+    "/replies/{id}",
+    description="获取评论的回复, 按时间正序游标分页-(301 游标错误)",
+    dependencies=[Depends(read_replica)],
+)
+async def list_replies(
+    id: UUID = Path(),
+    cursor: str | None = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    query = models.Comment.filter(parent_id=id)
+    if cursor is not None:
+        try:
+            created_at, reply_id = parse_cursor(cursor)
+        except InvalidCursorException:
+            return ErrorResponse(code=301, msg="invalid cursor")
+        # (created_at, id) > cursor
+        query = query.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=reply_id))
+    rows = await query.order_by("created_at", "id").limit(limit + 1).values()
+    return page(rows, limit)
+
+
+@router.post(
+    "/counts",
+    description="批量获取评论数",
+    dependencies=[Depends(read_replica)],
+)
+async def counts(
+    target_type: CommentTargetType = Body(),
+    target_ids: List[UUID] = Body(max_length=500),
+):
+    return await comment_counter.counts(target_type, target_ids)
@@ -0,0 +1,23 @@
+"""行为事件收集"""
+from typing import List
+
+from fastapi import APIRouter, Depends, Body
+
+from catm import schemas
+from catm.events import event_buffer
+from catm.auth import JwtAuth, Credential
+
+
+router = APIRouter()
+
+
+@router.post(
+    "",
+    description="批量上报音乐行为事件-(106 请求过多, 稍后重试)",
+)
+async def create(
+    credential: Credential = Depends(JwtAuth),
+    events: List[schemas.MusicEvent] = Body(max_length=500),
+):
+    event_buffer.add(credential.user_id, events)
+    return "ok"
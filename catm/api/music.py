@@ -1,16 +1,33 @@
-from typing import Generator, List
+from typing import List
 
 import os
 from uuid import UUID
+from datetime import datetime
 
-from fastapi.responses import StreamingResponse
-from fastapi import APIRouter, Depends, Body, Path, UploadFile, File
+from tortoise.expressions import Q
+from fastapi import APIRouter, Depends, Body, Path, Query, UploadFile, File, Form, Header, Request
+from fastapi.responses import ORJSONResponse
 
-from catm import models
+from catm import models, schemas, verify
+from catm.blobstore import blob_store, blob_path
+from catm.exceptions import InvalidCursorException
+from catm.pagination import encode_cursor, decode_cursor
+from catm.musiccache import music_cache
+from catm.playlistcache import playlist_cache
+from catm.db import read_replica
+from catm.search import search_index
+from catm.tracing import span
+from catm.ranking import ranking
 from catm.settings import FILE_STORAGE
-from catm.response import ErrorResponse
+from catm.response import (
+    ErrorResponse,
+    RangeFileResponse,
+    NotModifiedResponse,
+    file_validators,
+    is_not_modified,
+)
 from catm.auth import JwtAuth, Credential
-from catm.constants import MusicStatus, MusicResourcesType
+from catm.constants import MusicStatus, MusicResourcesType, RankingChart, RESOURCES_CACHE_CONTROL
 
 
 router = APIRouter()
@@ -36,24 +53,27 @@ def resources_store_path(
     return dir + "/" + music_id
 
 
-def stream_resources(file_path: str, size: int = 4096) -> Generator[bytes, None, None]:
-    """流式读取音乐资源.
+def audio_store_path(music_id: str | UUID, sha256: str | None) -> str:
+    """获取音频存储路径, 兼容按音乐ID存储的旧音频.
 
     Args:
-        file_path (str): 文件路径.
-        size (int): 每次读取大小.
+        music_id (str | UUID): 音乐ID.
+        sha256 (str | None): 音频sha256.
 
-    Yields:
-        Generator[bytes]: 文件流.
+    Returns:
+        str: 音频存储路径.
     """
-    with open(file_path, 'rb') as f:
-        while chunk := f.read(size):
-            yield chunk
+    if sha256 is not None:
+        file_path = blob_path(sha256)
+        if os.path.exists(file_path):
+            return file_path
+    return resources_store_path(music_id, MusicResourcesType.audio)
 
 
 @router.post(
     "",
     description="创建音乐",
+    response_model=schemas.Music,
 )
 async def create(
     credential: Credential = Depends(JwtAuth),
@@ -68,38 +88,119 @@ async def create(
         creator=credential.user_id,
         status=MusicStatus.pending,
     )
-    return music
+    search_index.add(music.id, music.name, music.singer, music.status)
+    return schemas.Music.model_validate(music)
 
 
+# 以下接口的数据来自缓存或 values() 查询, 已是可序列化的dict, 直接用orjson输出,
+# 跳过 response_model 校验和 jsonable_encoder, response_model 只用于文档
 @router.get(
     "/read/{id}",
     description="获取音乐信息-(300 未查询到音乐)",
+    response_model=schemas.Music,
 )
 async def read(
     id: UUID = Path(),
 ):
-    music = await models.Music.get(id=id)
+    music = await music_cache.get(id)
     if music is None:
         return ErrorResponse(code=300, msg="not found music")
-    return music
+    return ORJSONResponse(music)
 
 
 @router.post(
     "/reads",
     description="获取音乐列表",
+    response_model=List[schemas.Music],
 )
 async def reads(
-    ids: List[int] = Body(),
+    ids: List[UUID] = Body(max_length=500),
+):
+    musics = await music_cache.get_many(ids)
+    return ORJSONResponse([music for music in musics.values() if music is not None])
+
+
+@router.get(
+    "/list",
+    description="获取当前用户上传的音乐列表, 游标分页-(301 游标错误)",
+    dependencies=[Depends(read_replica)],
+    response_model=schemas.MusicPage,
+)
+async def list_musics(
+    credential: Credential = Depends(JwtAuth),
+    cursor: str | None = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+    status: str | None = Query(default=None),
 ):
-    data = []
-    async for music in models.Music.filter(id__in=ids):
-        data.append(music)
-    return data
+    query = models.Music.filter(creator=credential.user_id)
+    if status is not None:
+        query = query.filter(status=status)
+    if cursor is not None:
+        try:
+            created_at, id = decode_cursor(cursor, 2)
+            created_at = datetime.fromisoformat(created_at)
+            id = UUID(id)
+        except (InvalidCursorException, TypeError, ValueError):
+            return ErrorResponse(code=301, msg="invalid cursor")
+        # (created_at, id) < cursor
+        query = query.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id))
+    rows = await query.order_by("-created_at", "-id").limit(limit + 1).values()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"].isoformat(), rows[-1]["id"])
+    return ORJSONResponse({"data": rows, "next_cursor": next_cursor})
+
+
+@router.get(
+    "/search",
+    description="按音乐名称和歌手搜索音乐-(301 游标错误)",
+    response_model=schemas.MusicPage,
+)
+async def search(
+    q: str = Query(min_length=1, max_length=64),
+    cursor: str | None = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    offset = 0
+    if cursor is not None:
+        try:
+            offset, = decode_cursor(cursor, 1)
+            offset = int(offset)
+        except (InvalidCursorException, TypeError, ValueError):
+            return ErrorResponse(code=301, msg="invalid cursor")
+    ids, more = search_index.search(q, limit=limit, offset=offset)
+    musics = await music_cache.get_many(ids)
+    next_cursor = encode_cursor(offset + limit) if more else None
+    return ORJSONResponse({
+        "data": [music for music in musics.values() if music is not None],
+        "next_cursor": next_cursor,
+    })
+
+
+@router.get(
+    "/chart/{chart}",
+    description="获取音乐排行榜",
+    response_model=List[schemas.ChartMusic],
+)
+async def chart(
+    chart: RankingChart = Path(),
+    offset: int = Query(default=0, ge=0, le=1000),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    top = await ranking.top(chart, offset, limit)
+    musics = await music_cache.get_many(id for id, _ in top)
+    return ORJSONResponse([
+        {**musics[id], "score": score}
+        for id, score in top
+        if musics[id] is not None
+    ])
 
 
 @router.put(
     "/update/{id}",
     description="更新音乐信息-(300 未查询到音乐)",
+    response_model=schemas.Music,
 )
 async def update(
     credential: Credential = Depends(JwtAuth),
@@ -115,27 +216,48 @@ async def update(
     music.play_url = play_url
     music.singer = singer
     await music.save()
-    return music
+    await music_cache.invalidate(id)
+    await playlist_cache.music_changed([id])
+    search_index.add(music.id, music.name, music.singer, music.status)
+    return schemas.Music.model_validate(music)
 
 
 @router.post(
     "/upload/audio/{id}",
-    description="上传音乐-(300 未查询到音乐)",
+    description="上传音乐, 提供sha256且音频已存在时无需上传文件-(300 未查询到音乐, 302 音频不存在需要上传, 303 sha256不一致)",
 )
 async def upload_audio(
     credential: Credential = Depends(JwtAuth),
     id: UUID = Path(),
-    audio: UploadFile = File(...),
+    audio: UploadFile | None = File(default=None),
+    sha256: str | None = Form(default=None, pattern=r"^[0-9a-f]{64}$"),
 ):
     if not await models.Music.filter(id=id, creator=credential.user_id).exists():
         return ErrorResponse(code=300, msg="not found music")
-    file_path = resources_store_path(id, MusicResourcesType.audio)
-    # 流式上传
-    with open(file_path, "wb") as file:
-        while chunk := await audio.read(1024):
-            file.write(chunk)
-    # TODO ylei 验证m4a文件完整性
-    await models.Music.filter(id=id).update(status=MusicStatus.ready)
+    staged = None
+    mime = "audio/m4a"
+    if audio is not None:
+        # 流式写入暂存文件并计算sha256
+        staged = await blob_store.stage(audio)
+        mime = audio.content_type or mime
+        if sha256 is not None and sha256 != staged.sha256:
+            os.unlink(staged.path)
+            return ErrorResponse(code=303, msg="sha256 mismatch")
+        sha256 = staged.sha256
+    elif sha256 is None:
+        return ErrorResponse(code=302, msg="audio not found, upload required")
+    blob = await blob_store.attach(id, sha256, mime, staged)
+    if blob is None:
+        return ErrorResponse(code=302, msg="audio not found, upload required")
+    # 旧版按音乐ID存储的音频不再使用
+    legacy_path = resources_store_path(id, MusicResourcesType.audio)
+    if os.path.exists(legacy_path):
+        os.unlink(legacy_path)
+    await music_cache.invalidate(id)
+    await playlist_cache.music_changed([id])
+    # 新音频异步校验m4a文件完整性, 已校验过的直接复用结果
+    if blob.status == MusicStatus.pending:
+        await verify.enqueue(id, blob_path(sha256), sha256)
     return "ok"
 
 
@@ -152,8 +274,9 @@ async def upload_cover(
         return ErrorResponse(code=300, msg="not found music")
     file_path = resources_store_path(id, MusicResourcesType.cover)
     # 流式上传
-    with open(file_path, "w") as file:
+    with span("file.write"), open(file_path, "w") as file:
         file.write(cover)
+    await music_cache.invalidate(id)
     return "ok"
 
 
@@ -170,29 +293,54 @@ async def upload_lyric(
         return ErrorResponse(code=300, msg="not found music")
     file_path = resources_store_path(id, MusicResourcesType.lyric)
     # 流式上传
-    with open(file_path, "w") as file:
+    with span("file.write"), open(file_path, "w") as file:
         file.write(lyric)
+    await music_cache.invalidate(id)
     return "ok"
 
 
 @router.get(
     "/resources/{type}/{id}",
-    description="获取音乐资源-(300 未查询到音乐)",
+    description="获取音乐资源, 支持Range请求-(300 未查询到音乐)",
+    dependencies=[Depends(read_replica)],
 )
 async def get_audio(
+    request: Request,
     id: UUID = Path(),
     type: MusicResourcesType = Path(),
+    range: str | None = Header(default=None),
+    if_range: str | None = Header(default=None),
 ):
-    file_path = resources_store_path(id, type)
-    if not await models.Music.filter(id=id).exists() or not os.path.exists(file_path):
+    if type == MusicResourcesType.audio:
+        music = await music_cache.get(id)
+        # 未校验或损坏的音频不提供播放
+        if music is None or music["status"] != MusicStatus.ready:
+            return ErrorResponse(code=300, msg="not found music")
+        file_path = audio_store_path(id, music["sha256"])
+    else:
+        file_path = resources_store_path(id, type)
+    try:
+        with span("file.stat"):
+            stat_result = os.stat(file_path)
+    except FileNotFoundError:
+        return ErrorResponse(code=300, msg="not found music")
+    validators = file_validators(stat_result, RESOURCES_CACHE_CONTROL[type])
+    # 客户端缓存有效, 不查询数据库也不读取文件
+    if is_not_modified(request.headers, validators):
+        return NotModifiedResponse(validators)
+    if type != MusicResourcesType.audio and not await models.Music.filter(id=id).exists():
         return ErrorResponse(code=300, msg="not found music")
-    total_length = os.path.getsize(file_path)
+    # If-Range不匹配时返回完整文件
+    if if_range is not None and if_range not in (validators["etag"], validators["last-modified"]):
+        range = None
     if type == MusicResourcesType.audio:
         media_type = 'audio/m4a'
     else:
         media_type = 'text/plain'
-    return StreamingResponse(
-        stream_resources(file_path), 
+    return RangeFileResponse(
+        file_path,
+        range_header=range,
+        headers=validators,
         media_type=media_type,
-        headers={'Content-Length': str(total_length)}
+        stat_result=stat_result,
     )
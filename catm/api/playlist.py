@@ -0,0 +1,94 @@
+"""推荐榜单"""
+from typing import List
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Body, Path, Request, Response
+from tortoise.transactions import in_transaction
+
+from catm import models
+from catm.auth import JwtAuth, Credential
+from catm.response import ErrorResponse, NotModifiedResponse, is_not_modified
+from catm.playlistcache import playlist_cache
+
+
+router = APIRouter()
+
+
+@router.post(
+    "",
+    description="创建榜单",
+)
+async def create(
+    credential: Credential = Depends(JwtAuth),
+    name: str = Body(max_length=128),
+    description: str | None = Body(default=None, max_length=1024),
+):
+    playlist = await models.Playlist.create(
+        name=name,
+        description=description,
+        creator=credential.user_id,
+    )
+    return playlist
+
+
+@router.get(
+    "/read/{id}",
+    description="获取榜单信息和音乐列表-(400 未查询到榜单)",
+)
+async def read(
+    request: Request,
+    id: UUID = Path(),
+):
+    playlist = await playlist_cache.get(id)
+    if playlist is None:
+        return ErrorResponse(code=400, msg="not found playlist")
+    validators = {"etag": playlist.etag, "cache-control": "no-cache"}
+    if is_not_modified(request.headers, validators):
+        return NotModifiedResponse(validators)
+    return Response(content=playlist.body, media_type="application/json", headers=validators)
+
+
+@router.put(
+    "/update/{id}",
+    description="更新榜单信息-(400 未查询到榜单)",
+)
+async def update(
+    credential: Credential = Depends(JwtAuth),
+    id: UUID = Path(),
+    name: str = Body(max_length=128),
+    description: str | None = Body(default=None, max_length=1024),
+):
+    playlist = await models.Playlist.get_or_none(id=id, creator=credential.user_id)
+    if playlist is None:
+        return ErrorResponse(code=400, msg="not found playlist")
+    playlist.name = name
+    playlist.description = description
+    await playlist.save(update_fields=["name", "description", "updated_at"])
+    await playlist_cache.playlist_changed(id)
+    return "ok"
+
+
+@router.put(
+    "/musics/{id}",
+    description="设置榜单音乐列表, 按顺序排列-(400 未查询到榜单)",
+)
+async def set_musics(
+    credential: Credential = Depends(JwtAuth),
+    id: UUID = Path(),
+    music_ids: List[UUID] = Body(max_length=500),
+):
+    music_ids = list(dict.fromkeys(music_ids))
+    # 删除和写入在同一事务内, 锁定榜单行串行化并发设置, 读取方不会看到空榜单
+    async with in_transaction() as conn:
+        playlist = await models.Playlist.filter(
+            id=id, creator=credential.user_id,
+        ).using_db(conn).select_for_update().first()
+        if playlist is None:
+            return ErrorResponse(code=400, msg="not found playlist")
+        await models.PlaylistMusic.filter(playlist_id=id).using_db(conn).delete()
+        await models.PlaylistMusic.bulk_create([
+            models.PlaylistMusic(playlist_id=id, music_id=music_id, position=position)
+            for position, music_id in enumerate(music_ids)
+        ], using_db=conn)
+    await playlist_cache.playlist_changed(id)
+    return "ok"
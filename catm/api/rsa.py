@@ -1,10 +1,8 @@
 """随机RSA密钥"""
-import random
-
 import structlog
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 
-from catm import models
+from catm.keyring import key_ring
 
 
 router = APIRouter()
@@ -21,10 +19,4 @@ async def read():
     Returns:
         dict: {"kid": uuid, "pub_key": pub_key}.
     """
-    kids = await models.KeyPair.all().only("id").values_list("id", flat=True)
-    kid = random.choice(kids)
-    key_pair = await models.KeyPair.all().only("public_key").get(id=kid)
-    return {
-        "kid": kid,
-        "public_key": key_pair.public_key,
-    }
+    return Response(content=key_ring.rand().body, media_type="application/json")
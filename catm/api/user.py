@@ -1,12 +1,24 @@
 """用户"""
 import os
+import asyncio
 from uuid import UUID
-
-from fastapi import APIRouter, Body, Response, Depends, Path
-
-from catm import models, schemas
-from catm.response import ErrorResponse
-from catm.settings import JWT_NAME, FILE_STORAGE
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, Body, Response, Depends, Path, Query, Request
+from fastapi.responses import FileResponse
+
+from catm import models, schemas, avatar
+from catm.db import read_replica
+from catm.exceptions import InvalidImageException, ServerBusyException
+from catm.constants import AvatarSize, AVATAR_CACHE_CONTROL
+from catm.response import (
+    ErrorResponse,
+    NotModifiedResponse,
+    file_validators,
+    is_not_modified,
+)
+from catm.settings import JWT_NAME
+from catm.ratelimit import auth_ip_limiter, auth_username_limiter, auth_gate, client_ip
 from catm.auth import (
     JwtAuth,
     Credential,
@@ -18,24 +30,43 @@ from catm.auth import (
 router = APIRouter()
 
 
+@asynccontextmanager
+async def username_attempt(username: str, attempt: str):
+    """用户名的登录次数在验证密码前计入, 并发的错误密码请求不会超出限制.
+
+    服务繁忙未验证密码时退回本次计数, 验证成功后由调用方 reset.
+
+    Args:
+        username (str): 用户名.
+        attempt (str): auth_username_limiter.hit 返回的记录.
+    """
+    try:
+        yield
+    except ServerBusyException:
+        await auth_username_limiter.refund(username, attempt)
+        raise
+
+
 @router.post(
     "",
-    description="用户注册-(102 用户名已被注册)",
+    description="用户注册-(102 用户名已被注册, 103 密码解密失败, 105 服务繁忙, 108 请求次数过多)",
 )
 async def create(
+    request: Request,
     response: Response,
     kid: str = Body(),
     username: str = Body(min_length=3, max_length=64),
     password: str = Body(),
 ):
-    # TODO 验证码
-    if await models.User.get_or_none(username=username):
-        return ErrorResponse(code=102, msg="user name has been registered")
-    password = await make_password(kid, password)
-    user = await models.User.create(
-        username=username,
-        password=password,
-    )
+    await auth_ip_limiter.hit(client_ip(request))
+    async with auth_gate:
+        if await models.User.get_or_none(username=username):
+            return ErrorResponse(code=102, msg="user name has been registered")
+        password = await make_password(kid, password)
+        user = await models.User.create(
+            username=username,
+            password=password,
+        )
     await JwtAuth.create_jwt(Credential(user_id=user.id), response)
     return schemas.User.model_validate(user)
 
@@ -43,6 +74,7 @@ async def create(
 @router.get(
     "",
     description="查询当前登录用户信息",
+    dependencies=[Depends(read_replica)],
 )
 async def read(
     credential: Credential = Depends(JwtAuth),
@@ -53,39 +85,55 @@ async def read(
 
 @router.post(
     "/modify/password",
-    description="修改密码-(103 账号或者密码错误)",
+    description="修改密码-(103 账号或者密码错误, 105 服务繁忙, 108 请求次数过多)",
 )
 async def modify_password(
+    request: Request,
     response: Response,
     kid: str = Body(),
     username: str = Body(min_length=3, max_length=64),
     password: str = Body(),
     new_password: str = Body(),
 ):
-    # TODO ylei 错误次数过多需要验证码
-    user = await models.User.get_or_none(username=username)
-    if user is None or not await verify_password(kid, password, user.password):
-        return ErrorResponse(code=103, msg="account or password error")
-    user.password = await make_password(kid, new_password)
-    await user.save()
+    await auth_ip_limiter.hit(client_ip(request))
+    attempt = await auth_username_limiter.hit(username)
+    async with username_attempt(username, attempt), auth_gate:
+        user = await models.User.get_or_none(username=username)
+        if user is None or not (await verify_password(kid, password, user.password))[0]:
+            return ErrorResponse(code=103, msg="account or password error")
+        user.password = await make_password(kid, new_password)
+        await user.save()
+    await auth_username_limiter.reset(username)
     response.delete_cookie(JWT_NAME)
     return schemas.User.model_validate(user)
 
 
 @router.post(
     "/login",
-    description="账号密码登录",
+    description="账号密码登录-(103 账号或者密码错误, 105 服务繁忙, 108 请求次数过多)",
 )
 async def login(
+    request: Request,
     response: Response,
     kid: str = Body(),
     username: str = Body(min_length=3, max_length=64),
     password: str = Body(),
 ):
-    # TODO ylei 错误次数过多需要验证码
-    user = await models.User.get_or_none(username=username)
-    if user is None or not await verify_password(kid, password, user.password):
-        return ErrorResponse(code=103, msg="account or password error")
+    # 先限流再进入准入控制, 被限流的请求不占用解密和哈希的并发数
+    await auth_ip_limiter.hit(client_ip(request))
+    attempt = await auth_username_limiter.hit(username)
+    async with username_attempt(username, attempt), auth_gate:
+        user = await models.User.get_or_none(username=username)
+        if user is None:
+            return ErrorResponse(code=103, msg="account or password error")
+        verified, rehashed_password = await verify_password(kid, password, user.password)
+        if not verified:
+            return ErrorResponse(code=103, msg="account or password error")
+        # argon2参数变化, 更新密码哈希
+        if rehashed_password is not None:
+            user.password = rehashed_password
+            await user.save(update_fields=["password"])
+    await auth_username_limiter.reset(username)
     await JwtAuth.create_jwt(Credential(user_id=user.id), response)
     return schemas.User.model_validate(user)
 
@@ -104,46 +152,46 @@ async def logout(response: Response):
     return "ok"
 
 
-def avatar_store_path(user_id: str | UUID) -> str:
-    """获取用户头像存储地址.
-
-    Args:
-        user_id (str | UUID): 用户名.
-
-    Returns:
-        str: 存储地址.
-    """
-    user_id = str(user_id)
-    dir = os.path.join(FILE_STORAGE, "avatar", user_id[:4])
-    if not os.path.exists(dir):
-        os.makedirs(dir)
-    return dir + "/" + user_id
-
-
 @router.post(
     "/avatar",
-    description="上传用户头像",
+    description="上传用户头像-(107 图片格式错误)",
 )
 async def upload_avatar(
     credential: Credential = Depends(JwtAuth),
     avatar_base64: str = Body(),
 ):
-    user_id = credential.user_id
-    with open(avatar_store_path(user_id), "w") as file:
-        file.write(avatar_base64)
+    try:
+        data = avatar.decode_avatar(avatar_base64)
+        # 解码和缩放图片占用CPU, 在线程中执行
+        await asyncio.to_thread(avatar.save_avatar, str(credential.user_id), data)
+    except InvalidImageException:
+        return ErrorResponse(code=107, msg="invalid avatar image")
     return "ok"
 
 
 @router.get(
     "/avatar/{user_id}",
-    description="获取用户头像",
+    description="获取用户头像-(104 未查询到头像)",
 )
 async def read_avatar(
+    request: Request,
     user_id: UUID = Path(),
+    size: AvatarSize = Query(default=AvatarSize.medium),
 ):
-    file_path = avatar_store_path(user_id)
-    if not os.path.exists(file_path):
-        return ErrorResponse(code=104, msg="avatar not found")
-    with open(file_path, "rb") as file:
-        avatar = file.read()
-    return avatar
+    file_path = avatar.avatar_path(str(user_id), size)
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError:
+        # 旧版base64头像首次读取时转换
+        if not await asyncio.to_thread(avatar.migrate_legacy_avatar, str(user_id)):
+            return ErrorResponse(code=104, msg="avatar not found")
+        stat_result = os.stat(file_path)
+    validators = file_validators(stat_result, AVATAR_CACHE_CONTROL)
+    if is_not_modified(request.headers, validators):
+        return NotModifiedResponse(validators)
+    return FileResponse(
+        file_path,
+        headers=validators,
+        media_type=avatar.AVATAR_MEDIA_TYPE,
+        stat_result=stat_result,
+    )
@@ -2,23 +2,25 @@ from typing import Annotated, Optional, Any, Tuple
 
 import time
 import json
-import random
 import base64
+import hashlib
 from uuid import UUID
 
-import argon2
 from pydantic import BaseModel
 from fastapi import Request, Response, Header
+from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.serialization import (
-    load_pem_public_key,
-    load_pem_private_key,
-)
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.asymmetric import padding
 
-from catm import redis, models
-from catm.settings import DEBUG, APP_NAME, API_TOKEN, JWT_NAME
-from catm.exceptions import JwtAuthException, TokenAuthException
+from catm import jws
+from catm.cache import TTLCache
+from catm.keyring import key_ring
+from catm.hashing import password_hash_pool
+from catm.metrics import crypto_seconds
+from catm.tracing import span
+from catm.constants import JwtAlgorithm
+from catm.settings import DEBUG, API_TOKEN, JWT_NAME, JWT_CACHE_SIZE, JWT_ALGORITHM
+from catm.exceptions import JwtAuthException, TokenAuthException, PasswordDecryptException
 
 
 async def make_password(kid: str, password_base64: str) -> str:
@@ -31,13 +33,17 @@ async def make_password(kid: str, password_base64: str) -> str:
     Returns:
         str: 加密后的密码.
     """
-    hasher = argon2.PasswordHasher()
     password = await decrypt_password(kid, password_base64)
-    hashed_password = hasher.hash(password)
+    with crypto_seconds.time("password_hash"), span("crypto.password_hash"):
+        hashed_password = await password_hash_pool.hash(password)
     return hashed_password
 
 
-async def verify_password(kid: str, password_base64: str, hashed_password: str) -> bool:
+async def verify_password(
+    kid: str,
+    password_base64: str,
+    hashed_password: str,
+) -> Tuple[bool, str | None]:
     """验证密码正确.
 
     Args:
@@ -46,14 +52,11 @@ async def verify_password(kid: str, password_base64: str, hashed_password: str)
         hashed_password (bool): 加密后的密码.
 
     Returns:
-        bool: True 密码验证成功 False 密码验证失败.
+        Tuple[bool, str | None]: True 密码验证成功 False 密码验证失败, argon2参数变化时重新加密后的密码.
     """
-    hasher = argon2.PasswordHasher()
-    try:
-        password = await decrypt_password(kid, password_base64)
-        return hasher.verify(hashed_password, password)
-    except argon2.exceptions.VerificationError:
-        return False
+    password = await decrypt_password(kid, password_base64)
+    with crypto_seconds.time("password_verify"), span("crypto.password_verify"):
+        return await password_hash_pool.verify(hashed_password, password)
 
 
 async def decrypt_password(kid: str, password_base64: str) -> str:
@@ -63,20 +66,33 @@ async def decrypt_password(kid: str, password_base64: str) -> str:
         kid (str): 密钥ID.
         password_base64 (str): 前端加密后的密码.
 
+    Raises:
+        PasswordDecryptException: 密钥不存在或不是RSA密钥, 密文错误.
+
     Returns:
         str: 密码.
     """
-    key_pair = await models.KeyPair.get(id=kid).only("private_key")
-    private_key = load_pem_private_key(key_pair.private_key.encode(), None)
-    password_bytes = private_key.decrypt(
-        base64.b64decode(password_base64),
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None,
-        )
-    )
-    return password_bytes.decode()
+    try:
+        entry = await key_ring.get(kid)
+    except KeyError:
+        raise PasswordDecryptException() from None
+    # 只有RSA密钥对用于加密传输密码, 其它算法的kid在jwt头中公开
+    if entry.algorithm != JwtAlgorithm.PS256:
+        raise PasswordDecryptException()
+    with crypto_seconds.time("password_decrypt"), span("crypto.password_decrypt"):
+        try:
+            password_bytes = entry.private_key.decrypt(
+                base64.b64decode(password_base64),
+                padding.OAEP(
+                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                    algorithm=hashes.SHA256(),
+                    label=None,
+                )
+            )
+            return password_bytes.decode()
+        except ValueError:
+            # base64错误, 解密失败, 非utf-8
+            raise PasswordDecryptException() from None
 
 
 class Credential(BaseModel):
@@ -108,37 +124,6 @@ def base64url_decode(input: bytes):
     return base64.urlsafe_b64decode(input)
 
 
-async def rand_private_key() -> Tuple[str, rsa.RSAPrivateKey]:
-    """随机获取私钥.
-
-    Returns:
-        Tuple[str, str]: 密钥ID, 私钥.
-    """
-    kids = await models.KeyPair.all().only("id").values_list("id", flat=True)
-    kid = random.choice(kids)
-    key_pair = await models.KeyPair.get(id=kid)
-    private_key = key_pair.private_key
-    return str(kid), load_pem_private_key(private_key.encode(), None)
-
-
-async def load_public_key(kid: str | UUID) -> rsa.RSAPublicKey:
-    """通过kid获取公钥.
-
-    Args:
-        kid (str | UUID): 密钥ID.
-
-    Returns:
-        rsa.RSAPublicKey: 公钥.
-    """
-    key = f"{APP_NAME}:auth:jwt:public_key:{kid}"
-    public_key = await redis.client.get(key)
-    if public_key is None:
-        key_pair = await models.KeyPair.get(id=kid)
-        public_key = key_pair.public_key
-        await redis.client.set(key, public_key, ex=7 * 24 * 60 * 60)
-    return load_pem_public_key(public_key.encode())
-
-
 class _JwtAuth:
     """jwt认证"""
 
@@ -147,10 +132,16 @@ class _JwtAuth:
         jwt_name: str = "jwt",
         jwt_exp_interval: int = 7 * 24 * 60 * 60,
         expired_refresh: int = 1 * 24 * 60 * 60,
+        cache_size: int = 10000,
+        algorithm: str = JwtAlgorithm.PS256,
     ) -> None:
         self.jwt_name = jwt_name
+        # 签发使用的算法, 验证时按jwt头部的alg和kid选择算法
+        self.algorithm = jws.ALGORITHMS[algorithm]
         self.expired_refresh = expired_refresh
         self.jwt_exp_interval = jwt_exp_interval
+        # 已验证jwt缓存, key为token摘要, value为负载信息, 有效期至exp
+        self.verified: TTLCache[dict] = TTLCache(maxsize=cache_size)
 
     async def __call__(self, request: Request, response: Response) -> Credential:
         """验证jwt, 返回用户信息吗, 过期刷新jwt.
@@ -164,11 +155,12 @@ class _JwtAuth:
         """
         jwt_token = request.cookies.get(self.jwt_name) or request.headers.get(self.jwt_name)
         if jwt_token:
-            try:
-                payload = await self.verify(jwt_token)
-                return await self.refresh_jwt(payload, response)
-            except Exception:
-                pass
+            with span("auth.jwt"):
+                try:
+                    payload = await self.verify(jwt_token)
+                    return await self.refresh_jwt(payload, response)
+                except Exception:
+                    pass
         raise JwtAuthException()
     
     async def refresh_jwt(self, payload: dict, response: Response) -> Credential:
@@ -193,11 +185,11 @@ class _JwtAuth:
         Returns:
             str: jwt.
         """
-        kid, private_key = await rand_private_key()
+        kid, private_key = key_ring.rand_private_key(self.algorithm.name)
         timestamp = int(time.time())
         header = {
             "type": "JWT",
-            "alg": "RS256",
+            "alg": self.algorithm.name,
             "kid": kid,
         }
         payload = {
@@ -206,14 +198,8 @@ class _JwtAuth:
             "credential": credential.model_dump(mode="json"),
         }
         message = base64url_encode(json.dumps(header).encode()) + b"." + base64url_encode(json.dumps(payload).encode())
-        signature = private_key.sign(
-            message,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH,
-            ),
-            hashes.SHA256(),
-        )
+        with crypto_seconds.time("jwt_sign"), span("crypto.jwt_sign"):
+            signature = self.algorithm.sign(private_key, message)
         jwt_token = (message + b"." + base64url_encode(signature)).decode()
         response.set_cookie(self.jwt_name, jwt_token, max_age=self.jwt_exp_interval, httponly=True)
         return jwt_token
@@ -228,20 +214,35 @@ class _JwtAuth:
             dict: 负载信息.
         """
         token = token.encode()
+        digest = hashlib.sha256(token).digest()
+        cached = self.verified.get(digest)
+        if cached is not None:
+            return cached
         header, payload, signature = token.split(b".")
         message = header + b"." + payload
-        kid = json.loads(base64url_decode(header))["kid"]
-        public_key = await load_public_key(kid)
-        public_key.verify(
-            base64url_decode(signature),
-            message,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256(),
-        )
-        return json.loads(base64url_decode(payload))
+        header = json.loads(base64url_decode(header))
+        entry = await key_ring.get(header["kid"])
+        algorithm = jws.get_algorithm(header["alg"])
+        # 算法必须与密钥一致, 防止篡改alg
+        if algorithm.name != entry.algorithm:
+            raise InvalidSignature()
+        with crypto_seconds.time("jwt_verify"), span("crypto.jwt_verify"):
+            algorithm.verify(entry.public_key, base64url_decode(signature), message)
+        payload = json.loads(base64url_decode(payload))
+        if payload["exp"] > time.time():
+            self.verified.set(digest, payload, expire_at=payload["exp"])
+        return payload
+
+    def cache_info(self) -> dict:
+        """jwt验证缓存统计信息.
+
+        Returns:
+            dict: {"jwt": {...}, "key_ring": 密钥数量}.
+        """
+        return {
+            "jwt": self.verified.info(),
+            "key_ring": len(key_ring),
+        }
 
 
 class _TokenAuth:
@@ -254,4 +255,4 @@ class _TokenAuth:
 
 
 TokenAuth = _TokenAuth()
-JwtAuth = _JwtAuth(JWT_NAME)
+JwtAuth = _JwtAuth(JWT_NAME, cache_size=JWT_CACHE_SIZE, algorithm=JWT_ALGORITHM)
@@ -0,0 +1,156 @@
+"""用户头像"""
+from typing import Dict
+
+import io
+import os
+import base64
+import binascii
+import warnings
+
+from PIL import Image, ImageOps
+
+from catm.storage import write_file
+from catm.exceptions import InvalidImageException
+from catm.constants import AvatarSize, AVATAR_SIZES
+from catm.settings import FILE_STORAGE, AVATAR_MAX_BYTES, AVATAR_MAX_PIXELS
+
+
+# 允许上传的图片格式
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+AVATAR_MEDIA_TYPE = "image/webp"
+
+
+def avatar_dir(user_id: str) -> str:
+    dir = os.path.join(FILE_STORAGE, "avatar", user_id[:4])
+    if not os.path.exists(dir):
+        os.makedirs(dir, exist_ok=True)
+    return dir
+
+
+def legacy_avatar_path(user_id: str) -> str:
+    """旧版base64文本头像的存储路径.
+
+    Args:
+        user_id (str): 用户ID.
+
+    Returns:
+        str: 存储路径.
+    """
+    return os.path.join(avatar_dir(user_id), user_id)
+
+
+def avatar_path(user_id: str, size: AvatarSize) -> str:
+    """头像存储路径.
+
+    Args:
+        user_id (str): 用户ID.
+        size (AvatarSize): 头像尺寸.
+
+    Returns:
+        str: 存储路径.
+    """
+    return os.path.join(avatar_dir(user_id), f"{user_id}.{size}.webp")
+
+
+def decode_avatar(avatar_base64: str) -> bytes:
+    """解码base64头像, 兼容 data URL.
+
+    Args:
+        avatar_base64 (str): base64编码的图片.
+
+    Raises:
+        InvalidImageException: 编码错误或超出大小限制.
+
+    Returns:
+        bytes: 图片内容.
+    """
+    if avatar_base64.startswith("data:"):
+        _, _, avatar_base64 = avatar_base64.partition(",")
+    # base64 长度约为原文的 4/3
+    if len(avatar_base64) > AVATAR_MAX_BYTES * 4 // 3 + 4:
+        raise InvalidImageException()
+    try:
+        return base64.b64decode(avatar_base64, validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidImageException()
+
+
+def resize_avatar(data: bytes) -> Dict[AvatarSize, bytes]:
+    """校验图片并生成各尺寸的正方形头像.
+
+    Args:
+        data (bytes): 图片内容.
+
+    Raises:
+        InvalidImageException: 不支持的格式, 图片损坏或像素数超出限制.
+
+    Returns:
+        Dict[AvatarSize, bytes]: 尺寸 -> webp图片.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            image = Image.open(io.BytesIO(data))
+            if image.format not in ALLOWED_FORMATS:
+                raise InvalidImageException()
+            # 解码前检查像素数, 避免解压炸弹
+            if image.width * image.height > AVATAR_MAX_PIXELS:
+                raise InvalidImageException()
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except InvalidImageException:
+        raise
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombWarning, Image.DecompressionBombError):
+        raise InvalidImageException()
+    image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    # 居中裁剪为正方形
+    side = min(image.size)
+    image = ImageOps.fit(image, (side, side))
+    variants = {}
+    for size, pixels in AVATAR_SIZES.items():
+        variant = image if side <= pixels else image.resize((pixels, pixels), Image.LANCZOS)
+        buffer = io.BytesIO()
+        variant.save(buffer, format="WEBP", quality=85, method=4)
+        variants[size] = buffer.getvalue()
+    return variants
+
+
+def save_avatar(user_id: str, data: bytes) -> None:
+    """生成并保存各尺寸头像, 在线程中执行.
+
+    Args:
+        user_id (str): 用户ID.
+        data (bytes): 原始图片内容.
+
+    Raises:
+        InvalidImageException: 图片无效.
+    """
+    variants = resize_avatar(data)
+    # 先写小图, 列表页最先读取
+    for size, variant in variants.items():
+        write_file(avatar_path(user_id, size), variant)
+    try:
+        os.unlink(legacy_avatar_path(user_id))
+    except FileNotFoundError:
+        pass
+
+
+def migrate_legacy_avatar(user_id: str) -> bool:
+    """把旧版base64文本头像转换为各尺寸图片, 在线程中执行.
+
+    Args:
+        user_id (str): 用户ID.
+
+    Returns:
+        bool: 是否存在旧版头像并转换成功.
+    """
+    try:
+        with open(legacy_avatar_path(user_id), "r") as file:
+            avatar_base64 = file.read()
+    except FileNotFoundError:
+        return False
+    try:
+        save_avatar(user_id, decode_avatar(avatar_base64.strip()))
+    except InvalidImageException:
+        return False
+    return True
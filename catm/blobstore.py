@@ -0,0 +1,224 @@
+"""音频内容寻址存储"""
+from typing import List
+from uuid import UUID, uuid4
+
+import os
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import structlog
+from fastapi import UploadFile
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from catm import redis, models
+from catm.tracing import span
+from catm.constants import MusicStatus
+from catm.storage import StoredFile, save_upload
+from catm.settings import APP_NAME, FILE_STORAGE, BLOB_GC_INTERVAL, BLOB_GC_GRACE
+
+
+log = structlog.getLogger()
+
+
+def blob_path(sha256: str) -> str:
+    """音频文件存储路径.
+
+    Args:
+        sha256 (str): 音频sha256.
+
+    Returns:
+        str: 存储路径.
+    """
+    return os.path.join(FILE_STORAGE, "blob", sha256[:2], sha256[2:4], sha256)
+
+
+def _place(staged_path: str, file_path: str) -> bool:
+    """把暂存文件硬链接到存储路径, 已存在时保留原文件, 返回是否新建了文件."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    try:
+        os.link(staged_path, file_path)
+    except FileExistsError:
+        return False
+    return True
+
+
+def _unlink(file_path: str) -> None:
+    try:
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
+
+
+class BlobStore:
+    """按sha256去重的音频存储.
+
+    上传先写入暂存目录并计算sha256, 相同内容只保留一份文件, 音乐通过 sha256 引用文件.
+    引用计数和文件落盘在同一个事务内完成, 并持有 audio_blob 行锁, 与垃圾回收互斥.
+    """
+
+    def __init__(self, gc_interval: int = 10 * 60, gc_grace: int = 60 * 60, gc_batch: int = 100) -> None:
+        """初始化.
+
+        Args:
+            gc_interval (int, optional): 垃圾回收间隔(秒).
+            gc_grace (int, optional): 引用计数归零超过该秒数才删除文件.
+            gc_batch (int, optional): 每次回收数量.
+        """
+        self.gc_interval = gc_interval
+        self.gc_grace = gc_grace
+        self.gc_batch = gc_batch
+        self._task: asyncio.Task | None = None
+
+    async def stage(self, upload: UploadFile) -> StoredFile:
+        """流式写入暂存文件并计算sha256.
+
+        Args:
+            upload (UploadFile): 上传文件.
+
+        Returns:
+            StoredFile: 暂存文件信息.
+        """
+        dir = os.path.join(FILE_STORAGE, "blob", "tmp")
+        os.makedirs(dir, exist_ok=True)
+        return await save_upload(upload, os.path.join(dir, uuid4().hex))
+
+    async def attach(
+        self,
+        music_id: str | UUID,
+        sha256: str,
+        mime: str,
+        staged: StoredFile | None = None,
+    ) -> models.AudioBlob | None:
+        """音乐引用sha256对应的音频, 维护引用计数并同步校验结果.
+
+        Args:
+            music_id (str | UUID): 音乐ID.
+            sha256 (str): 音频sha256.
+            mime (str): 音频媒体类型.
+            staged (StoredFile | None, optional): 暂存文件, 为None时只引用已存在的音频.
+
+        Returns:
+            models.AudioBlob | None: 音频, 音频不存在且没有暂存文件时为None.
+        """
+        file_path = blob_path(sha256)
+        placed = False
+        try:
+            if staged is not None:
+                # 先在事务外插入行, 已存在时忽略. 并发首次上传同一音频时都锁定已存在的行,
+                # 避免都查不到行后重复插入主键冲突, 或在InnoDB间隙锁上死锁
+                await models.AudioBlob.bulk_create(
+                    [models.AudioBlob(sha256=sha256, size=staged.size, status=MusicStatus.pending)],
+                    ignore_conflicts=True,
+                )
+            async with in_transaction() as conn:
+                music = await models.Music.filter(id=music_id).using_db(conn).select_for_update().first()
+                if music is None:
+                    return None
+                blob = await models.AudioBlob.filter(sha256=sha256).using_db(conn).select_for_update().first()
+                # 持有行锁时检查文件, 垃圾回收不会同时删除
+                if blob is None or not await asyncio.to_thread(os.path.exists, file_path):
+                    if staged is None:
+                        return None
+                    with span("file.place"):
+                        placed = await asyncio.to_thread(_place, staged.path, file_path)
+                if blob is None:
+                    # 插入后被垃圾回收删除
+                    blob = await models.AudioBlob.create(
+                        sha256=sha256,
+                        size=staged.size,
+                        status=MusicStatus.pending,
+                        using_db=conn,
+                    )
+                if music.sha256 != sha256:
+                    await models.AudioBlob.filter(sha256=sha256).using_db(conn).update(
+                        ref_count=F("ref_count") + 1,
+                        updated_at=datetime.now(timezone.utc),
+                    )
+                    if music.sha256 is not None:
+                        await models.AudioBlob.filter(sha256=music.sha256).using_db(conn).update(
+                            ref_count=F("ref_count") - 1,
+                            updated_at=datetime.now(timezone.utc),
+                        )
+                music.sha256 = sha256
+                music.size = blob.size
+                music.mime = mime
+                # 已校验过的音频直接复用校验结果
+                music.status = blob.status
+                music.duration = blob.duration
+                music.bitrate = blob.bitrate
+                await music.save(
+                    using_db=conn,
+                    update_fields=["sha256", "size", "mime", "status", "duration", "bitrate", "updated_at"],
+                )
+                return blob
+        except BaseException:
+            # 事务回滚后没有 audio_blob 行引用新建的文件, 垃圾回收只扫描行, 需要在这里删除
+            if placed:
+                await asyncio.to_thread(_unlink, file_path)
+            raise
+        finally:
+            if staged is not None:
+                await asyncio.to_thread(_unlink, staged.path)
+
+    async def gc(self) -> int:
+        """删除不再被引用的音频.
+
+        Returns:
+            int: 删除数量.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.gc_grace)
+        candidates: List[str] = await models.AudioBlob.filter(
+            ref_count__lte=0,
+            updated_at__lt=cutoff,
+        ).limit(self.gc_batch).values_list("sha256", flat=True)
+        deleted = 0
+        for sha256 in candidates:
+            async with in_transaction() as conn:
+                blob = await models.AudioBlob.filter(
+                    sha256=sha256,
+                    ref_count__lte=0,
+                ).using_db(conn).select_for_update().first()
+                if blob is None:
+                    continue
+                # 以实际引用为准, 修正计数
+                ref_count = await models.Music.filter(sha256=sha256).using_db(conn).count()
+                if ref_count:
+                    blob.ref_count = ref_count
+                    await blob.save(using_db=conn, update_fields=["ref_count", "updated_at"])
+                    continue
+                await asyncio.to_thread(_unlink, blob_path(sha256))
+                await blob.delete(using_db=conn)
+                deleted += 1
+        if deleted:
+            log.info(f"audio blob gc deleted {deleted}")
+        return deleted
+
+    async def _gc_forever(self) -> None:
+        lock_key = f"{APP_NAME}:blob:gc:lock"
+        while True:
+            await asyncio.sleep(self.gc_interval)
+            try:
+                # 同一间隔内只有一个worker回收
+                if await redis.client.set(lock_key, "1", nx=True, ex=self.gc_interval):
+                    await self.gc()
+            except Exception:
+                log.exception("audio blob gc failed")
+
+    def start(self) -> None:
+        """启动定时垃圾回收任务."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._gc_forever())
+
+    async def stop(self) -> None:
+        """停止定时垃圾回收任务."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+blob_store = BlobStore(gc_interval=BLOB_GC_INTERVAL, gc_grace=BLOB_GC_GRACE)
@@ -0,0 +1,100 @@
+"""进程内缓存"""
+from typing import Any, Dict, Generic, Hashable, Tuple, TypeVar
+
+import time
+from collections import OrderedDict
+
+
+T = TypeVar("T")
+_MISSING = object()
+
+
+class TTLCache(Generic[T]):
+    """有容量上限的LRU缓存, 每个条目可设置过期时间.
+
+    非线程安全, 仅在事件循环内使用.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None) -> None:
+        """初始化.
+
+        Args:
+            maxsize (int, optional): 最大条目数.
+            ttl (float | None, optional): 默认存活秒数, None 不过期.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Tuple[float | None, T]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> T | Any:
+        """获取缓存, 命中时移动到最近使用.
+
+        Args:
+            key (Hashable): 键.
+            default (Any, optional): 未命中时返回的默认值.
+
+        Returns:
+            T | Any: 缓存值.
+        """
+        item = self._data.get(key, _MISSING)
+        if item is not _MISSING:
+            expire_at, value = item
+            if expire_at is None or expire_at > time.time():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: T, expire_at: float | None = None) -> None:
+        """写入缓存.
+
+        Args:
+            key (Hashable): 键.
+            value (T): 值.
+            expire_at (float | None, optional): 过期时间戳, 默认使用ttl.
+        """
+        if expire_at is None and self.ttl is not None:
+            expire_at = time.time() + self.ttl
+        self._data[key] = (expire_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> T | Any:
+        """删除缓存.
+
+        Args:
+            key (Hashable): 键.
+            default (Any, optional): 不存在时返回的默认值.
+
+        Returns:
+            T | Any: 被删除的值.
+        """
+        item = self._data.pop(key, _MISSING)
+        if item is _MISSING:
+            return default
+        return item[1]
+
+    def clear(self) -> None:
+        """清空缓存."""
+        self._data.clear()
+
+    def info(self) -> Dict[str, int]:
+        """缓存统计信息.
+
+        Returns:
+            Dict[str, int]: 命中数, 未命中数, 当前大小, 最大容量.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
@@ -0,0 +1,172 @@
+"""评论计数"""
+from typing import Dict, Iterable, List, Tuple
+from uuid import UUID
+
+import asyncio
+
+import structlog
+
+from catm import redis, models
+from catm.db import primary
+from catm.settings import APP_NAME, COMMENT_COUNTER_FLUSH_INTERVAL
+
+
+log = structlog.getLogger()
+# 计数存在时自增, 不存在返回nil, 由调用方从数据库加载后重试
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    local count = redis.call('INCRBY', KEYS[1], ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    redis.call('SADD', KEYS[2], ARGV[3])
+    return count
+end
+return nil
+"""
+
+
+class CommentCounter:
+    """评论数计数器.
+
+    评论数在redis中原子自增, 同时记录变化的对象, 定时批量写入 comment_counter 表.
+    批量查询时先 MGET redis, 未命中的一次查询数据库并回填.
+    """
+
+    def __init__(self, flush_interval: int = 5, ttl: int = 30 * 24 * 60 * 60, flush_batch: int = 500) -> None:
+        """初始化.
+
+        Args:
+            flush_interval (int, optional): 写入数据库间隔(秒).
+            ttl (int, optional): redis计数过期秒数.
+            flush_batch (int, optional): 每批写入数量.
+        """
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.flush_batch = flush_batch
+        self.dirty_key = f"{APP_NAME}:comment:count:dirty"
+        self._incr_if_exists = redis.client.register_script(_INCR_IF_EXISTS)
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def key(target_type: str, target_id: str) -> str:
+        return f"{APP_NAME}:comment:count:{target_type}:{target_id}"
+
+    async def _load(self, target_type: str, target_ids: List[str]) -> Dict[str, int]:
+        """从数据库加载计数并回填redis, 已存在的redis计数不覆盖."""
+        # 枚举值直接拼入SQL时不会加引号, 统一转为字符串
+        target_type = str(target_type)
+        with primary():
+            rows = await models.CommentCounter.filter(
+                target_type=target_type,
+                target_id__in=target_ids,
+            ).values_list("target_id", "count")
+        counts = {str(target_id): count for target_id, count in rows}
+        async with redis.client.pipeline(transaction=False) as pipe:
+            for target_id in target_ids:
+                pipe.set(self.key(target_type, target_id), counts.get(target_id, 0), ex=self.ttl, nx=True)
+            await pipe.execute()
+        return {target_id: counts.get(target_id, 0) for target_id in target_ids}
+
+    async def incr(self, target_type: str, target_id: str | UUID, amount: int = 1) -> int:
+        """评论数自增.
+
+        Args:
+            target_type (str): 评论对象类型.
+            target_id (str | UUID): 评论对象ID.
+            amount (int, optional): 增量.
+
+        Returns:
+            int: 自增后的评论数.
+        """
+        target_id = str(target_id)
+        keys = [self.key(target_type, target_id), self.dirty_key]
+        args = [amount, self.ttl, f"{target_type}:{target_id}"]
+        count = await self._incr_if_exists(keys=keys, args=args)
+        if count is None:
+            await self._load(target_type, [target_id])
+            count = await self._incr_if_exists(keys=keys, args=args)
+        return int(count)
+
+    async def counts(self, target_type: str, target_ids: Iterable[str | UUID]) -> Dict[str, int]:
+        """批量获取评论数.
+
+        Args:
+            target_type (str): 评论对象类型.
+            target_ids (Iterable[str | UUID]): 评论对象ID.
+
+        Returns:
+            Dict[str, int]: 评论对象ID -> 评论数.
+        """
+        target_ids = list(dict.fromkeys(str(target_id) for target_id in target_ids))
+        if not target_ids:
+            return {}
+        values = await redis.client.mget([self.key(target_type, target_id) for target_id in target_ids])
+        result = {}
+        misses = []
+        for target_id, value in zip(target_ids, values):
+            if value is None:
+                misses.append(target_id)
+            else:
+                result[target_id] = int(value)
+        if misses:
+            result.update(await self._load(target_type, misses))
+        return {target_id: result[target_id] for target_id in target_ids}
+
+    async def flush(self) -> int:
+        """将变化的计数写入数据库.
+
+        Returns:
+            int: 写入数量.
+        """
+        total = 0
+        while members := await redis.client.spop(self.dirty_key, self.flush_batch):
+            targets: List[Tuple[str, str]] = [tuple(member.split(":", 1)) for member in members]
+            values = await redis.client.mget([self.key(*target) for target in targets])
+            rows = [
+                models.CommentCounter(target_type=target_type, target_id=target_id, count=int(value))
+                for (target_type, target_id), value in zip(targets, values)
+                if value is not None
+            ]
+            if not rows:
+                continue
+            try:
+                await models.CommentCounter.bulk_create(
+                    rows,
+                    update_fields=["count"],
+                    on_conflict=["target_type", "target_id"],
+                )
+            except Exception:
+                # 写入失败放回, 下次重试
+                await redis.client.sadd(self.dirty_key, *members)
+                raise
+            total += len(rows)
+        return total
+
+    async def _flush_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("comment counter flush failed")
+
+    def start(self) -> None:
+        """启动定时写入任务."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        """停止定时写入任务并写入剩余计数."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("comment counter flush failed")
+
+
+comment_counter = CommentCounter(flush_interval=COMMENT_COUNTER_FLUSH_INTERVAL)
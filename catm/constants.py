@@ -22,3 +22,69 @@ class MusicResourcesType(StrEnum):
     cover = "cover"
     # 歌词
     lyric = "lyric"
+
+
+class MusicEventType(StrEnum):
+    """音乐行为事件类型"""
+
+    # 播放
+    play = "play"
+    # 收藏
+    favorite = "favorite"
+    # 评论
+    comment = "comment"
+
+
+class CommentTargetType(StrEnum):
+    """评论对象类型"""
+
+    music = "music"
+    playlist = "playlist"
+
+
+class AvatarSize(StrEnum):
+    """头像尺寸"""
+
+    small = "small"
+    medium = "medium"
+    large = "large"
+
+
+class JwtAlgorithm(StrEnum):
+    """jwt签名算法"""
+
+    PS256 = "PS256"
+    ES256 = "ES256"
+    EdDSA = "EdDSA"
+
+
+class RankingChart(StrEnum):
+    """排行榜"""
+
+    # 24小时热门, 按小时衰减
+    hot = "hot"
+    # 7日热门, 按天衰减
+    week = "week"
+
+
+# 行为事件在排行榜中的权重
+EVENT_RANKING_WEIGHTS = {
+    MusicEventType.play: 1,
+    MusicEventType.favorite: 5,
+    MusicEventType.comment: 3,
+}
+
+
+# 各类资源的Cache-Control策略, 资源可被重新上传覆盖, 过期后通过ETag重新验证
+RESOURCES_CACHE_CONTROL = {
+    MusicResourcesType.audio: "public, max-age=86400",
+    MusicResourcesType.cover: "public, max-age=600",
+    MusicResourcesType.lyric: "public, max-age=600",
+}
+AVATAR_CACHE_CONTROL = "public, max-age=60"
+# 头像边长(像素)
+AVATAR_SIZES = {
+    AvatarSize.small: 64,
+    AvatarSize.medium: 160,
+    AvatarSize.large: 480,
+}
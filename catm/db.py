@@ -0,0 +1,84 @@
+"""数据库读写分离"""
+from typing import List
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from catm.settings import TORTOISE_ORM, DB_REPLICA_STICKY
+
+
+# 读写后在该cookie有效期内读主库, 避免从库延迟读不到刚写入的数据
+PRIMARY_COOKIE = "catm_primary"
+REPLICAS: List[str] = [name for name in TORTOISE_ORM["connections"] if name.startswith("replica")]
+_replica: ContextVar[bool] = ContextVar("db_replica", default=False)
+
+
+class ReplicaRouter:
+    """Tortoise路由, 标记为只读的请求中查询随机从库, 其余全部使用主库"""
+
+    def db_for_read(self, model) -> str | None:
+        if _replica.get() and REPLICAS:
+            return random.choice(REPLICAS)
+        return None
+
+    def db_for_write(self, model) -> str | None:
+        return None
+
+
+async def read_replica(request: Request):
+    """只读接口依赖, 接口内的查询使用从库.
+
+    刚写入过的客户端带有 PRIMARY_COOKIE, 仍使用主库.
+
+    Args:
+        request (Request): 请求.
+    """
+    token = _replica.set(PRIMARY_COOKIE not in request.cookies)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+@contextmanager
+def primary():
+    """块内查询使用主库, 用于回填共享缓存, 避免从库延迟的旧数据写入缓存."""
+    token = _replica.set(False)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReadAfterWriteMiddleware:
+    """写请求成功后设置 PRIMARY_COOKIE, 有效期内该客户端的只读接口也使用主库"""
+
+    def __init__(self, app: ASGIApp, sticky: int = DB_REPLICA_STICKY) -> None:
+        """初始化.
+
+        Args:
+            app (ASGIApp): app.
+            sticky (int, optional): 写入后读主库的秒数.
+        """
+        self.app = app
+        self.sticky = sticky
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not REPLICAS or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{PRIMARY_COOKIE}=1; Max-Age={self.sticky}; Path=/; HttpOnly; SameSite=lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,214 @@
+"""行为事件批量写入"""
+from typing import List, Tuple
+from uuid import UUID
+
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import structlog
+from tortoise.transactions import in_transaction
+
+from catm import models, schemas
+from catm.ranking import ranking
+from catm.exceptions import EventBufferFullException
+from catm.settings import EVENT_BUFFER_SIZE, EVENT_FLUSH_SIZE, EVENT_FLUSH_INTERVAL, EVENT_MAX_AGE
+
+
+log = structlog.getLogger()
+# (user_id, music_id, type, value, occurred_at)
+EventRow = Tuple[UUID, UUID, str, int | None, datetime]
+
+
+def clamp_occurred_at(occurred_at: datetime | None, now: datetime, max_age: int = EVENT_MAX_AGE) -> datetime:
+    """修正客户端事件时间, 避免未来时间抬高排行榜的时间衰减分数.
+
+    Args:
+        occurred_at (datetime | None): 客户端事件时间, 不带时区按UTC.
+        now (datetime): 服务端时间.
+        max_age (int, optional): 最早为多少秒之前.
+
+    Returns:
+        datetime: [now - max_age, now] 内的时间, 为空时为 now.
+    """
+    if occurred_at is None:
+        return now
+    if occurred_at.tzinfo is None:
+        occurred_at = occurred_at.replace(tzinfo=timezone.utc)
+    return min(max(occurred_at, now - timedelta(seconds=max_age)), now)
+
+
+class EventBuffer:
+    """进程内事件缓冲区.
+
+    事件先写入内存, 达到数量或时间阈值后一次 bulk_create 写入数据库.
+    缓冲区满时拒绝写入, 由调用方返回429让客户端稍后重试.
+    写入失败的批次放回缓冲区头部, 按指数退避重试, 放不下的最早的事件才丢弃.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 50000,
+        flush_size: int = 1000,
+        flush_interval: float = 1.0,
+        max_backoff: float = 30.0,
+    ) -> None:
+        """初始化.
+
+        Args:
+            max_size (int, optional): 缓冲区容量(含写入中的批次).
+            flush_size (int, optional): 达到该数量立即写入.
+            flush_interval (float, optional): 最长写入间隔(秒).
+            max_backoff (float, optional): 写入失败后最长重试间隔(秒).
+        """
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.buffer: List[EventRow] = []
+        # 正在写入数据库的事件数量
+        self.flushing = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.dropped = 0
+        # 连续写入失败次数, 失败后 retry_at 之前不再写入
+        self.failures = 0
+        self.retry_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task: asyncio.Task | None = None
+
+    def add(self, user_id: UUID, events: List[schemas.MusicEvent]) -> None:
+        """写入事件.
+
+        Args:
+            user_id (UUID): 用户ID.
+            events (List[schemas.MusicEvent]): 事件列表.
+
+        Raises:
+            EventBufferFullException: 缓冲区已满.
+        """
+        if len(self.buffer) + self.flushing + len(events) > self.max_size:
+            self.rejected += len(events)
+            raise EventBufferFullException()
+        now = datetime.now(timezone.utc)
+        self.buffer.extend(
+            (user_id, event.music_id, event.type, event.value, clamp_occurred_at(event.occurred_at, now))
+            for event in events
+        )
+        self.accepted += len(events)
+        if len(self.buffer) >= self.flush_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """写入缓冲区内全部事件.
+
+        Returns:
+            int: 写入数量.
+        """
+        batch, self.buffer = self.buffer, []
+        if not batch:
+            return 0
+        self.flushing += len(batch)
+        try:
+            # 分批插入在同一事务内, 失败重试时不会重复写入
+            async with in_transaction() as conn:
+                await models.MusicEvent.bulk_create(
+                    [
+                        models.MusicEvent(
+                            user_id=user_id,
+                            music_id=music_id,
+                            type=type,
+                            value=value,
+                            occurred_at=occurred_at,
+                        )
+                        for user_id, music_id, type, value, occurred_at in batch
+                    ],
+                    batch_size=self.flush_size,
+                    using_db=conn,
+                )
+        except Exception:
+            log.exception(f"flush {len(batch)} events failed")
+            failed = True
+        else:
+            failed = False
+        finally:
+            self.flushing -= len(batch)
+        if failed:
+            self._requeue(batch)
+            return 0
+        self.failures = 0
+        self.flushed += len(batch)
+        try:
+            await ranking.record((music_id, type, occurred_at) for _, music_id, type, _, occurred_at in batch)
+        except Exception:
+            log.exception(f"record {len(batch)} events to ranking failed")
+        return len(batch)
+
+    def _requeue(self, batch: List[EventRow]) -> None:
+        """写入失败的批次放回缓冲区头部, 超出容量时丢弃最早的事件."""
+        room = max(self.max_size - self.flushing - len(self.buffer), 0)
+        if room < len(batch):
+            self.dropped += len(batch) - room
+            batch = batch[len(batch) - room:]
+        self.buffer = batch + self.buffer
+        self.failures += 1
+        self.retry_at = time.monotonic() + min(self.flush_interval * 2 ** self.failures, self.max_backoff)
+
+    async def _flush_forever(self) -> None:
+        while not self._closed:
+            timeout = self.flush_interval
+            if self.failures:
+                timeout = max(self.retry_at - time.monotonic(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # 退避期间缓冲区达到阈值也不写入
+            if self.failures and not self._closed and time.monotonic() < self.retry_at:
+                continue
+            await self.flush()
+
+    def start(self) -> None:
+        """启动定时写入任务."""
+        if self._task is None:
+            self._closed = False
+            self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        """停止定时写入任务, 并写入剩余事件."""
+        if self._task is not None:
+            # 不取消任务, 等待正在进行的写入完成
+            self._closed = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self.buffer:
+            self.dropped += len(self.buffer)
+            log.error(f"drop {len(self.buffer)} events not flushed before stop")
+            self.buffer = []
+
+    def stats(self) -> dict:
+        """缓冲区统计信息.
+
+        Returns:
+            dict: 当前缓冲数, 写入中数量, 接收/拒绝/写入/丢弃总数.
+        """
+        return {
+            "buffered": len(self.buffer),
+            "flushing": self.flushing,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+        }
+
+
+event_buffer = EventBuffer(
+    max_size=EVENT_BUFFER_SIZE,
+    flush_size=EVENT_FLUSH_SIZE,
+    flush_interval=EVENT_FLUSH_INTERVAL,
+)
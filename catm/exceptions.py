@@ -14,3 +14,56 @@ class JwtAuthException(AuthException):
 class TokenAuthException(AuthException):
     """token认证异常"""
     ...
+
+
+class PasswordDecryptException(Exception):
+    """密钥不存在或不是RSA密钥, 密码解密失败"""
+    ...
+
+
+class ServerBusyException(Exception):
+    """服务繁忙, 拒绝处理"""
+    ...
+
+
+class PasswordHashBusyException(ServerBusyException):
+    """密码哈希队列已满"""
+    ...
+
+
+class TooManyAttemptsException(Exception):
+    """请求次数超出限流"""
+
+    def __init__(self, retry_after: float) -> None:
+        """初始化.
+
+        Args:
+            retry_after (float): 多少秒后可以重试.
+        """
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class RangeNotSatisfiableException(Exception):
+    """请求的Range无法满足"""
+    ...
+
+
+class BrokenMediaException(Exception):
+    """音频文件损坏"""
+    ...
+
+
+class InvalidCursorException(Exception):
+    """分页游标错误"""
+    ...
+
+
+class EventBufferFullException(Exception):
+    """事件缓冲区已满"""
+    ...
+
+
+class InvalidImageException(Exception):
+    """图片格式错误或尺寸超出限制"""
+    ...
@@ -0,0 +1,166 @@
+"""密码哈希执行器"""
+from typing import Callable, Tuple, TypeVar
+
+import time
+import asyncio
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+import argon2
+
+from catm.exceptions import PasswordHashBusyException
+from catm.settings import (
+    ARGON2_TIME_COST,
+    ARGON2_MEMORY_COST,
+    ARGON2_PARALLELISM,
+    PASSWORD_HASH_EXECUTOR,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_QUEUE_SIZE,
+)
+
+
+T = TypeVar("T")
+# (time_cost, memory_cost, parallelism)
+Argon2Params = Tuple[int, int, int]
+
+
+@functools.lru_cache(maxsize=8)
+def _hasher(params: Argon2Params) -> argon2.PasswordHasher:
+    time_cost, memory_cost, parallelism = params
+    return argon2.PasswordHasher(
+        time_cost=time_cost,
+        memory_cost=memory_cost,
+        parallelism=parallelism,
+    )
+
+
+def _hash(params: Argon2Params, password: str) -> str:
+    return _hasher(params).hash(password)
+
+
+def _verify(params: Argon2Params, hashed_password: str, password: str) -> Tuple[bool, str | None]:
+    hasher = _hasher(params)
+    try:
+        hasher.verify(hashed_password, password)
+    except argon2.exceptions.VerificationError:
+        return False, None
+    except argon2.exceptions.InvalidHashError:
+        return False, None
+    # 参数变化后登录时重新哈希
+    if hasher.check_needs_rehash(hashed_password):
+        return True, hasher.hash(password)
+    return True, None
+
+
+class PasswordHashPool:
+    """argon2哈希执行器.
+
+    argon2耗时数十毫秒, 提交到独立的线程/进程池, 避免阻塞事件循环.
+    """
+
+    def __init__(
+        self,
+        params: Argon2Params,
+        kind: str = "thread",
+        workers: int = 4,
+        queue_size: int = 64,
+    ) -> None:
+        """初始化.
+
+        Args:
+            params (Argon2Params): argon2参数(time_cost, memory_cost, parallelism).
+            kind (str, optional): 执行器类型 thread | process.
+            workers (int, optional): 工作线程/进程数.
+            queue_size (int, optional): 最大排队任务数(含执行中), 超出直接拒绝.
+        """
+        if kind not in ("thread", "process"):
+            raise RuntimeError(f"password hash executor: {kind} is not thread or process")
+        self.params = params
+        self.kind = kind
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="password-hash",
+                )
+        return self._executor
+
+    def shutdown(self) -> None:
+        """关闭执行器."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _submit(self, fn: Callable[..., T], *args) -> T:
+        if self.pending >= self.queue_size:
+            self.rejected += 1
+            raise PasswordHashBusyException()
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, self.params, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.pending -= 1
+            self.completed += 1
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+
+    async def hash(self, password: str) -> str:
+        """哈希密码.
+
+        Args:
+            password (str): 明文密码.
+
+        Returns:
+            str: 哈希后的密码.
+        """
+        return await self._submit(_hash, password)
+
+    async def verify(self, hashed_password: str, password: str) -> Tuple[bool, str | None]:
+        """验证密码.
+
+        Args:
+            hashed_password (str): 哈希后的密码.
+            password (str): 明文密码.
+
+        Returns:
+            Tuple[bool, str | None]: 是否正确, 参数变化时重新哈希后的密码.
+        """
+        return await self._submit(_verify, hashed_password, password)
+
+    def stats(self) -> dict:
+        """执行器统计信息.
+
+        Returns:
+            dict: 排队数, 完成数, 拒绝数, 平均/最大耗时(秒).
+        """
+        return {
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_avg": self.latency_total / self.completed if self.completed else 0.0,
+            "latency_max": self.latency_max,
+        }
+
+
+password_hash_pool = PasswordHashPool(
+    (ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM),
+    kind=PASSWORD_HASH_EXECUTOR,
+    workers=PASSWORD_HASH_WORKERS,
+    queue_size=PASSWORD_HASH_QUEUE_SIZE,
+)
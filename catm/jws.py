@@ -0,0 +1,150 @@
+"""JWT签名算法"""
+from typing import Dict, Tuple
+
+from abc import ABC, abstractmethod
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519, padding
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+
+from catm.constants import JwtAlgorithm
+
+
+class Algorithm(ABC):
+    """签名算法, 子类实现密钥生成, 签名和验签"""
+
+    name: JwtAlgorithm
+
+    @abstractmethod
+    def generate(self):
+        """生成私钥."""
+
+    @abstractmethod
+    def sign(self, private_key, message: bytes) -> bytes:
+        """签名.
+
+        Args:
+            private_key: 私钥.
+            message (bytes): 消息.
+
+        Returns:
+            bytes: 签名.
+        """
+
+    @abstractmethod
+    def verify(self, public_key, signature: bytes, message: bytes) -> None:
+        """验签.
+
+        Args:
+            public_key: 公钥.
+            signature (bytes): 签名.
+            message (bytes): 消息.
+
+        Raises:
+            InvalidSignature: 签名错误.
+        """
+
+
+class PS256(Algorithm):
+    """RSA-PSS SHA-256, 2048位密钥"""
+
+    name = JwtAlgorithm.PS256
+    _padding = padding.PSS(
+        mgf=padding.MGF1(hashes.SHA256()),
+        salt_length=padding.PSS.MAX_LENGTH,
+    )
+
+    def generate(self) -> rsa.RSAPrivateKey:
+        return rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=2048,
+            backend=default_backend()
+        )
+
+    def sign(self, private_key: rsa.RSAPrivateKey, message: bytes) -> bytes:
+        return private_key.sign(message, self._padding, hashes.SHA256())
+
+    def verify(self, public_key: rsa.RSAPublicKey, signature: bytes, message: bytes) -> None:
+        public_key.verify(signature, message, self._padding, hashes.SHA256())
+
+
+class ES256(Algorithm):
+    """ECDSA P-256 SHA-256, 签名为JWS规定的 r||s 定长格式"""
+
+    name = JwtAlgorithm.ES256
+
+    def generate(self) -> ec.EllipticCurvePrivateKey:
+        return ec.generate_private_key(ec.SECP256R1())
+
+    def sign(self, private_key: ec.EllipticCurvePrivateKey, message: bytes) -> bytes:
+        r, s = decode_dss_signature(private_key.sign(message, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+    def verify(self, public_key: ec.EllipticCurvePublicKey, signature: bytes, message: bytes) -> None:
+        if len(signature) != 64:
+            raise InvalidSignature()
+        r = int.from_bytes(signature[:32], "big")
+        s = int.from_bytes(signature[32:], "big")
+        public_key.verify(encode_dss_signature(r, s), message, ec.ECDSA(hashes.SHA256()))
+
+
+class EdDSA(Algorithm):
+    """Ed25519"""
+
+    name = JwtAlgorithm.EdDSA
+
+    def generate(self) -> ed25519.Ed25519PrivateKey:
+        return ed25519.Ed25519PrivateKey.generate()
+
+    def sign(self, private_key: ed25519.Ed25519PrivateKey, message: bytes) -> bytes:
+        return private_key.sign(message)
+
+    def verify(self, public_key: ed25519.Ed25519PublicKey, signature: bytes, message: bytes) -> None:
+        public_key.verify(signature, message)
+
+
+ALGORITHMS: Dict[str, Algorithm] = {
+    algorithm.name: algorithm
+    for algorithm in (PS256(), ES256(), EdDSA())
+}
+# 旧版本签发的jwt头部为RS256, 实际使用RSA-PSS签名
+ALIASES = {"RS256": JwtAlgorithm.PS256}
+
+
+def get_algorithm(name: str) -> Algorithm:
+    """通过jwt头部的alg获取签名算法.
+
+    Args:
+        name (str): 算法名称.
+
+    Raises:
+        KeyError: 不支持的算法.
+
+    Returns:
+        Algorithm: 签名算法.
+    """
+    return ALGORITHMS[ALIASES.get(name, name)]
+
+
+def generate_key_pair(algorithm: str) -> Tuple[str, str]:
+    """生成PEM格式的密钥对, 可在子进程中执行.
+
+    Args:
+        algorithm (str): 算法名称.
+
+    Returns:
+        Tuple[str, str]: 公钥, 私钥.
+    """
+    private_key = ALGORITHMS[algorithm].generate()
+    private_key_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    public_key_pem = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return public_key_pem.decode(), private_key_pem.decode()
@@ -0,0 +1,163 @@
+"""进程内密钥环"""
+from typing import Any, Dict, List, Tuple
+from uuid import UUID
+
+import time
+import json
+import random
+import asyncio
+from dataclasses import dataclass
+
+import structlog
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_public_key,
+    load_pem_private_key,
+)
+
+from catm import models
+from catm.constants import JwtAlgorithm
+from catm.settings import KEY_RING_RELOAD_INTERVAL
+
+
+log = structlog.getLogger()
+
+
+@dataclass(frozen=True, slots=True)
+class KeyEntry:
+    """已解析的密钥对"""
+
+    kid: str
+    algorithm: str
+    # RSA密钥对同时用于前端加密传输密码, 其它算法只用于jwt签名
+    private_key: Any
+    public_key: Any
+    # /rsa 接口预序列化的响应体
+    body: bytes
+
+
+class KeyRing:
+    """进程内密钥环.
+
+    启动时一次性加载全部密钥对并解析, 之后随机取密钥不再访问数据库.
+    定时重新加载, 遇到未知kid时按需重新加载, 保证密钥轮换生效.
+    """
+
+    def __init__(self, reload_interval: int = 10 * 60, miss_reload_interval: float = 1.0) -> None:
+        self.reload_interval = reload_interval
+        self.miss_reload_interval = miss_reload_interval
+        self._entries: Dict[str, KeyEntry] = {}
+        # 按算法分组的密钥ID
+        self._kids: Dict[str, List[str]] = {}
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def reload(self) -> int:
+        """从数据库重新加载密钥对.
+
+        Returns:
+            int: 密钥对数量.
+        """
+        async with self._lock:
+            entries = {}
+            async for key_pair in models.KeyPair.all():
+                kid = str(key_pair.id)
+                entry = self._entries.get(kid)
+                if entry is None:
+                    entry = KeyEntry(
+                        kid=kid,
+                        algorithm=key_pair.algorithm,
+                        # 密钥由服务自己生成, 跳过耗时的RSA参数校验
+                        private_key=load_pem_private_key(
+                            key_pair.private_key.encode(),
+                            None,
+                            unsafe_skip_rsa_key_validation=True,
+                        ),
+                        public_key=load_pem_public_key(key_pair.public_key.encode()),
+                        body=json.dumps({"kid": kid, "public_key": key_pair.public_key}).encode(),
+                    )
+                entries[kid] = entry
+            # 整体替换, 读操作无需加锁
+            self._entries = entries
+            kids: Dict[str, List[str]] = {}
+            for entry in entries.values():
+                kids.setdefault(entry.algorithm, []).append(entry.kid)
+            self._kids = kids
+            self._loaded_at = time.monotonic()
+        log.info(f"key ring loaded {len(entries)} key pair")
+        return len(entries)
+
+    async def get(self, kid: str | UUID) -> KeyEntry:
+        """通过kid获取密钥对, 未命中时重新加载一次.
+
+        Args:
+            kid (str | UUID): 密钥ID.
+
+        Raises:
+            KeyError: 密钥不存在.
+
+        Returns:
+            KeyEntry: 密钥对.
+        """
+        kid = str(kid)
+        entry = self._entries.get(kid)
+        if entry is None:
+            # 限制未命中触发的重新加载频率, 避免伪造kid打穿数据库
+            if time.monotonic() - self._loaded_at >= self.miss_reload_interval:
+                await self.reload()
+            entry = self._entries.get(kid)
+            if entry is None:
+                raise KeyError(kid)
+        return entry
+
+    def rand(self, algorithm: str = JwtAlgorithm.PS256) -> KeyEntry:
+        """随机获取密钥对.
+
+        Args:
+            algorithm (str, optional): 算法, 默认RSA.
+
+        Returns:
+            KeyEntry: 密钥对.
+        """
+        return self._entries[random.choice(self._kids[algorithm])]
+
+    def rand_private_key(self, algorithm: str = JwtAlgorithm.PS256) -> Tuple[str, Any]:
+        """随机获取私钥.
+
+        Args:
+            algorithm (str, optional): 算法, 默认RSA.
+
+        Returns:
+            Tuple[str, Any]: 密钥ID, 私钥.
+        """
+        entry = self.rand(algorithm)
+        return entry.kid, entry.private_key
+
+    def start(self) -> None:
+        """启动定时重新加载任务."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._reload_forever())
+
+    async def stop(self) -> None:
+        """停止定时重新加载任务."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _reload_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+            except Exception:
+                log.exception("key ring reload failed")
+
+
+key_ring = KeyRing(KEY_RING_RELOAD_INTERVAL)
@@ -2,20 +2,34 @@
 from contextlib import asynccontextmanager
 
 import structlog
-from aerich import Command
+from tortoise import Tortoise
 from fastapi import FastAPI, Request, status
+from fastapi.responses import PlainTextResponse, ORJSONResponse
 
-from tortoise.contrib.fastapi import register_tortoise
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-
-
-from catm import models
 from catm.api import router
+from catm.startup import startup
+from catm.keyring import key_ring
+from catm.hashing import password_hash_pool
+from catm.verify import media_verifier
+from catm.search import search_index
+from catm.events import event_buffer
+from catm.ranking import ranking
+from catm.comments import comment_counter
+from catm.blobstore import blob_store
+from catm.db import ReadAfterWriteMiddleware
+from catm.tracing import TracingMiddleware
+from catm.profiler import profiler, ProfilerMiddleware
+from catm.metrics import registry, MetricsMiddleware, instrument_tortoise, instrument_redis
 from catm.response import ErrorResponse
-from catm.exceptions import AuthException
-from catm.settings import TORTOISE_ORM, APP_NAME
+from catm.ratelimit import retry_after
+from catm.exceptions import (
+    AuthException,
+    ServerBusyException,
+    TooManyAttemptsException,
+    EventBufferFullException,
+    PasswordDecryptException,
+)
+from catm.settings import TORTOISE_ORM, MEDIA_VERIFY_WORKERS, STARTUP_MIGRATE
 
 
 @asynccontextmanager
@@ -25,45 +39,62 @@ async def lifespan(app: FastAPI):
     Args:
         app (FastAPI): app.
     """
-    command = Command(tortoise_config=TORTOISE_ORM, app=APP_NAME, location="./migrations")
-    await command.init()
-    log.info("aerich upgrade")
-    await command.upgrade(run_in_transaction=True)
-    # fastapi注册数据库配置
-    register_tortoise(
-        app,
-        config=TORTOISE_ORM,
-        add_exception_handlers=False,
-    )
-    # 初始化RSA密钥对
-    key_pair_count = await models.KeyPair.all().count()
-    while key_pair_count < 32:
-        private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048,
-            backend=default_backend()
-        )
-        public_key = private_key.public_key()
-        private_key_pem = private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-        public_key_pem = public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        )
-        await models.KeyPair.create(
-            public_key=public_key_pem.decode(),
-            private_key=private_key_pem.decode(),
-        )
-        key_pair_count += 1
-    log.info(f"create key pair over {key_pair_count}")
+    async with startup.phase("database"):
+        await Tortoise.init(config=TORTOISE_ORM)
+    # 记录数据库和redis耗时
+    instrument_tortoise()
+    instrument_redis()
+    # 多个worker中只有一个执行迁移
+    if STARTUP_MIGRATE:
+        async with startup.phase("migrate"):
+            await startup.migrate()
+    # 只等待最少数量的密钥对, 其余后台生成
+    async with startup.phase("keys"):
+        await startup.provision_min_keys()
+    startup.start()
+    # 加载密钥环
+    async with startup.phase("key_ring"):
+        await key_ring.reload()
+    key_ring.start()
+    # 加载搜索索引
+    async with startup.phase("search_index"):
+        await search_index.load()
+    search_index.start()
+    # 行为事件批量写入
+    event_buffer.start()
+    # 排行榜定时重建
+    ranking.start()
+    # 评论数定时写入
+    comment_counter.start()
+    # 未引用音频定时回收
+    blob_store.start()
+    # 音频校验消费者
+    if MEDIA_VERIFY_WORKERS > 0:
+        media_verifier.start()
+    # 指标定时写入redis
+    registry.start()
+    startup.report()
     yield
+    await registry.stop()
+    await startup.stop()
+    await media_verifier.stop()
+    await event_buffer.stop()
+    await ranking.stop()
+    await comment_counter.stop()
+    await blob_store.stop()
+    await search_index.stop()
+    await key_ring.stop()
+    password_hash_pool.shutdown()
+    await Tortoise.close_connections()
 
 
 log = structlog.getLogger()
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(ReadAfterWriteMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilerMiddleware, profiler=profiler)
+# 最外层, 追踪覆盖其它中间件
+app.add_middleware(TracingMiddleware)
 app.include_router(router)
 
 
@@ -76,6 +107,19 @@ async def health():
     return True
 
 
+@app.get(
+    "/metrics",
+    description="Prometheus指标, 包含全部worker",
+    tags=["探针"],
+    response_class=PlainTextResponse,
+)
+async def metrics():
+    return PlainTextResponse(
+        await registry.collect(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @app.exception_handler(AuthException)
 async def jwt_exception_handler(_request: Request, _exc: AuthException):
     """拦截JWT认证失败的异常.
@@ -90,6 +134,61 @@ async def jwt_exception_handler(_request: Request, _exc: AuthException):
     )
 
 
+@app.exception_handler(PasswordDecryptException)
+async def password_decrypt_exception_handler(_request: Request, _exc: PasswordDecryptException):
+    """拦截密码解密失败的异常, 密钥不存在等同于密码错误.
+
+    Returns:
+        ErrorResponse: 103 account or password error.
+    """
+    return ErrorResponse(code=103, msg="account or password error")
+
+
+@app.exception_handler(ServerBusyException)
+async def server_busy_exception_handler(_request: Request, _exc: ServerBusyException):
+    """拦截密码哈希队列已满, 准入控制拒绝的异常.
+
+    Returns:
+        ErrorResponse: 105 server busy.
+    """
+    return ErrorResponse(
+        code=105,
+        msg="server busy",
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(TooManyAttemptsException)
+async def too_many_attempts_exception_handler(_request: Request, exc: TooManyAttemptsException):
+    """拦截超出限流的异常.
+
+    Returns:
+        ErrorResponse: 108 too many attempts.
+    """
+    return ErrorResponse(
+        code=108,
+        msg="too many attempts",
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": retry_after(exc.retry_after)},
+    )
+
+
+@app.exception_handler(EventBufferFullException)
+async def event_buffer_full_exception_handler(_request: Request, _exc: EventBufferFullException):
+    """拦截事件缓冲区已满的异常.
+
+    Returns:
+        ErrorResponse: 106 too many requests.
+    """
+    return ErrorResponse(
+        code=106,
+        msg="too many requests",
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": "1"},
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, port=8000)
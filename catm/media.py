@@ -0,0 +1,163 @@
+"""音频文件解析"""
+from typing import BinaryIO, Iterator, List, Tuple
+
+import os
+import struct
+from dataclasses import dataclass
+
+from catm.exceptions import BrokenMediaException
+
+
+# 需要递归解析的容器box
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf"}
+
+
+@dataclass(frozen=True, slots=True)
+class MediaInfo:
+    """音频信息"""
+
+    # 时长(秒)
+    duration: float
+    # 平均码率(bit/s)
+    bitrate: int
+    size: int
+
+
+def _iter_boxes(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """遍历内存中的box.
+
+    Yields:
+        Iterator[Tuple[bytes, int, int]]: box类型, 内容起始位置, 结束位置.
+    """
+    offset = start
+    while offset < end:
+        if end - offset < 8:
+            raise BrokenMediaException("truncated box header")
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            if end - offset < 16:
+                raise BrokenMediaException("truncated box header")
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise BrokenMediaException(f"invalid {box_type!r} box size")
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _read_top_level(file: BinaryIO, file_size: int) -> List[Tuple[bytes, int, int, int]]:
+    """读取顶层box, 不读取内容.
+
+    Returns:
+        List[Tuple[bytes, int, int, int]]: box类型, box起始位置, 内容起始位置, 结束位置.
+    """
+    boxes = []
+    offset = 0
+    while offset < file_size:
+        file.seek(offset)
+        header = file.read(16)
+        if len(header) < 8:
+            raise BrokenMediaException("truncated box header")
+        size, box_type = struct.unpack_from(">I4s", header)
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                raise BrokenMediaException("truncated box header")
+            size = struct.unpack_from(">Q", header, 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - offset
+        if size < header_size or offset + size > file_size:
+            raise BrokenMediaException(f"invalid {box_type!r} box size")
+        boxes.append((box_type, offset, offset + header_size, offset + size))
+        offset += size
+    return boxes
+
+
+def _parse_mvhd(data: bytes, start: int, end: int) -> float:
+    if end - start < 4:
+        raise BrokenMediaException("truncated mvhd")
+    version = data[start]
+    if version == 1:
+        if end - start < 32:
+            raise BrokenMediaException("truncated mvhd")
+        timescale, duration = struct.unpack_from(">IQ", data, start + 20)
+    else:
+        if end - start < 20:
+            raise BrokenMediaException("truncated mvhd")
+        timescale, duration = struct.unpack_from(">II", data, start + 12)
+    if timescale == 0:
+        raise BrokenMediaException("invalid mvhd timescale")
+    return duration / timescale
+
+
+def _chunk_offsets(data: bytes, box_type: bytes, start: int, end: int) -> List[int]:
+    if end - start < 8:
+        raise BrokenMediaException(f"truncated {box_type!r}")
+    count = struct.unpack_from(">I", data, start + 4)[0]
+    width = 8 if box_type == b"co64" else 4
+    if start + 8 + count * width > end:
+        raise BrokenMediaException(f"truncated {box_type!r}")
+    fmt = ">%d%s" % (count, "Q" if width == 8 else "I")
+    return list(struct.unpack_from(fmt, data, start + 8))
+
+
+def probe_mp4(file_path: str) -> MediaInfo:
+    """解析MP4/M4A文件结构, 校验ftyp/moov/mdat一致性.
+
+    Args:
+        file_path (str): 文件路径.
+
+    Raises:
+        BrokenMediaException: 文件损坏.
+
+    Returns:
+        MediaInfo: 音频信息.
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as file:
+        boxes = _read_top_level(file, file_size)
+        if not boxes or boxes[0][0] != b"ftyp":
+            raise BrokenMediaException("missing ftyp")
+        moov = [box for box in boxes if box[0] == b"moov"]
+        mdat = [(start, end) for box_type, _, start, end in boxes if box_type == b"mdat"]
+        if len(moov) != 1:
+            raise BrokenMediaException("missing moov")
+        if not mdat or all(start == end for start, end in mdat):
+            raise BrokenMediaException("missing mdat")
+        fragmented = any(box[0] == b"moof" for box in boxes)
+        _, _, moov_start, moov_end = moov[0]
+        file.seek(moov_start)
+        moov_data = file.read(moov_end - moov_start)
+
+    duration = None
+    tracks = 0
+    offsets: List[int] = []
+    stack = [(0, len(moov_data))]
+    while stack:
+        start, end = stack.pop()
+        for box_type, box_start, box_end in _iter_boxes(moov_data, start, end):
+            if box_type == b"mvhd":
+                duration = _parse_mvhd(moov_data, box_start, box_end)
+            elif box_type == b"trak":
+                tracks += 1
+                stack.append((box_start, box_end))
+            elif box_type in (b"stco", b"co64"):
+                offsets.extend(_chunk_offsets(moov_data, box_type, box_start, box_end))
+            elif box_type in CONTAINER_BOXES:
+                stack.append((box_start, box_end))
+    if duration is None:
+        raise BrokenMediaException("missing mvhd")
+    if tracks == 0:
+        raise BrokenMediaException("missing trak")
+    if duration <= 0 and not fragmented:
+        raise BrokenMediaException("invalid duration")
+    # 所有chunk偏移都必须落在mdat内
+    for offset in offsets:
+        if not any(start <= offset < end for start, end in mdat):
+            raise BrokenMediaException("chunk offset outside mdat")
+    bitrate = int(file_size * 8 / duration) if duration > 0 else 0
+    return MediaInfo(duration=duration, bitrate=bitrate, size=file_size)
@@ -0,0 +1,463 @@
+"""Prometheus指标"""
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import functools
+from bisect import bisect_left
+from contextvars import ContextVar
+
+import structlog
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from tortoise import connections
+
+from catm import redis
+from catm.tracing import span
+from catm.settings import APP_NAME, METRICS_REPORT_INTERVAL
+
+
+log = structlog.getLogger()
+Labels = Tuple[str, ...]
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """指标, 按标签值分别记录"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.samples: Dict[Labels, Any] = {}
+
+    def snapshot(self) -> dict:
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labels": self.labelnames,
+            "samples": [[list(labels), value] for labels, value in self.samples.items()],
+        }
+
+
+class Counter(Metric):
+    """只增计数"""
+
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.samples[labels] = self.samples.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """当前值"""
+
+    type = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.samples[labels] = self.samples.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.samples[labels] = self.samples.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """分布, 每个标签值记录 [各桶数量, 总和, 数量]"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        sample = self.samples.get(labels)
+        if sample is None:
+            # 最后一个桶为 +Inf
+            sample = self.samples[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        sample[0][bisect_left(self.buckets, value)] += 1
+        sample[1] += value
+        sample[2] += 1
+
+    def time(self, *labels: str) -> "_Timer":
+        """记录代码块耗时.
+
+        Returns:
+            _Timer: 上下文管理器.
+        """
+        return _Timer(self, labels)
+
+    def snapshot(self) -> dict:
+        snapshot = super().snapshot()
+        snapshot["buckets"] = self.buckets
+        return snapshot
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Labels) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def merge(snapshots: List[Dict[str, dict]]) -> Dict[str, dict]:
+    """合并多个worker的指标, 相同标签的值相加.
+
+    Args:
+        snapshots (List[Dict[str, dict]]): 各worker的指标快照.
+
+    Returns:
+        Dict[str, dict]: 合并后的指标.
+    """
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                labels = tuple(labels)
+                current = target["samples"].get(labels)
+                if current is None:
+                    target["samples"][labels] = value
+                elif metric["type"] == "histogram":
+                    target["samples"][labels] = [
+                        [a + b for a, b in zip(current[0], value[0])],
+                        current[1] + value[1],
+                        current[2] + value[2],
+                    ]
+                else:
+                    target["samples"][labels] = current + value
+    return merged
+
+
+def render(metrics: Dict[str, dict]) -> str:
+    """输出Prometheus文本格式.
+
+    Args:
+        metrics (Dict[str, dict]): 合并后的指标.
+
+    Returns:
+        str: 文本.
+    """
+    lines = []
+    for name, metric in sorted(metrics.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labels"]
+        for labels, value in sorted(metric["samples"].items()):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for le, bucket_count in zip([*metric["buckets"], float("inf")], counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels([*labelnames, "le"], [*labels, _format_value(le)])
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labelnames, labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class Registry:
+    """进程内指标注册表.
+
+    各worker定时把指标快照写入redis, 抓取时合并全部存活worker的快照,
+    任意worker返回的都是整个服务的指标.
+    """
+
+    def __init__(self, report_interval: int = 15) -> None:
+        """初始化.
+
+        Args:
+            report_interval (int, optional): 写入redis间隔(秒).
+        """
+        self.report_interval = report_interval
+        self.metrics: Dict[str, Metric] = {}
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+        self.key = f"{APP_NAME}:metrics"
+        self._task: asyncio.Task | None = None
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, dict]:
+        """当前进程的指标快照.
+
+        Returns:
+            Dict[str, dict]: 指标名 -> 指标.
+        """
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    async def report(self) -> None:
+        """写入当前进程的指标快照."""
+        value = json.dumps({"at": time.time(), "metrics": self.snapshot()})
+        async with redis.client.pipeline(transaction=False) as pipe:
+            pipe.hset(self.key, self.worker, value)
+            pipe.expire(self.key, self.report_interval * 10)
+            await pipe.execute()
+
+    async def collect(self) -> str:
+        """合并全部存活worker的指标.
+
+        Returns:
+            str: Prometheus文本格式.
+        """
+        snapshots = [self.snapshot()]
+        expired = []
+        try:
+            workers = await redis.client.hgetall(self.key)
+        except Exception:
+            log.exception("collect metrics failed")
+            workers = {}
+        now = time.time()
+        for worker, value in workers.items():
+            if worker == self.worker:
+                continue
+            value = json.loads(value)
+            # 超过3个周期未上报的worker视为已退出
+            if now - value["at"] > self.report_interval * 3:
+                expired.append(worker)
+                continue
+            snapshots.append(value["metrics"])
+        if expired:
+            await redis.client.hdel(self.key, *expired)
+        return render(merge(snapshots))
+
+    async def _report_forever(self) -> None:
+        while True:
+            try:
+                await self.report()
+            except Exception:
+                log.exception("report metrics failed")
+            await asyncio.sleep(self.report_interval)
+
+    def start(self) -> None:
+        """启动定时上报任务."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._report_forever())
+
+    async def stop(self) -> None:
+        """停止定时上报任务并删除当前进程的快照."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                await redis.client.hdel(self.key, self.worker)
+            except Exception:
+                log.exception("remove metrics failed")
+
+
+registry = Registry(report_interval=METRICS_REPORT_INTERVAL)
+http_requests = registry.counter(
+    "catm_http_requests_total",
+    "HTTP请求数",
+    ("method", "route", "status"),
+)
+http_request_seconds = registry.histogram(
+    "catm_http_request_duration_seconds",
+    "HTTP请求耗时",
+    ("method", "route", "status"),
+)
+http_in_flight = registry.gauge(
+    "catm_http_requests_in_flight",
+    "正在处理的HTTP请求数",
+)
+db_query_seconds = registry.histogram(
+    "catm_db_query_duration_seconds",
+    "数据库查询耗时",
+    ("operation",),
+)
+redis_command_seconds = registry.histogram(
+    "catm_redis_command_duration_seconds",
+    "redis命令耗时",
+    ("command",),
+)
+crypto_seconds = registry.histogram(
+    "catm_crypto_duration_seconds",
+    "加解密和密码哈希耗时, 密码哈希包含排队时间",
+    ("operation",),
+)
+streamed_bytes = registry.counter(
+    "catm_streamed_bytes_total",
+    "文件响应发送的字节数",
+    ("media_type",),
+)
+rate_limit_checks = registry.counter(
+    "catm_rate_limit_checks_total",
+    "限流检查次数, result 为 allowed | limited",
+    ("limiter", "result"),
+)
+admission_in_flight = registry.gauge(
+    "catm_admission_in_flight",
+    "准入控制中正在执行的请求数",
+    ("gate",),
+)
+admission_waiting = registry.gauge(
+    "catm_admission_waiting",
+    "准入控制中排队的请求数",
+    ("gate",),
+)
+admission_rejected = registry.counter(
+    "catm_admission_rejected_total",
+    "准入控制拒绝的请求数, reason 为 queue_full | timeout",
+    ("gate", "reason"),
+)
+
+
+class MetricsMiddleware:
+    """记录HTTP请求数, 耗时和并发数, 按路由模板聚合避免路径参数导致标签过多"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "<unmatched>"), str(status))
+            http_requests.inc(*labels)
+            http_request_seconds.observe(elapsed, *labels)
+
+
+# 嵌套调用(例如 execute_query_dict 调用 execute_query)只记录最外层
+_in_db_call: ContextVar[bool] = ContextVar("in_db_call", default=False)
+
+
+def _timed_db(func: Callable, operation: str) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _in_db_call.get():
+            return await func(*args, **kwargs)
+        token = _in_db_call.set(True)
+        start = time.perf_counter()
+        try:
+            with span(f"db.{operation}", sql=str(args[1])[:200] if len(args) > 1 else None):
+                return await func(*args, **kwargs)
+        finally:
+            db_query_seconds.observe(time.perf_counter() - start, operation)
+            _in_db_call.reset(token)
+
+    return wrapper
+
+
+def instrument_tortoise() -> None:
+    """记录数据库查询耗时, 在 Tortoise.init 之后调用."""
+    operations = {
+        "execute_query": "query",
+        "execute_query_dict": "query",
+        "execute_insert": "insert",
+        "execute_many": "many",
+        "execute_script": "script",
+    }
+    for connection in connections.all():
+        client_class = type(connection)
+        # 事务使用同模块的 TransactionWrapper, 部分方法单独实现
+        transaction_class = getattr(sys.modules[client_class.__module__], "TransactionWrapper", None)
+        for cls in (client_class, transaction_class):
+            if cls is None or cls.__dict__.get("_instrumented"):
+                continue
+            for method, operation in operations.items():
+                if method in cls.__dict__:
+                    setattr(cls, method, _timed_db(cls.__dict__[method], operation))
+            cls._instrumented = True
+
+
+def instrument_redis() -> None:
+    """记录redis命令耗时."""
+    if getattr(Redis, "_instrumented", False):
+        return
+    execute_command = Redis.execute_command
+    pipeline_execute = Pipeline.execute
+
+    @functools.wraps(execute_command)
+    async def timed_execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            with span(f"redis.{str(args[0]).upper()}"):
+                return await execute_command(self, *args, **options)
+        finally:
+            redis_command_seconds.observe(time.perf_counter() - start, str(args[0]).upper())
+
+    @functools.wraps(pipeline_execute)
+    async def timed_pipeline_execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with span("redis.PIPELINE", commands=len(self.command_stack)):
+                return await pipeline_execute(self, *args, **kwargs)
+        finally:
+            redis_command_seconds.observe(time.perf_counter() - start, "PIPELINE")
+
+    Redis.execute_command = timed_execute_command
+    Pipeline.execute = timed_pipeline_execute
+    Redis._instrumented = True
@@ -6,6 +6,7 @@ class KeyPair(models.Model):
     """密钥"""
 
     id = fields.UUIDField(pk=True, description="密钥ID")
+    algorithm = fields.CharField(max_length=16, default="PS256", description="签名算法")
     public_key = fields.CharField(max_length=2048, description="公钥")
     private_key = fields.CharField(max_length=2048, description="私钥")
 
@@ -41,6 +42,11 @@ class Music(models.Model):
     singer = fields.JSONField(null=True, description="歌手")
     status = fields.CharField(max_length=32, description="状态")
     creator = fields.UUIDField(description="创建者ID")
+    sha256 = fields.CharField(max_length=64, null=True, description="音频sha256")
+    size = fields.BigIntField(null=True, description="音频大小")
+    mime = fields.CharField(max_length=64, null=True, description="音频媒体类型")
+    duration = fields.FloatField(null=True, description="时长(秒)")
+    bitrate = fields.IntField(null=True, description="码率(bit/s)")
 
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
@@ -49,3 +55,116 @@ class Music(models.Model):
         """元数据"""
 
         table = "music"
+        # 用户上传列表游标分页, 按sha256查询音频引用
+        indexes = (("creator", "created_at", "id"), ("sha256",))
+
+
+class AudioBlob(models.Model):
+    """音频文件表, 相同内容只存储一份"""
+
+    sha256 = fields.CharField(pk=True, max_length=64, description="音频sha256")
+    size = fields.BigIntField(description="音频大小")
+    ref_count = fields.IntField(default=0, description="引用的音乐数")
+    status = fields.CharField(max_length=32, description="校验状态")
+    duration = fields.FloatField(null=True, description="时长(秒)")
+    bitrate = fields.IntField(null=True, description="码率(bit/s)")
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        """元数据"""
+
+        table = "audio_blob"
+        # 查询未被引用的文件
+        indexes = (("ref_count", "updated_at"),)
+
+
+class MusicEvent(models.Model):
+    """音乐行为事件表"""
+
+    id = fields.BigIntField(pk=True)
+    user_id = fields.UUIDField(description="用户ID")
+    music_id = fields.UUIDField(description="音乐ID")
+    type = fields.CharField(max_length=16, description="事件类型")
+    value = fields.IntField(null=True, description="事件值, 例如播放进度(秒)")
+    occurred_at = fields.DatetimeField(description="事件发生时间")
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        """元数据"""
+
+        table = "music_event"
+        indexes = (("music_id", "type", "occurred_at"),)
+
+
+class Playlist(models.Model):
+    """推荐榜单表"""
+
+    id = fields.UUIDField(pk=True, description="榜单ID")
+    name = fields.CharField(max_length=128, description="榜单名称")
+    description = fields.CharField(max_length=1024, null=True, description="榜单描述")
+    creator = fields.UUIDField(description="创建者ID")
+    version = fields.IntField(default=1, description="物化版本号, 内容变化时递增")
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        """元数据"""
+
+        table = "playlist"
+
+
+class PlaylistMusic(models.Model):
+    """榜单音乐表"""
+
+    id = fields.BigIntField(pk=True)
+    playlist_id = fields.UUIDField(description="榜单ID")
+    music_id = fields.UUIDField(index=True, description="音乐ID")
+    position = fields.IntField(description="排序位置")
+
+    class Meta:
+        """元数据"""
+
+        table = "playlist_music"
+        unique_together = (("playlist_id", "music_id"),)
+
+
+class Comment(models.Model):
+    """评论表"""
+
+    id = fields.UUIDField(pk=True, description="评论ID")
+    target_type = fields.CharField(max_length=16, description="评论对象类型")
+    target_id = fields.UUIDField(description="评论对象ID")
+    user_id = fields.UUIDField(description="评论用户ID")
+    parent_id = fields.UUIDField(null=True, description="回复的评论ID")
+    content = fields.CharField(max_length=1024, description="评论内容")
+    reply_count = fields.IntField(default=0, description="回复数")
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        """元数据"""
+
+        table = "comment"
+        indexes = (
+            ("target_type", "target_id", "created_at"),
+            ("parent_id", "created_at"),
+        )
+
+
+class CommentCounter(models.Model):
+    """评论数表, 由redis计数定时写入"""
+
+    id = fields.BigIntField(pk=True)
+    target_type = fields.CharField(max_length=16, description="评论对象类型")
+    target_id = fields.UUIDField(description="评论对象ID")
+    count = fields.IntField(default=0, description="评论数")
+
+    class Meta:
+        """元数据"""
+
+        table = "comment_counter"
+        unique_together = (("target_type", "target_id"),)
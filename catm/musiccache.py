@@ -0,0 +1,168 @@
+"""音乐信息缓存"""
+from typing import Dict, Iterable, List
+from uuid import UUID
+
+import orjson
+
+from catm import redis, models
+from catm.db import primary
+from catm.cache import TTLCache
+from catm.settings import (
+    APP_NAME,
+    MUSIC_CACHE_SIZE,
+    MUSIC_CACHE_LOCAL_TTL,
+    MUSIC_CACHE_REDIS_TTL,
+)
+
+
+# 负缓存标记, 音乐不存在
+_NOT_FOUND = ""
+# 数据库查询期间版本号未变化时才写入缓存, 避免覆盖期间的失效
+# KEYS: 缓存键..., 版本号键...  ARGV: 缓存秒数, 不存在缓存秒数, (查询前的版本号, 缓存值)...
+_FILL = """
+local n = #KEYS / 2
+local written = {}
+for i = 1, n do
+    local value = ARGV[2 + i * 2]
+    if (redis.call("GET", KEYS[n + i]) or "") == ARGV[1 + i * 2] then
+        redis.call("SET", KEYS[i], value, "EX", value == "" and ARGV[2] or ARGV[1])
+        written[i] = 1
+    else
+        written[i] = 0
+    end
+end
+return written
+"""
+
+
+class MusicCache:
+    """音乐信息两级读穿缓存.
+
+    进程内LRU在前, redis在后, 都未命中时一次 id__in 查询数据库.
+    不存在的音乐同样缓存, 避免反复查询. 进程内缓存过期时间很短,
+    其它worker更新后最多延迟 local_ttl 秒可见.
+    每个音乐有一个版本号, 失效时递增, 查询数据库前后版本号不一致时不写入缓存.
+    缓存保存序列化后的json, 每次读取反序列化, 调用方拿到的是独立的dict, 可以修改.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        local_ttl: float = 5,
+        redis_ttl: int = 60 * 60,
+        negative_ttl: int = 60,
+    ) -> None:
+        """初始化.
+
+        Args:
+            maxsize (int, optional): 进程内缓存容量.
+            local_ttl (float, optional): 进程内缓存秒数.
+            redis_ttl (int, optional): redis缓存秒数.
+            negative_ttl (int, optional): 不存在的音乐缓存秒数.
+        """
+        self.local: TTLCache[bytes | str] = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+        self.negative_ttl = negative_ttl
+        self.script = redis.client.register_script(_FILL)
+
+    @staticmethod
+    def key(id: str) -> str:
+        return f"{APP_NAME}:music:{id}"
+
+    @staticmethod
+    def generation_key(id: str) -> str:
+        return f"{APP_NAME}:music:{id}:generation"
+
+    async def get(self, id: str | UUID) -> dict | None:
+        """获取音乐信息.
+
+        Args:
+            id (str | UUID): 音乐ID.
+
+        Returns:
+            dict | None: 音乐信息, 不存在为None.
+        """
+        return (await self.get_many([id]))[str(id)]
+
+    async def get_many(self, ids: Iterable[str | UUID]) -> Dict[str, dict | None]:
+        """批量获取音乐信息.
+
+        Args:
+            ids (Iterable[str | UUID]): 音乐ID列表.
+
+        Returns:
+            Dict[str, dict | None]: 音乐ID -> 音乐信息, 不存在为None.
+        """
+        order = list(dict.fromkeys(str(id) for id in ids))
+        result: Dict[str, bytes | str] = {}
+        misses: List[str] = []
+        for id in order:
+            value = self.local.get(id)
+            if value is None:
+                misses.append(id)
+            else:
+                result[id] = value
+        if misses:
+            await self._fetch(misses, result)
+        # 按请求顺序返回
+        return {id: orjson.loads(result[id]) if result[id] else None for id in order}
+
+    async def _fetch(self, misses: List[str], result: Dict[str, bytes | str]) -> None:
+        # redis批量读取, 同时读取版本号
+        keys = [self.key(id) for id in misses] + [self.generation_key(id) for id in misses]
+        values = await redis.client.mget(keys)
+        generations = values[len(misses):]
+        db_misses = []
+        for id, value, generation in zip(misses, values, generations):
+            if value is None:
+                db_misses.append((id, generation or ""))
+                continue
+            value = value.encode() if value else _NOT_FOUND
+            self.local.set(id, value)
+            result[id] = value
+        if not db_misses:
+            return
+        # 数据库一次查询所有未命中
+        with primary():
+            rows = await models.Music.filter(id__in=[id for id, _ in db_misses]).values()
+        # orjson直接序列化UUID和datetime, 比 jsonable_encoder 快一个数量级
+        found = {str(row["id"]): orjson.dumps(row) for row in rows}
+        args = [self.redis_ttl, self.negative_ttl]
+        for id, generation in db_misses:
+            args += [generation, found.get(id, _NOT_FOUND)]
+        written = await self.script(
+            keys=[self.key(id) for id, _ in db_misses] + [self.generation_key(id) for id, _ in db_misses],
+            args=args,
+            client=redis.client,
+        )
+        for (id, _), ok in zip(db_misses, written):
+            value = found.get(id, _NOT_FOUND)
+            # 查询期间已失效的结果只用于本次返回
+            if ok:
+                self.local.set(id, value)
+            result[id] = value
+
+    async def invalidate(self, *ids: str | UUID) -> None:
+        """音乐信息变更后删除缓存.
+
+        Args:
+            ids (str | UUID): 音乐ID.
+        """
+        if not ids:
+            return
+        async with redis.client.pipeline(transaction=False) as pipe:
+            for id in ids:
+                id = str(id)
+                self.local.pop(id)
+                pipe.delete(self.key(id))
+                # 版本号比缓存存活更久, 查询中的旧数据不会再写入
+                pipe.incr(self.generation_key(id))
+                pipe.expire(self.generation_key(id), self.redis_ttl)
+            await pipe.execute()
+
+
+music_cache = MusicCache(
+    maxsize=MUSIC_CACHE_SIZE,
+    local_ttl=MUSIC_CACHE_LOCAL_TTL,
+    redis_ttl=MUSIC_CACHE_REDIS_TTL,
+)
@@ -0,0 +1,41 @@
+"""游标分页"""
+from typing import Any, List
+
+import json
+
+from catm.auth import base64url_encode, base64url_decode
+from catm.exceptions import InvalidCursorException
+
+
+def encode_cursor(*values: Any) -> str:
+    """生成不透明游标.
+
+    Args:
+        values (Any): 最后一条记录的排序键.
+
+    Returns:
+        str: 游标.
+    """
+    return base64url_encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """解析游标.
+
+    Args:
+        cursor (str): 游标.
+        size (int): 排序键数量.
+
+    Raises:
+        InvalidCursorException: 游标格式错误.
+
+    Returns:
+        List[Any]: 排序键.
+    """
+    try:
+        values = json.loads(base64url_decode(cursor.encode()))
+    except ValueError:
+        raise InvalidCursorException()
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorException()
+    return values
@@ -0,0 +1,153 @@
+"""榜单物化缓存"""
+from typing import Iterable, List, NamedTuple
+from uuid import UUID
+
+import orjson
+import structlog
+from tortoise.expressions import F
+
+from catm import redis, models
+from catm.cache import TTLCache
+from catm.musiccache import music_cache
+from catm.settings import APP_NAME
+
+
+log = structlog.getLogger()
+# 仅当版本号更大时写入, 避免并发重建时旧版本覆盖新版本
+_SET_IF_NEWER = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+if tonumber(ARGV[1]) > current then
+    redis.call('HSET', KEYS[1], 'version', ARGV[1], 'body', ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class Materialized(NamedTuple):
+    """物化后的榜单"""
+
+    version: int
+    etag: str
+    body: bytes
+
+
+class PlaylistCache:
+    """榜单物化缓存.
+
+    每个榜单的完整响应(榜单信息和有序的音乐列表)预先序列化, 按版本号保存到redis,
+    读取只需一次缓存查询. 榜单成员或引用的音乐变化时递增版本号并只重建受影响的榜单.
+    """
+
+    def __init__(self, local_ttl: float = 1, redis_ttl: int = 7 * 24 * 60 * 60) -> None:
+        """初始化.
+
+        Args:
+            local_ttl (float, optional): 进程内缓存秒数.
+            redis_ttl (int, optional): redis缓存秒数.
+        """
+        self.local: TTLCache[Materialized] = TTLCache(maxsize=1024, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+        self._set_if_newer = redis.client.register_script(_SET_IF_NEWER)
+
+    @staticmethod
+    def key(id: str) -> str:
+        return f"{APP_NAME}:playlist:{id}"
+
+    @staticmethod
+    def etag(id: str, version: int) -> str:
+        return f'"{id}-{version}"'
+
+    async def get(self, id: str | UUID) -> Materialized | None:
+        """读取物化榜单, 未物化时构建.
+
+        Args:
+            id (str | UUID): 榜单ID.
+
+        Returns:
+            Materialized | None: 物化榜单, 榜单不存在为None.
+        """
+        id = str(id)
+        materialized = self.local.get(id)
+        if materialized is not None:
+            return materialized
+        version, body = await redis.client.hmget(self.key(id), "version", "body")
+        if version is None or body is None:
+            return await self.build(id)
+        materialized = Materialized(int(version), self.etag(id, int(version)), body.encode())
+        self.local.set(id, materialized)
+        return materialized
+
+    async def build(self, id: str | UUID, bump: bool = False) -> Materialized | None:
+        """从数据库构建物化榜单.
+
+        Args:
+            id (str | UUID): 榜单ID.
+            bump (bool, optional): 是否递增版本号, 内容变化时为True.
+
+        Returns:
+            Materialized | None: 物化榜单, 榜单不存在为None.
+        """
+        id = str(id)
+        if bump:
+            await models.Playlist.filter(id=id).update(version=F("version") + 1)
+        playlist = await models.Playlist.get_or_none(id=id)
+        if playlist is None:
+            self.local.pop(id)
+            await redis.client.delete(self.key(id))
+            return None
+        music_ids = await models.PlaylistMusic.filter(playlist_id=id).order_by("position").values_list(
+            "music_id", flat=True
+        )
+        musics = await music_cache.get_many(music_ids)
+        # orjson直接序列化UUID和datetime, 与 musiccache 一致
+        body = orjson.dumps(
+            {
+                "id": playlist.id,
+                "name": playlist.name,
+                "description": playlist.description,
+                "creator": playlist.creator,
+                "version": playlist.version,
+                "created_at": playlist.created_at,
+                "updated_at": playlist.updated_at,
+                "musics": [music for music in musics.values() if music is not None],
+            }
+        )
+        await self._set_if_newer(
+            keys=[self.key(id)],
+            args=[playlist.version, body, self.redis_ttl],
+            client=redis.client,
+        )
+        materialized = Materialized(playlist.version, self.etag(id, playlist.version), body)
+        self.local.set(id, materialized)
+        return materialized
+
+    async def playlist_changed(self, id: str | UUID) -> None:
+        """榜单信息或成员变化后重建.
+
+        Args:
+            id (str | UUID): 榜单ID.
+        """
+        await self.build(id, bump=True)
+
+    async def music_changed(self, ids: Iterable[str | UUID]) -> None:
+        """音乐信息变化后重建引用了这些音乐的榜单.
+
+        Args:
+            ids (Iterable[str | UUID]): 音乐ID.
+        """
+        ids = [str(id) for id in ids]
+        if not ids:
+            return
+        playlist_ids: List[UUID] = await models.PlaylistMusic.filter(music_id__in=ids).distinct().values_list(
+            "playlist_id", flat=True
+        )
+        for playlist_id in playlist_ids:
+            try:
+                await self.build(playlist_id, bump=True)
+            except Exception:
+                log.exception(f"rebuild playlist {playlist_id} failed")
+
+
+playlist_cache = PlaylistCache()
@@ -0,0 +1,144 @@
+"""采样分析器"""
+from typing import Dict, List
+from collections import Counter
+
+import os
+import sys
+import asyncio
+import weakref
+import functools
+import threading
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from catm.settings import PROFILER_INTERVAL, PROFILER_MAX_SECONDS
+
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    """去掉 sys.path 前缀, 缩短文件路径."""
+    prefixes = [path for path in sys.path if path and filename.startswith(path + os.sep)]
+    if not prefixes:
+        return filename
+    return filename[len(max(prefixes, key=len)) + 1:]
+
+
+def _stack(frame) -> List[str]:
+    """从最外层到当前帧的调用栈."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_qualname} ({_short_path(code.co_filename)})")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class SamplingProfiler:
+    """统计采样分析器.
+
+    后台线程定时读取所有线程的调用栈, 不需要修改被分析的代码, 开销只与采样频率有关.
+    事件循环线程的样本以正在执行的路由和协程为根, 输出折叠栈格式, 可直接生成火焰图.
+    同一进程同时只能运行一次.
+    """
+
+    def __init__(self, interval: float = 0.01, max_seconds: int = 60) -> None:
+        """初始化.
+
+        Args:
+            interval (float, optional): 采样间隔(秒).
+            max_seconds (int, optional): 单次最长采样秒数.
+        """
+        self.interval = interval
+        self.max_seconds = max_seconds
+        # 采样期间记录 task -> 请求scope, 用于按路由归类样本
+        self.requests: weakref.WeakKeyDictionary[asyncio.Task, Scope] = weakref.WeakKeyDictionary()
+        self.running = False
+
+    def _label(self, loop: asyncio.AbstractEventLoop) -> str:
+        """事件循环线程当前样本的根节点: 路由和协程."""
+        task = asyncio.current_task(loop)
+        if task is None:
+            return "event_loop"
+        coro = task.get_coro()
+        name = f"task {getattr(coro, '__qualname__', task.get_name())}"
+        scope = self.requests.get(task)
+        if scope is None:
+            return name
+        route = scope.get("route")
+        return f"{scope['method']} {getattr(route, 'path', scope['path'])};{name}"
+
+    def _sample(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        loop_thread: int,
+        stop: threading.Event,
+        samples: Dict[str, int],
+    ) -> None:
+        """采样线程, 直到 stop 被设置."""
+        current = threading.get_ident()
+        while not stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == current:
+                    continue
+                if thread_id == loop_thread:
+                    root = self._label(loop)
+                else:
+                    root = f"thread {names.get(thread_id, thread_id)}"
+                samples[";".join([root, *_stack(frame)])] += 1
+
+    async def profile(self, seconds: float) -> str:
+        """采样指定秒数.
+
+        Args:
+            seconds (float): 采样秒数, 不超过 max_seconds.
+
+        Raises:
+            RuntimeError: 已有采样正在运行.
+
+        Returns:
+            str: 折叠栈, 每行为 "帧;帧;... 样本数".
+        """
+        if self.running:
+            raise RuntimeError("profiler is running")
+        self.running = True
+        samples: Dict[str, int] = Counter()
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self._sample,
+            args=(asyncio.get_running_loop(), threading.get_ident(), stop, samples),
+            name="sampling-profiler",
+            daemon=True,
+        )
+        try:
+            thread.start()
+            await asyncio.sleep(min(seconds, self.max_seconds))
+        finally:
+            stop.set()
+            await asyncio.to_thread(thread.join)
+            self.requests.clear()
+            self.running = False
+        return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class ProfilerMiddleware:
+    """采样期间记录每个请求所在的task"""
+
+    def __init__(self, app: ASGIApp, profiler: SamplingProfiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.profiler.running:
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        self.profiler.requests[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.requests.pop(task, None)
+
+
+profiler = SamplingProfiler(interval=PROFILER_INTERVAL / 1000, max_seconds=PROFILER_MAX_SECONDS)
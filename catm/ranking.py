@@ -0,0 +1,177 @@
+"""音乐热度排行"""
+from typing import Iterable, List, Tuple
+from uuid import UUID
+
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass
+
+import structlog
+
+from catm import redis
+from catm.constants import RankingChart, EVENT_RANKING_WEIGHTS
+from catm.settings import APP_NAME, RANKING_REBUILD_INTERVAL, RANKING_TOP_N
+
+
+log = structlog.getLogger()
+
+
+@dataclass(frozen=True, slots=True)
+class ChartWindow:
+    """排行榜时间窗口"""
+
+    # 桶粒度 hour | day
+    bucket: str
+    # 窗口内桶数量
+    size: int
+    # 半衰期(桶数)
+    half_life: float
+
+
+CHART_WINDOWS = {
+    RankingChart.hot: ChartWindow(bucket="hour", size=24, half_life=6),
+    RankingChart.week: ChartWindow(bucket="day", size=7, half_life=2),
+}
+# 桶的过期时间, 比最大窗口略长
+BUCKET_TTL = {
+    "hour": 2 * 24 * 60 * 60,
+    "day": 10 * 24 * 60 * 60,
+}
+
+
+def bucket_key(bucket: str, at: datetime) -> str:
+    """时间桶的key.
+
+    Args:
+        bucket (str): 桶粒度 hour | day.
+        at (datetime): 时间.
+
+    Returns:
+        str: redis key.
+    """
+    at = at.astimezone(timezone.utc)
+    if bucket == "hour":
+        return f"{APP_NAME}:rank:bucket:hour:{at:%Y%m%d%H}"
+    return f"{APP_NAME}:rank:bucket:day:{at:%Y%m%d}"
+
+
+def chart_key(chart: RankingChart) -> str:
+    return f"{APP_NAME}:rank:chart:{chart}"
+
+
+class Ranking:
+    """基于redis有序集合的时间衰减排行.
+
+    事件按小时/天计入时间桶, 定时用 ZUNIONSTORE 按指数衰减权重合并窗口内的桶,
+    只保留前N名作为排行榜快照. 读取排行榜和查询分数都只访问快照.
+    多个worker通过redis锁保证同一时间只有一个在重建.
+    """
+
+    def __init__(self, rebuild_interval: int = 60, top_n: int = 1000) -> None:
+        """初始化.
+
+        Args:
+            rebuild_interval (int, optional): 重建间隔(秒).
+            top_n (int, optional): 排行榜保留数量.
+        """
+        self.rebuild_interval = rebuild_interval
+        self.top_n = top_n
+        self._task: asyncio.Task | None = None
+
+    async def record(self, events: Iterable[Tuple[UUID | str, str, datetime]]) -> None:
+        """批量计入事件.
+
+        Args:
+            events (Iterable[Tuple[UUID | str, str, datetime]]): (音乐ID, 事件类型, 发生时间).
+        """
+        increments: Counter[Tuple[str, str]] = Counter()
+        for music_id, type, occurred_at in events:
+            weight = EVENT_RANKING_WEIGHTS.get(type)
+            if not weight:
+                continue
+            for bucket in BUCKET_TTL:
+                increments[(bucket_key(bucket, occurred_at), str(music_id))] += weight
+        if not increments:
+            return
+        async with redis.client.pipeline(transaction=False) as pipe:
+            keys = set()
+            for (key, music_id), score in increments.items():
+                pipe.zincrby(key, score, music_id)
+                keys.add(key)
+            for key in keys:
+                pipe.expire(key, BUCKET_TTL[key.split(":")[-2]])
+            await pipe.execute()
+
+    async def rebuild(self, chart: RankingChart, now: datetime | None = None) -> int:
+        """合并时间桶重建排行榜快照.
+
+        Args:
+            chart (RankingChart): 排行榜.
+            now (datetime | None, optional): 当前时间.
+
+        Returns:
+            int: 排行榜数量.
+        """
+        window = CHART_WINDOWS[chart]
+        now = now or datetime.now(timezone.utc)
+        step = timedelta(hours=1) if window.bucket == "hour" else timedelta(days=1)
+        weights = {
+            bucket_key(window.bucket, now - step * age): 0.5 ** (age / window.half_life)
+            for age in range(window.size)
+        }
+        key = chart_key(chart)
+        tmp_key = f"{key}:tmp"
+        async with redis.client.pipeline(transaction=True) as pipe:
+            pipe.zunionstore(tmp_key, weights)
+            pipe.zremrangebyrank(tmp_key, 0, -(self.top_n + 1))
+            pipe.zcard(tmp_key)
+            _, _, count = await pipe.execute()
+        if count:
+            await redis.client.rename(tmp_key, key)
+        else:
+            await redis.client.delete(key)
+        return count
+
+    async def top(self, chart: RankingChart, offset: int = 0, limit: int = 20) -> List[Tuple[str, float]]:
+        """读取排行榜.
+
+        Args:
+            chart (RankingChart): 排行榜.
+            offset (int, optional): 跳过数量.
+            limit (int, optional): 返回数量.
+
+        Returns:
+            List[Tuple[str, float]]: (音乐ID, 分数).
+        """
+        return await redis.client.zrevrange(chart_key(chart), offset, offset + limit - 1, withscores=True)
+
+    async def _rebuild_forever(self) -> None:
+        lock_key = f"{APP_NAME}:rank:lock"
+        while True:
+            try:
+                # 同一间隔内只有一个worker重建
+                if await redis.client.set(lock_key, "1", nx=True, ex=self.rebuild_interval):
+                    for chart in RankingChart:
+                        await self.rebuild(chart)
+            except Exception:
+                log.exception("ranking rebuild failed")
+            await asyncio.sleep(self.rebuild_interval)
+
+    def start(self) -> None:
+        """启动定时重建任务."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._rebuild_forever())
+
+    async def stop(self) -> None:
+        """停止定时重建任务."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+ranking = Ranking(rebuild_interval=RANKING_REBUILD_INTERVAL, top_n=RANKING_TOP_N)
@@ -0,0 +1,191 @@
+"""限流和准入控制"""
+import math
+import time
+import asyncio
+from uuid import uuid4
+
+from fastapi import Request
+
+from catm import redis
+from catm.exceptions import ServerBusyException, TooManyAttemptsException
+from catm.metrics import rate_limit_checks, admission_in_flight, admission_waiting, admission_rejected
+from catm.settings import (
+    APP_NAME,
+    AUTH_RATE_WINDOW,
+    AUTH_RATE_IP_LIMIT,
+    AUTH_RATE_USERNAME_LIMIT,
+    AUTH_ADMISSION_CONCURRENCY,
+    AUTH_ADMISSION_QUEUE,
+    AUTH_ADMISSION_TIMEOUT,
+)
+
+
+# 移除窗口外的记录, 未超出限制时记录本次请求, 返回需要等待的毫秒数, 0 为允许
+_SLIDING_WINDOW = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call("ZREMRANGEBYSCORE", key, "-inf", now - window)
+if redis.call("ZCARD", key) >= limit then
+    local oldest = redis.call("ZRANGE", key, 0, 0, "WITHSCORES")
+    return math.max(tonumber(oldest[2]) + window - now, 1)
+end
+redis.call("ZADD", key, now, ARGV[4])
+redis.call("PEXPIRE", key, window)
+return 0
+"""
+
+
+def client_ip(request: Request) -> str:
+    """请求的客户端IP, 代理后部署时由 uvicorn --proxy-headers 还原.
+
+    Args:
+        request (Request): 请求.
+
+    Returns:
+        str: 客户端IP.
+    """
+    return request.client.host if request.client else ""
+
+
+def retry_after(seconds: float) -> str:
+    """Retry-After 响应头, 向上取整到秒.
+
+    Args:
+        seconds (float): 秒数.
+
+    Returns:
+        str: 至少为1.
+    """
+    return str(max(math.ceil(seconds), 1))
+
+
+class SlidingWindowLimiter:
+    """滑动窗口限流.
+
+    每个标识一个redis有序集合, 成员为请求时间, 多worker共享计数.
+    检查和记录在一个lua脚本内完成, 并发请求不会超出限制.
+    """
+
+    def __init__(self, name: str, limit: int, window: int) -> None:
+        """初始化.
+
+        Args:
+            name (str): 名称, 用于redis键和指标标签.
+            limit (int): 窗口内最多次数.
+            window (int): 窗口秒数.
+        """
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.script = redis.client.register_script(_SLIDING_WINDOW)
+
+    def key(self, id: str) -> str:
+        return f"{APP_NAME}:ratelimit:{self.name}:{id}"
+
+    async def hit(self, id: str) -> str:
+        """检查并记录一次请求.
+
+        检查和记录是原子的, 并发请求不会都通过检查后再记录. 只统计失败次数时先记录,
+        成功后调用 reset 或 refund 退回.
+
+        Args:
+            id (str): 标识, 例如IP或用户名.
+
+        Raises:
+            TooManyAttemptsException: 窗口内次数已达上限, 本次不记录.
+
+        Returns:
+            str: 本次记录, 用于 refund.
+        """
+        now = int(time.time() * 1000)
+        attempt = f"{now}-{uuid4().hex[:8]}"
+        wait = await self.script(
+            keys=[self.key(id)],
+            args=[now, self.window * 1000, self.limit, attempt],
+            client=redis.client,
+        )
+        if wait:
+            rate_limit_checks.inc(self.name, "limited")
+            raise TooManyAttemptsException(wait / 1000)
+        rate_limit_checks.inc(self.name, "allowed")
+        return attempt
+
+    async def refund(self, id: str, attempt: str) -> None:
+        """退回一次记录, 例如请求因服务繁忙未被处理.
+
+        Args:
+            id (str): 标识.
+            attempt (str): hit 返回的记录.
+        """
+        await redis.client.zrem(self.key(id), attempt)
+
+    async def reset(self, id: str) -> None:
+        """清除记录.
+
+        Args:
+            id (str): 标识.
+        """
+        await redis.client.delete(self.key(id))
+
+
+class AdmissionGate:
+    """进程内并发限制.
+
+    超出并发数的请求排队等待, 队列已满或等待超时直接拒绝, 避免CPU密集的请求
+    堆积占满worker, 影响其它接口.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, timeout: float) -> None:
+        """初始化.
+
+        Args:
+            name (str): 名称, 用于指标标签.
+            concurrency (int): 最多同时执行数.
+            queue_size (int): 最多排队数.
+            timeout (float): 排队超时秒数.
+        """
+        self.name = name
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.waiting = 0
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def _reject(self, reason: str) -> ServerBusyException:
+        admission_rejected.inc(self.name, reason)
+        return ServerBusyException()
+
+    async def __aenter__(self) -> None:
+        if self.semaphore.locked():
+            if self.waiting >= self.queue_size:
+                raise self._reject("queue_full")
+            self.waiting += 1
+            admission_waiting.inc(self.name)
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("timeout") from None
+            finally:
+                self.waiting -= 1
+                admission_waiting.dec(self.name)
+        else:
+            await self.semaphore.acquire()
+        admission_in_flight.inc(self.name)
+
+    async def __aexit__(self, *exc_info) -> None:
+        admission_in_flight.dec(self.name)
+        self.semaphore.release()
+
+
+# 每个IP的登录/注册/修改密码请求数
+auth_ip_limiter = SlidingWindowLimiter("auth_ip", limit=AUTH_RATE_IP_LIMIT, window=AUTH_RATE_WINDOW)
+# 每个用户名的登录次数, 成功后清除, 即密码错误次数
+auth_username_limiter = SlidingWindowLimiter("auth_username", limit=AUTH_RATE_USERNAME_LIMIT, window=AUTH_RATE_WINDOW)
+# 解密和哈希密码的接口
+auth_gate = AdmissionGate(
+    "auth",
+    concurrency=AUTH_ADMISSION_CONCURRENCY,
+    queue_size=AUTH_ADMISSION_QUEUE,
+    timeout=AUTH_ADMISSION_TIMEOUT / 1000,
+)
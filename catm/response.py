@@ -1,9 +1,20 @@
 """响应"""
-from typing import Mapping
+from typing import Dict, List, Mapping, Tuple
 
-from fastapi.responses import JSONResponse
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+
+import anyio
+from fastapi.responses import JSONResponse, Response
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
 from starlette.background import BackgroundTask
 
+from catm.tracing import span
+from catm.metrics import streamed_bytes
+from catm.exceptions import RangeNotSatisfiableException
+
 
 class ErrorResponse(JSONResponse):
 
@@ -28,3 +39,253 @@ class ErrorResponse(JSONResponse):
         """
         content = {"code": code, "msg": msg}
         super().__init__(content, status_code, headers, media_type, background)
+
+
+def file_validators(stat_result: os.stat_result, cache_control: str | None = None) -> Dict[str, str]:
+    """根据文件信息生成缓存验证头.
+
+    Args:
+        stat_result (os.stat_result): 文件信息.
+        cache_control (str | None, optional): Cache-Control策略.
+
+    Returns:
+        Dict[str, str]: etag, last-modified, cache-control.
+    """
+    etag = f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+    if cache_control is not None:
+        headers["cache-control"] = cache_control
+    return headers
+
+
+def is_not_modified(request_headers: Headers, validators: Mapping[str, str]) -> bool:
+    """判断客户端缓存是否仍然有效.
+
+    Args:
+        request_headers (Headers): 请求头.
+        validators (Mapping[str, str]): 响应的缓存验证头.
+
+    Returns:
+        bool: True 可以返回304.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = validators["etag"]
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request_headers.get("if-modified-since")
+    # 没有 last-modified 的响应只按etag验证
+    if if_modified_since is not None and "last-modified" in validators:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            return parsedate_to_datetime(validators["last-modified"]) <= since
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class NotModifiedResponse(Response):
+    """304响应"""
+
+    def __init__(self, validators: Mapping[str, str]) -> None:
+        """304响应.
+
+        Args:
+            validators (Mapping[str, str]): 缓存验证头.
+        """
+        super().__init__(status_code=304, headers=dict(validators))
+
+
+def parse_range(range_header: str, size: int, max_ranges: int = 16) -> List[Tuple[int, int]] | None:
+    """解析http Range头.
+
+    Args:
+        range_header (str): Range头, 例如 bytes=0-1023,-512.
+        size (int): 文件大小.
+        max_ranges (int, optional): 合并后最多允许的区间数.
+
+    Raises:
+        RangeNotSatisfiableException: 所有区间都超出文件范围.
+
+    Returns:
+        List[Tuple[int, int]] | None: 合并后的区间[start, end), 格式错误时返回None忽略Range.
+    """
+    unit, _, specs = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+    ranges = []
+    for spec in specs.split(","):
+        first, sep, last = spec.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not first:
+                # 后缀区间 bytes=-500
+                suffix = int(last)
+                if suffix < 0:
+                    return None
+                if suffix == 0:
+                    continue
+                start, end = max(size - suffix, 0), size
+            else:
+                start = int(first)
+                end = int(last) + 1 if last else max(size, start + 1)
+                if start < 0 or end <= start:
+                    return None
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size)))
+    if not ranges:
+        raise RangeNotSatisfiableException()
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    if len(merged) > max_ranges:
+        return None
+    return merged
+
+
+class RangeFileResponse(Response):
+    """支持Range请求的文件响应.
+
+    服务器支持 http.response.zerocopysend 扩展时使用sendfile零拷贝发送,
+    否则以大块异步读取文件.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        range_header: str | None = None,
+        headers: Mapping[str, str] | None = None,
+        media_type: str | None = None,
+        stat_result: os.stat_result | None = None,
+        background: BackgroundTask | None = None,
+    ) -> None:
+        """文件响应.
+
+        Args:
+            path (str): 文件路径.
+            range_header (str | None, optional): 请求的Range头.
+            headers (Mapping[str, str] | None, optional): 头.
+            media_type (str | None, optional): 媒体类型.
+            stat_result (os.stat_result | None, optional): 文件信息, 为空时读取.
+            background (BackgroundTask | None, optional): ?.
+        """
+        self.path = path
+        self.media_type = media_type
+        self.background = background
+        self.status_code = 200
+        self.init_headers(headers)
+        stat_result = stat_result or os.stat(path)
+        self.size = size = stat_result.st_size
+        self.headers["accept-ranges"] = "bytes"
+        # [(start, end, part_header)]
+        self.parts: List[Tuple[int, int, bytes]] = []
+        self.boundary: bytes | None = None
+        try:
+            ranges = parse_range(range_header, size) if range_header else None
+        except RangeNotSatisfiableException:
+            self.status_code = 416
+            self.headers["content-range"] = f"bytes */{size}"
+            self.headers["content-length"] = "0"
+            return
+        if ranges is None:
+            self.parts.append((0, size, b""))
+            self.headers["content-length"] = str(size)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = 206
+            self.parts.append((start, end, b""))
+            self.headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+            self.headers["content-length"] = str(end - start)
+        else:
+            self.status_code = 206
+            self.boundary = secrets.token_hex(16).encode()
+            content_type = (media_type or "application/octet-stream").encode()
+            content_length = 0
+            for start, end in ranges:
+                part_header = (
+                    b"--" + self.boundary + b"\r\n"
+                    b"content-type: " + content_type + b"\r\n"
+                    b"content-range: bytes " + f"{start}-{end - 1}/{size}".encode() + b"\r\n\r\n"
+                )
+                self.parts.append((start, end, part_header))
+                content_length += len(part_header) + end - start + 2
+            content_length += len(self.boundary) + 6
+            self.headers["content-type"] = "multipart/byteranges; boundary=" + self.boundary.decode()
+            self.headers["content-length"] = str(content_length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() == "HEAD" or not self.parts:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            with span("file.send", bytes=sum(end - start for start, end, _ in self.parts), zerocopy=True):
+                await self.zerocopy_send(send)
+        else:
+            with span("file.send", bytes=sum(end - start for start, end, _ in self.parts), zerocopy=False):
+                await self.chunked_send(send)
+        if self.background is not None:
+            await self.background()
+
+    def _trailer(self) -> bytes:
+        if self.boundary is None:
+            return b""
+        return b"--" + self.boundary + b"--\r\n"
+
+    async def zerocopy_send(self, send: Send) -> None:
+        """通过sendfile发送文件区间."""
+        with open(self.path, "rb") as file:
+            for start, end, part_header in self.parts:
+                if part_header:
+                    await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": file,
+                        "offset": start,
+                        "count": end - start,
+                        "more_body": True,
+                    }
+                )
+                streamed_bytes.inc(self.media_type or "", amount=end - start)
+                if part_header:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        await send({"type": "http.response.body", "body": self._trailer(), "more_body": False})
+
+    async def chunked_send(self, send: Send) -> None:
+        """大块异步读取发送文件区间."""
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            for start, end, part_header in self.parts:
+                if part_header:
+                    await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                await file.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                    streamed_bytes.inc(self.media_type or "", amount=len(chunk))
+                if part_header:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        await send({"type": "http.response.body", "body": self._trailer(), "more_body": False})
@@ -1,8 +1,11 @@
 """结构"""
+from typing import List
 from uuid import UUID
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
+
+from catm.constants import MusicEventType
 
 
 class User(BaseModel):
@@ -15,3 +18,48 @@ class User(BaseModel):
 
     created_at: datetime
     updated_at: datetime
+
+
+class Music(BaseModel):
+    """音乐信息"""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    name: str
+    play_url: str | None = None
+    singer: List[str] | None = None
+    status: str
+    creator: UUID
+    sha256: str | None = None
+    size: int | None = None
+    mime: str | None = None
+    duration: float | None = None
+    bitrate: int | None = None
+
+    created_at: datetime
+    updated_at: datetime
+
+
+class ChartMusic(Music):
+    """排行榜音乐"""
+
+    score: float
+
+
+class MusicPage(BaseModel):
+    """音乐游标分页"""
+
+    data: List[Music]
+    next_cursor: str | None = None
+
+
+class MusicEvent(BaseModel):
+    """音乐行为事件"""
+
+    music_id: UUID
+    type: MusicEventType
+    # 数据库字段为INT
+    value: int | None = Field(default=None, ge=0, le=2**31 - 1)
+    # 客户端事件时间, 为空使用服务端接收时间, 超出 EVENT_MAX_AGE 的时间会被修正
+    occurred_at: datetime | None = None
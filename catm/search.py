@@ -0,0 +1,350 @@
+"""音乐关键词搜索"""
+from typing import Dict, FrozenSet, List, NamedTuple, Set, Tuple
+from uuid import UUID
+
+import os
+import re
+import heapq
+import asyncio
+import unicodedata
+from datetime import datetime
+
+import orjson
+import structlog
+
+from catm import models
+from catm.ranking import ranking
+from catm.constants import MusicStatus, RankingChart
+from catm.settings import FILE_STORAGE, SEARCH_SYNC_INTERVAL, SEARCH_SNAPSHOT_INTERVAL
+
+
+log = structlog.getLogger()
+SNAPSHOT_VERSION = 3
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """全角转半角, 忽略大小写.
+
+    Args:
+        text (str): 文本.
+
+    Returns:
+        str: 规范化后的文本.
+    """
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def tokenize(text: str) -> Set[str]:
+    """单字和二元组分词, 中文不依赖空格分词.
+
+    Args:
+        text (str): 规范化后的文本.
+
+    Returns:
+        Set[str]: 词项.
+    """
+    tokens = set()
+    for word in _WORD.findall(text):
+        tokens.update(word)
+        tokens.update(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def query_tokens(text: str) -> Set[str]:
+    """查询分词, 只取最长的词项以减少倒排表求交次数.
+
+    Args:
+        text (str): 规范化后的查询.
+
+    Returns:
+        Set[str]: 词项.
+    """
+    tokens = set()
+    for word in _WORD.findall(text):
+        if len(word) == 1:
+            tokens.add(word)
+        else:
+            tokens.update(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+class Document(NamedTuple):
+    """索引文档"""
+
+    name: str
+    singers: Tuple[str, ...]
+    status: str
+
+    def tokens(self) -> FrozenSet[str]:
+        tokens = tokenize(self.name)
+        for singer in self.singers:
+            tokens |= tokenize(singer)
+        return frozenset(tokens)
+
+
+class SearchIndex:
+    """音乐名称和歌手的倒排索引.
+
+    创建和更新音乐时增量更新当前worker的索引, 并定时按 updated_at 同步其它worker的修改.
+    定时把索引快照写入文件存储, 启动时从快照恢复后只同步增量.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        sync_interval: int = 10,
+        snapshot_interval: int = 10 * 60,
+    ) -> None:
+        """初始化.
+
+        Args:
+            snapshot_path (str): 快照文件路径.
+            sync_interval (int, optional): 增量同步间隔(秒).
+            snapshot_interval (int, optional): 快照间隔(秒).
+        """
+        self.snapshot_path = snapshot_path
+        self.sync_interval = sync_interval
+        self.snapshot_interval = snapshot_interval
+        self.docs: Dict[str, Document] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self.watermark: datetime | None = None
+        # 热度分数, 同一匹配等级内热度高的靠前
+        self.popularity: Dict[str, float] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, id: str | UUID, name: str, singers: List[str] | None, status: str) -> None:
+        """新增或更新文档.
+
+        Args:
+            id (str | UUID): 音乐ID.
+            name (str): 音乐名称.
+            singers (List[str] | None): 歌手.
+            status (str): 音乐状态.
+        """
+        id = str(id)
+        doc = Document(
+            name=normalize(name),
+            singers=tuple(normalize(singer) for singer in singers or ()),
+            status=status,
+        )
+        old = self.docs.get(id)
+        if old == doc:
+            return
+        tokens = doc.tokens()
+        old_tokens = old.tokens() if old is not None else frozenset()
+        for token in old_tokens - tokens:
+            posting = self.postings[token]
+            posting.discard(id)
+            if not posting:
+                del self.postings[token]
+        for token in tokens - old_tokens:
+            self.postings.setdefault(token, set()).add(id)
+        self.docs[id] = doc
+
+    def remove(self, id: str | UUID) -> None:
+        """删除文档.
+
+        Args:
+            id (str | UUID): 音乐ID.
+        """
+        doc = self.docs.pop(str(id), None)
+        if doc is None:
+            return
+        for token in doc.tokens():
+            posting = self.postings[token]
+            posting.discard(str(id))
+            if not posting:
+                del self.postings[token]
+
+    @staticmethod
+    def rank(doc: Document, query: str, words: List[str] | None) -> int | None:
+        """计算匹配等级, 越小越靠前, 不匹配返回None.
+
+        Args:
+            doc (Document): 文档.
+            query (str): 规范化后的查询.
+            words (List[str] | None): 需要校验的查询词, 倒排表已保证匹配时为None.
+
+        Returns:
+            int | None: 匹配等级.
+        """
+        name = doc.name
+        if words is not None:
+            for word in words:
+                if word not in name and not any(word in singer for singer in doc.singers):
+                    return None
+        if name == query:
+            return 0
+        if name.startswith(query):
+            return 1
+        if query in name:
+            return 2
+        for singer in doc.singers:
+            if singer.startswith(query):
+                return 3
+        return 4
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        status: str | None = MusicStatus.ready,
+    ) -> Tuple[List[str], bool]:
+        """搜索音乐.
+
+        Args:
+            query (str): 关键词.
+            limit (int, optional): 返回数量.
+            offset (int, optional): 跳过数量.
+            status (str | None, optional): 只返回该状态的音乐, None 不过滤.
+
+        Returns:
+            Tuple[List[str], bool]: 音乐ID列表, 是否还有更多.
+        """
+        query = normalize(query).strip()
+        tokens = query_tokens(query)
+        if not tokens:
+            return [], False
+        postings = []
+        for token in tokens:
+            posting = self.postings.get(token)
+            if not posting:
+                return [], False
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        words = _WORD.findall(query)
+        # 单个不超过两个字的词, 倒排表命中即匹配, 无需逐个校验
+        if len(words) == 1 and len(words[0]) <= 2:
+            words = None
+        docs = self.docs
+        rank = self.rank
+        popularity = self.popularity
+        ranked = []
+        for id in candidates:
+            doc = docs[id]
+            if status is not None and doc.status != status:
+                continue
+            level = rank(doc, query, words)
+            if level is not None:
+                ranked.append((level, -popularity.get(id, 0.0), len(doc.name), id))
+        page = heapq.nsmallest(offset + limit, ranked)[offset:]
+        return [item[-1] for item in page], len(ranked) > offset + limit
+
+    async def sync(self) -> int:
+        """从数据库同步 watermark 之后修改的音乐.
+
+        Returns:
+            int: 同步数量.
+        """
+        query = models.Music.all()
+        if self.watermark is not None:
+            query = query.filter(updated_at__gte=self.watermark)
+        rows = await query.values("id", "name", "singer", "status", "updated_at")
+        for row in rows:
+            self.add(row["id"], row["name"], row["singer"], row["status"])
+            if self.watermark is None or row["updated_at"] > self.watermark:
+                self.watermark = row["updated_at"]
+        return len(rows)
+
+    async def refresh_popularity(self) -> None:
+        """从热门排行榜快照刷新热度分数."""
+        top = await ranking.top(RankingChart.hot, 0, ranking.top_n)
+        self.popularity = dict(top)
+
+    def _write(self, data: bytes) -> None:
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, self.snapshot_path)
+
+    async def save(self) -> None:
+        """写入快照."""
+        # 序列化在事件循环内完成, 避免与增量更新并发修改索引
+        # 快照位于共享的文件存储, 只使用json, 不反序列化任意对象
+        data = orjson.dumps(
+            {
+                "version": SNAPSHOT_VERSION,
+                "watermark": self.watermark,
+                "docs": self.docs,
+                "postings": self.postings,
+            },
+            default=list,
+        )
+        await asyncio.to_thread(self._write, data)
+        log.info(f"search index snapshot saved {len(self.docs)} docs")
+
+    def _load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path, "rb") as file:
+                snapshot = orjson.loads(file.read())
+        except FileNotFoundError:
+            return False
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return False
+        docs = {
+            id: Document(name=name, singers=tuple(singers), status=status)
+            for id, (name, singers, status) in snapshot["docs"].items()
+        }
+        postings = {token: set(ids) for token, ids in snapshot["postings"].items()}
+        watermark = snapshot["watermark"]
+        self.docs = docs
+        self.postings = postings
+        self.watermark = datetime.fromisoformat(watermark) if watermark is not None else None
+        return True
+
+    async def load(self) -> None:
+        """从快照恢复索引并同步增量."""
+        try:
+            loaded = await asyncio.to_thread(self._load_snapshot)
+        except Exception:
+            log.exception("search index snapshot broken")
+            loaded = False
+        count = await self.sync()
+        log.info(f"search index loaded {len(self.docs)} docs, snapshot {loaded}, synced {count}")
+
+    async def _sync_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+                await self.refresh_popularity()
+            except Exception:
+                log.exception("search index sync failed")
+
+    async def _snapshot_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.save()
+            except Exception:
+                log.exception("search index snapshot failed")
+
+    def start(self) -> None:
+        """启动定时同步和快照任务."""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._sync_forever()),
+                asyncio.create_task(self._snapshot_forever()),
+            ]
+
+    async def stop(self) -> None:
+        """停止定时任务并写入快照."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.save()
+
+
+search_index = SearchIndex(
+    os.path.join(FILE_STORAGE or ".", "search", "music.snapshot"),
+    sync_interval=SEARCH_SYNC_INTERVAL,
+    snapshot_interval=SEARCH_SNAPSHOT_INTERVAL,
+)
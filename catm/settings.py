@@ -1,17 +1,51 @@
+from urllib.parse import urlencode
+
 from catm.env import Env
 
 
 APP_NAME = Env.string("APP_NAME", default="catm")
 # 数据库密码配置
 MYSQL_DB_URL = Env.string("MYSQL_DB_URL")
+# 从库地址, 多个用逗号分隔, 只读接口随机使用
+MYSQL_REPLICA_URLS = Env.string("MYSQL_REPLICA_URLS", default="")
+# 每个worker每个数据库的连接池大小
+DB_POOL_MIN_SIZE = Env.int("DB_POOL_MIN_SIZE", default=1)
+DB_POOL_MAX_SIZE = Env.int("DB_POOL_MAX_SIZE", default=10)
+# 连接空闲超过该秒数后重建, 小于MySQL的 wait_timeout
+DB_POOL_RECYCLE = Env.int("DB_POOL_RECYCLE", default=3600)
+DB_CONNECT_TIMEOUT = Env.int("DB_CONNECT_TIMEOUT", default=10)
+# 写入后该秒数内同一客户端读主库
+DB_REPLICA_STICKY = Env.int("DB_REPLICA_STICKY", default=5)
+
+
+def _pool_url(url: str | None) -> str | None:
+    """MySQL连接地址附加连接池参数."""
+    if url is None or not url.startswith("mysql"):
+        return url
+    params = urlencode({
+        "minsize": DB_POOL_MIN_SIZE,
+        "maxsize": DB_POOL_MAX_SIZE,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "connect_timeout": DB_CONNECT_TIMEOUT,
+    })
+    return url + ("&" if "?" in url else "?") + params
+
+
 TORTOISE_ORM = {
-    "connections": {"default": MYSQL_DB_URL},
+    "connections": {
+        "default": _pool_url(MYSQL_DB_URL),
+        **{
+            f"replica{i}": _pool_url(url.strip())
+            for i, url in enumerate(MYSQL_REPLICA_URLS.split(",")) if url.strip()
+        },
+    },
     "apps": {
         APP_NAME: {
             "models": ["catm.models", "aerich.models"],
             "default_connection": "default",
         },
     },
+    "routers": ["catm.db.ReplicaRouter"],
     "timezone": "Asia/Shanghai",
 }
 # redis
@@ -21,5 +55,75 @@ DEBUG = Env.boolean("DEBUG", default=False)
 API_TOKEN = Env.string("API_TOKEN", default="VLzIs5uIvWIv7Smj")
 # JWT
 JWT_NAME = "jwt"
+# jwt签名算法 PS256 | ES256 | EdDSA, 切换后旧算法签发的jwt仍可验证
+JWT_ALGORITHM = Env.string("JWT_ALGORITHM", default="EdDSA")
+# jwt签名密钥数量, 算法为PS256时使用RSA密钥对
+JWT_KEY_COUNT = Env.int("JWT_KEY_COUNT", default=8)
+# 已验证jwt缓存容量
+JWT_CACHE_SIZE = Env.int("JWT_CACHE_SIZE", default=10000)
+# 密码哈希, 执行器类型 thread | process
+PASSWORD_HASH_EXECUTOR = Env.string("PASSWORD_HASH_EXECUTOR", default="thread")
+PASSWORD_HASH_WORKERS = Env.int("PASSWORD_HASH_WORKERS", default=4)
+PASSWORD_HASH_QUEUE_SIZE = Env.int("PASSWORD_HASH_QUEUE_SIZE", default=64)
+ARGON2_TIME_COST = Env.int("ARGON2_TIME_COST", default=3)
+ARGON2_MEMORY_COST = Env.int("ARGON2_MEMORY_COST", default=64 * 1024)
+ARGON2_PARALLELISM = Env.int("ARGON2_PARALLELISM", default=4)
+# 音频校验, 进程数为0时当前worker不消费校验任务
+MEDIA_VERIFY_WORKERS = Env.int("MEDIA_VERIFY_WORKERS", default=2)
+MEDIA_VERIFY_BATCH_SIZE = Env.int("MEDIA_VERIFY_BATCH_SIZE", default=32)
+# 任务未确认超过该毫秒数重新认领
+MEDIA_VERIFY_CLAIM_IDLE = Env.int("MEDIA_VERIFY_CLAIM_IDLE", default=5 * 60 * 1000)
+# 任务投递超过该次数仍未确认, 视为音频损坏
+MEDIA_VERIFY_MAX_DELIVERIES = Env.int("MEDIA_VERIFY_MAX_DELIVERIES", default=3)
+# 音乐信息缓存
+MUSIC_CACHE_SIZE = Env.int("MUSIC_CACHE_SIZE", default=10000)
+MUSIC_CACHE_LOCAL_TTL = Env.int("MUSIC_CACHE_LOCAL_TTL", default=5)
+MUSIC_CACHE_REDIS_TTL = Env.int("MUSIC_CACHE_REDIS_TTL", default=60 * 60)
+# 搜索索引增量同步间隔和快照间隔(秒)
+SEARCH_SYNC_INTERVAL = Env.int("SEARCH_SYNC_INTERVAL", default=10)
+SEARCH_SNAPSHOT_INTERVAL = Env.int("SEARCH_SNAPSHOT_INTERVAL", default=10 * 60)
+# 行为事件缓冲区容量, 批量写入数量和间隔(秒)
+EVENT_BUFFER_SIZE = Env.int("EVENT_BUFFER_SIZE", default=50000)
+EVENT_FLUSH_SIZE = Env.int("EVENT_FLUSH_SIZE", default=1000)
+EVENT_FLUSH_INTERVAL = Env.int("EVENT_FLUSH_INTERVAL", default=1)
+# 客户端事件时间最早为多少秒之前, 更早的按该时间计, 晚于服务端时间的按服务端时间计
+EVENT_MAX_AGE = Env.int("EVENT_MAX_AGE", default=24 * 60 * 60)
+# 排行榜重建间隔(秒)和保留数量
+RANKING_REBUILD_INTERVAL = Env.int("RANKING_REBUILD_INTERVAL", default=60)
+RANKING_TOP_N = Env.int("RANKING_TOP_N", default=1000)
+# 评论数写入数据库间隔(秒)
+COMMENT_COUNTER_FLUSH_INTERVAL = Env.int("COMMENT_COUNTER_FLUSH_INTERVAL", default=5)
+# 头像上传大小(字节)和像素数上限
+AVATAR_MAX_BYTES = Env.int("AVATAR_MAX_BYTES", default=5 * 1024 * 1024)
+AVATAR_MAX_PIXELS = Env.int("AVATAR_MAX_PIXELS", default=4096 * 4096)
+# 音频垃圾回收间隔(秒), 引用计数归零超过宽限期(秒)才删除
+BLOB_GC_INTERVAL = Env.int("BLOB_GC_INTERVAL", default=10 * 60)
+BLOB_GC_GRACE = Env.int("BLOB_GC_GRACE", default=60 * 60)
+# 启动时执行数据库迁移, 由部署流程执行 python -m catm.startup 时关闭
+STARTUP_MIGRATE = Env.boolean("STARTUP_MIGRATE", default=True)
+# 等待其它worker迁移或生成密钥的最长秒数
+STARTUP_LOCK_TIMEOUT = Env.int("STARTUP_LOCK_TIMEOUT", default=60)
+# RSA密钥对数量, 启动时至少生成最少数量, 其余后台生成
+KEY_PAIR_COUNT = Env.int("KEY_PAIR_COUNT", default=32)
+KEY_PAIR_MIN_COUNT = Env.int("KEY_PAIR_MIN_COUNT", default=4)
+# 多worker指标写入redis的间隔(秒)
+METRICS_REPORT_INTERVAL = Env.int("METRICS_REPORT_INTERVAL", default=15)
+# 采样分析器采样间隔(毫秒)和单次最长采样秒数
+PROFILER_INTERVAL = Env.int("PROFILER_INTERVAL", default=10)
+PROFILER_MAX_SECONDS = Env.int("PROFILER_MAX_SECONDS", default=60)
+# 慢请求阈值(毫秒), 超过时输出完整span树
+TRACE_SLOW_THRESHOLD = Env.int("TRACE_SLOW_THRESHOLD", default=500)
+# 单个请求最多记录的span数量
+TRACE_MAX_SPANS = Env.int("TRACE_MAX_SPANS", default=500)
+# 登录/注册/修改密码限流的滑动窗口(秒), 每个IP窗口内最多请求数, 每个用户名窗口内最多密码错误次数
+AUTH_RATE_WINDOW = Env.int("AUTH_RATE_WINDOW", default=60)
+AUTH_RATE_IP_LIMIT = Env.int("AUTH_RATE_IP_LIMIT", default=30)
+AUTH_RATE_USERNAME_LIMIT = Env.int("AUTH_RATE_USERNAME_LIMIT", default=10)
+# 每个worker同时处理的密码接口数, 最多排队数, 排队超时(毫秒)
+AUTH_ADMISSION_CONCURRENCY = Env.int("AUTH_ADMISSION_CONCURRENCY", default=8)
+AUTH_ADMISSION_QUEUE = Env.int("AUTH_ADMISSION_QUEUE", default=32)
+AUTH_ADMISSION_TIMEOUT = Env.int("AUTH_ADMISSION_TIMEOUT", default=1000)
 # 文件存储
 FILE_STORAGE = Env.string("FILE_STORAGE")
+# RSA密钥环定时重新加载间隔(秒)
+KEY_RING_RELOAD_INTERVAL = Env.int("KEY_RING_RELOAD_INTERVAL", default=10 * 60)
@@ -0,0 +1,312 @@
+"""服务启动: 数据库迁移和密钥准备"""
+from typing import Dict, List
+
+import os
+import time
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import structlog
+from aerich import Command
+from aerich.models import Aerich
+from tortoise import Tortoise
+from tortoise.exceptions import OperationalError
+
+from catm import redis, models
+from catm.jws import generate_key_pair
+from catm.keyring import key_ring
+from catm.constants import JwtAlgorithm
+from catm.settings import (
+    APP_NAME,
+    TORTOISE_ORM,
+    KEY_PAIR_COUNT,
+    KEY_PAIR_MIN_COUNT,
+    JWT_ALGORITHM,
+    JWT_KEY_COUNT,
+    STARTUP_LOCK_TIMEOUT,
+)
+
+
+log = structlog.getLogger()
+MIGRATIONS_LOCATION = "./migrations"
+# 锁持有者的值一致时才释放, 避免释放其它进程超时后重新获取的锁
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+# 仍是锁持有者时延长过期时间
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+async def _renew_lock(key: str, token: str, ttl: int) -> None:
+    """持有锁期间每 ttl/3 秒续期, 执行时间超过 ttl 的迁移不会丢失锁."""
+    while True:
+        await asyncio.sleep(ttl / 3)
+        try:
+            if not await redis.client.eval(_RENEW, 1, key, token, ttl):
+                log.warning(f"lock {key} lost")
+                return
+        except Exception:
+            log.exception(f"renew lock {key} failed")
+
+
+@asynccontextmanager
+async def redis_lock(name: str, timeout: float, ttl: int = 30, blocking: bool = True):
+    """redis分布式锁, 持有期间自动续期.
+
+    Args:
+        name (str): 锁名称.
+        timeout (float): 等待获取锁的最长秒数.
+        ttl (int, optional): 锁过期秒数, 持有者崩溃后最多该秒数后自动释放, 与等待时间无关.
+        blocking (bool, optional): 获取失败时是否等待.
+
+    Yields:
+        bool: 是否获取到锁.
+    """
+    key = f"{APP_NAME}:lock:{name}"
+    token = secrets.token_hex(16)
+    deadline = time.monotonic() + timeout
+    acquired = False
+    while True:
+        acquired = bool(await redis.client.set(key, token, nx=True, ex=ttl))
+        if acquired or not blocking or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(0.1)
+    renew = asyncio.create_task(_renew_lock(key, token, ttl)) if acquired else None
+    try:
+        yield acquired
+    finally:
+        if renew is not None:
+            renew.cancel()
+            await redis.client.eval(_RELEASE, 1, key, token)
+
+
+class Startup:
+    """服务启动流程.
+
+    多个worker同时启动时只有一个执行数据库迁移和密钥生成, 其余等待锁释放后直接使用结果.
+    迁移已是最新, 密钥数量足够时不获取锁. 启动时只同步生成最少数量的密钥,
+    其余密钥在后台用进程池生成. 每个阶段记录耗时.
+    """
+
+    def __init__(
+        self,
+        key_pair_counts: Dict[str, int],
+        key_pair_min_count: int = 4,
+        lock_timeout: int = 60,
+    ) -> None:
+        """初始化.
+
+        Args:
+            key_pair_counts (Dict[str, int]): 算法 -> 密钥对目标数量.
+            key_pair_min_count (int, optional): 开始服务前每种算法至少需要的密钥对数量.
+            lock_timeout (int, optional): 等待启动锁的最长秒数.
+        """
+        self.key_pair_counts = key_pair_counts
+        self.key_pair_min_count = key_pair_min_count
+        self.lock_timeout = lock_timeout
+        self.timings: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._task: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        """记录启动阶段耗时.
+
+        Args:
+            name (str): 阶段名称.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = elapsed
+            log.info(f"startup phase {name} {elapsed * 1000:.1f}ms")
+
+    def report(self) -> None:
+        """输出启动总耗时."""
+        total = time.perf_counter() - self._started
+        phases = ", ".join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in self.timings.items())
+        log.info(f"startup complete {total * 1000:.1f}ms ({phases})")
+
+    @staticmethod
+    def migration_files() -> List[str]:
+        dir = os.path.join(MIGRATIONS_LOCATION, APP_NAME)
+        return sorted(
+            (name for name in os.listdir(dir) if name.endswith("py")),
+            key=lambda name: int(name.split("_")[0]),
+        )
+
+    async def pending_migrations(self) -> List[str]:
+        """未执行的迁移文件.
+
+        Returns:
+            List[str]: 迁移文件名.
+        """
+        try:
+            applied = set(await Aerich.filter(app=APP_NAME).values_list("version", flat=True))
+        except OperationalError:
+            # 全新数据库, aerich表不存在
+            applied = set()
+        return [name for name in self.migration_files() if name not in applied]
+
+    async def migrate(self) -> List[str]:
+        """执行数据库迁移, 多个worker中只有一个执行.
+
+        Returns:
+            List[str]: 本进程执行的迁移.
+        """
+        if not await self.pending_migrations():
+            return []
+        async with redis_lock("migrate", timeout=self.lock_timeout) as acquired:
+            if not acquired:
+                raise TimeoutError("wait migrate lock timeout")
+            # 等待锁期间其它worker可能已完成迁移
+            if not await self.pending_migrations():
+                return []
+            command = Command(tortoise_config=TORTOISE_ORM, app=APP_NAME, location=MIGRATIONS_LOCATION)
+            await command.init()
+            migrated = await command.upgrade(run_in_transaction=True)
+        log.info(f"aerich upgrade {migrated}")
+        return migrated
+
+    async def generate_key_pairs(self, algorithm: str, count: int) -> int:
+        """在进程池中并行生成密钥对.
+
+        Args:
+            algorithm (str): 算法.
+            count (int): 数量.
+
+        Returns:
+            int: 生成数量.
+        """
+        if count <= 0:
+            return 0
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=min(count, os.cpu_count() or 1)) as executor:
+            pairs = await asyncio.gather(*[
+                loop.run_in_executor(executor, generate_key_pair, algorithm)
+                for _ in range(count)
+            ])
+        await models.KeyPair.bulk_create([
+            models.KeyPair(algorithm=algorithm, public_key=public_key, private_key=private_key)
+            for public_key, private_key in pairs
+        ])
+        return count
+
+    async def provision_keys(self, algorithm: str, target: int, blocking: bool = True) -> int:
+        """补足密钥对到目标数量, 多个worker中只有一个生成.
+
+        Args:
+            algorithm (str): 算法.
+            target (int): 目标数量.
+            blocking (bool, optional): 其它worker正在生成时是否等待.
+
+        Returns:
+            int: 本进程生成的数量.
+        """
+        # 枚举值需转为字符串, 否则生成的SQL中不加引号
+        query = models.KeyPair.filter(algorithm=str(algorithm))
+        if await query.count() >= target:
+            return 0
+        async with redis_lock(
+            f"keys:{algorithm}",
+            timeout=self.lock_timeout,
+            blocking=blocking,
+        ) as acquired:
+            if not acquired:
+                if blocking:
+                    raise TimeoutError("wait key pair lock timeout")
+                return 0
+            # 加锁后重新计数, 避免超出目标数量
+            count = await query.count()
+            created = await self.generate_key_pairs(algorithm, target - count)
+        if created:
+            log.info(f"create {algorithm} key pair {created}, total {count + created}")
+        return created
+
+    async def provision_min_keys(self) -> int:
+        """生成开始服务前需要的最少密钥对.
+
+        Returns:
+            int: 本进程生成的数量.
+        """
+        created = await asyncio.gather(*[
+            self.provision_keys(algorithm, min(self.key_pair_min_count, count))
+            for algorithm, count in self.key_pair_counts.items()
+        ])
+        return sum(created)
+
+    async def provision_all_keys(self, blocking: bool = True) -> int:
+        """补足全部密钥对.
+
+        Args:
+            blocking (bool, optional): 其它worker正在生成时是否等待.
+
+        Returns:
+            int: 本进程生成的数量.
+        """
+        created = 0
+        for algorithm, count in self.key_pair_counts.items():
+            created += await self.provision_keys(algorithm, count, blocking=blocking)
+        return created
+
+    async def _fill_keys(self) -> None:
+        try:
+            if await self.provision_all_keys(blocking=False):
+                await key_ring.reload()
+        except Exception:
+            log.exception("provision key pairs failed")
+
+    def start(self) -> None:
+        """后台补足剩余密钥对."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._fill_keys())
+
+    async def stop(self) -> None:
+        """停止后台任务."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+startup = Startup(
+    # RSA密钥对用于加密传输密码, jwt使用其它算法时另外生成签名密钥
+    key_pair_counts={
+        JwtAlgorithm.PS256: KEY_PAIR_COUNT,
+        **({JWT_ALGORITHM: JWT_KEY_COUNT} if JWT_ALGORITHM != JwtAlgorithm.PS256 else {}),
+    },
+    key_pair_min_count=KEY_PAIR_MIN_COUNT,
+    lock_timeout=STARTUP_LOCK_TIMEOUT,
+)
+
+
+async def main() -> None:
+    """独立执行数据库迁移和密钥生成, 用于部署时在启动服务前执行."""
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        async with startup.phase("migrate"):
+            await startup.migrate()
+        async with startup.phase("keys"):
+            await startup.provision_all_keys()
+        startup.report()
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
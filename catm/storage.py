@@ -0,0 +1,99 @@
+"""文件存储"""
+import os
+import hashlib
+import tempfile
+from dataclasses import dataclass
+
+import anyio
+from fastapi import UploadFile
+
+from catm.tracing import span
+
+
+@dataclass(frozen=True, slots=True)
+class StoredFile:
+    """已写入的文件信息"""
+
+    path: str
+    sha256: str
+    size: int
+
+
+def _fsync_dir(dir: str) -> None:
+    fd = os.open(dir, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def save_upload(upload: UploadFile, file_path: str, chunk_size: int = 1024 * 1024) -> StoredFile:
+    """流式保存上传文件.
+
+    先写入同目录的临时文件, 写入过程中计算sha256和大小, fsync后原子替换目标文件,
+    上传失败时不会覆盖已有文件. 文件写入和摘要计算均在线程中执行, 不阻塞事件循环.
+
+    Args:
+        upload (UploadFile): 上传文件.
+        file_path (str): 目标路径.
+        chunk_size (int, optional): 每次读取大小.
+
+    Returns:
+        StoredFile: 文件信息.
+    """
+    dir, name = os.path.split(file_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=dir)
+    digest = hashlib.sha256()
+    size = 0
+
+    def write(file, chunk: bytes) -> None:
+        digest.update(chunk)
+        file.write(chunk)
+
+    def commit(file) -> None:
+        file.flush()
+        os.fsync(file.fileno())
+        file.close()
+        os.replace(tmp_path, file_path)
+        _fsync_dir(dir)
+
+    file = os.fdopen(fd, "wb", buffering=0)
+    try:
+        with span("file.save_upload") as current:
+            while chunk := await upload.read(chunk_size):
+                size += len(chunk)
+                await anyio.to_thread.run_sync(write, file, chunk)
+            await anyio.to_thread.run_sync(commit, file)
+            if current is not None:
+                current.attrs["bytes"] = size
+    except BaseException:
+        file.close()
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return StoredFile(path=file_path, sha256=digest.hexdigest(), size=size)
+
+
+def write_file(file_path: str, data: bytes) -> None:
+    """原子写入小文件, 写入失败不会覆盖已有文件.
+
+    Args:
+        file_path (str): 目标路径.
+        data (bytes): 文件内容.
+    """
+    dir, name = os.path.split(file_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=dir)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
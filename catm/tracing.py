@@ -0,0 +1,168 @@
+"""请求链路追踪"""
+from typing import Any, Dict, List
+
+import re
+import time
+from uuid import uuid4
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import structlog
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from catm.settings import TRACE_SLOW_THRESHOLD, TRACE_MAX_SPANS
+
+
+log = structlog.getLogger()
+TRACE_HEADER = "x-trace-id"
+_TRACE_ID = re.compile(r"^[0-9A-Za-z-]{8,64}$")
+
+
+class Span:
+    """一段耗时, 子span为其中嵌套执行的操作"""
+
+    __slots__ = ("trace", "name", "attrs", "start", "end", "children")
+
+    def __init__(self, trace: "Trace", name: str, attrs: Dict[str, Any]) -> None:
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.children: List[Span] = []
+
+    def to_dict(self, origin: float) -> dict:
+        """转为日志输出格式.
+
+        Args:
+            origin (float): 请求开始时间.
+
+        Returns:
+            dict: {"name", "at_ms", "ms", ..., "children"}.
+        """
+        end = self.end if self.end is not None else time.perf_counter()
+        span = {
+            "name": self.name,
+            "at_ms": round((self.start - origin) * 1000, 3),
+            "ms": round((end - self.start) * 1000, 3),
+            **self.attrs,
+        }
+        if self.children:
+            span["children"] = [child.to_dict(origin) for child in self.children]
+        return span
+
+
+class Trace:
+    """一次请求的span树"""
+
+    __slots__ = ("id", "root", "spans", "dropped")
+
+    def __init__(self, trace_id: str, name: str, attrs: Dict[str, Any]) -> None:
+        self.id = trace_id
+        self.root = Span(self, name, attrs)
+        self.spans = 1
+        self.dropped = 0
+
+
+_current: ContextVar[Span | None] = ContextVar("span", default=None)
+
+
+def trace_id() -> str | None:
+    """当前请求的追踪ID.
+
+    Returns:
+        str | None: 不在请求中时为None.
+    """
+    current = _current.get()
+    return None if current is None else current.trace.id
+
+
+@contextmanager
+def span(name: str, **attrs: Any):
+    """记录一段操作的耗时, 不在请求中时不记录.
+
+    Args:
+        name (str): 名称, 例如 db.query, redis.GET.
+        **attrs: 附加信息.
+
+    Yields:
+        Span | None: 当前span, 可在执行后补充 attrs, 未记录时为None.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    trace = parent.trace
+    # 限制单个请求的span数量, 避免循环内操作占用过多内存
+    if trace.spans >= TRACE_MAX_SPANS:
+        trace.dropped += 1
+        yield None
+        return
+    trace.spans += 1
+    current = Span(trace, name, attrs)
+    parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _current.reset(token)
+
+
+class TracingMiddleware:
+    """为每个请求创建追踪, 响应头返回追踪ID, 超过阈值的慢请求输出完整span树.
+
+    耗时只计算到发送响应头, 下载音频等流式响应的发送时间取决于客户端网速, 不计入慢请求.
+    """
+
+    def __init__(self, app: ASGIApp, slow_threshold: int = TRACE_SLOW_THRESHOLD) -> None:
+        """初始化.
+
+        Args:
+            app (ASGIApp): app.
+            slow_threshold (int, optional): 慢请求阈值(毫秒).
+        """
+        self.app = app
+        self.slow_threshold = slow_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # 沿用上游传入的追踪ID, 便于与网关日志关联
+        incoming = next((value.decode("latin-1") for key, value in scope["headers"] if key == TRACE_HEADER.encode()), "")
+        trace = Trace(incoming if _TRACE_ID.match(incoming) else uuid4().hex, "request", {})
+        status = 500
+        started: float | None = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, started
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                started = time.perf_counter()
+                MutableHeaders(scope=message).append(TRACE_HEADER, trace.id)
+            await send(message)
+
+        token = _current.set(trace.root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            root = trace.root
+            root.end = time.perf_counter()
+            elapsed = ((started or root.end) - root.start) * 1000
+            if elapsed >= self.slow_threshold:
+                route = scope.get("route")
+                log.warning(
+                    "slow request",
+                    trace_id=trace.id,
+                    method=scope["method"],
+                    path=scope["path"],
+                    route=getattr(route, "path", None),
+                    status=status,
+                    ms=round(elapsed, 3),
+                    total_ms=round((root.end - root.start) * 1000, 3),
+                    dropped_spans=trace.dropped,
+                    spans=[child.to_dict(root.start) for child in root.children],
+                )
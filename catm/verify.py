@@ -0,0 +1,275 @@
+"""音频完整性校验队列"""
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+import os
+import socket
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import structlog
+from redis.exceptions import ResponseError
+from tortoise import timezone
+from tortoise.expressions import Q
+
+from catm import redis, models
+from catm.constants import MusicStatus
+from catm.media import MediaInfo, probe_mp4
+from catm.search import search_index
+from catm.musiccache import music_cache
+from catm.playlistcache import playlist_cache
+from catm.exceptions import BrokenMediaException
+from catm.settings import (
+    APP_NAME,
+    MEDIA_VERIFY_WORKERS,
+    MEDIA_VERIFY_BATCH_SIZE,
+    MEDIA_VERIFY_CLAIM_IDLE,
+    MEDIA_VERIFY_MAX_DELIVERIES,
+)
+
+
+log = structlog.getLogger()
+STREAM = f"{APP_NAME}:media:verify"
+GROUP = "verifier"
+
+
+async def enqueue(music_id: str | UUID, file_path: str, sha256: str) -> str:
+    """提交音频校验任务.
+
+    Args:
+        music_id (str | UUID): 音乐ID.
+        file_path (str): 音频路径.
+        sha256 (str): 音频sha256, 校验结果同时写入 audio_blob.
+
+    Returns:
+        str: 任务ID.
+    """
+    return await redis.client.xadd(
+        STREAM,
+        {"music_id": str(music_id), "path": file_path, "sha256": sha256},
+        maxlen=100000,
+        approximate=True,
+    )
+
+
+def _probe(file_path: str) -> MediaInfo | None:
+    """在子进程中解析音频, 损坏或不存在时返回None."""
+    try:
+        return probe_mp4(file_path)
+    except (BrokenMediaException, OSError):
+        return None
+
+
+class MediaVerifier:
+    """音频校验消费者.
+
+    从redis stream批量读取任务, 在进程池中解析音频结构, 再批量更新音乐状态
+    pending -> ready/broken. 崩溃消费者未确认的任务超时后由其他消费者重新认领,
+    重新认领的任务逐个处理, 投递次数超过 max_deliveries 的任务不再解析, 直接标记为损坏.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        batch_size: int = 32,
+        claim_idle: int = 5 * 60 * 1000,
+        block: int = 5000,
+        max_deliveries: int = 3,
+    ) -> None:
+        """初始化.
+
+        Args:
+            workers (int, optional): 解析进程数.
+            batch_size (int, optional): 每批读取任务数.
+            claim_idle (int, optional): 任务未确认超过该毫秒数视为消费者崩溃, 重新认领.
+            block (int, optional): 阻塞读取毫秒数.
+            max_deliveries (int, optional): 最多投递次数, 超过后标记为损坏并确认.
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self.claim_idle = claim_idle
+        self.block = block
+        self.max_deliveries = max_deliveries
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._executor: ProcessPoolExecutor | None = None
+        self._task: asyncio.Task | None = None
+
+    async def ensure_group(self) -> None:
+        """创建消费组."""
+        try:
+            await redis.client.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def claim(self) -> List[Tuple[str, Dict[str, str]]]:
+        """认领崩溃消费者遗留的任务.
+
+        Returns:
+            List[Tuple[str, Dict[str, str]]]: 任务列表.
+        """
+        result = await redis.client.xautoclaim(
+            STREAM,
+            GROUP,
+            self.consumer,
+            min_idle_time=self.claim_idle,
+            start_id="0-0",
+            count=self.batch_size,
+        )
+        return result[1]
+
+    async def deliveries(self, entry_ids: List[str]) -> Dict[str, int]:
+        """查询本消费者认领的任务的投递次数.
+
+        Args:
+            entry_ids (List[str]): 任务ID列表.
+
+        Returns:
+            Dict[str, int]: 任务ID -> 投递次数.
+        """
+        if not entry_ids:
+            return {}
+        # 逐个查询, 区间查询的结果会被其它消费者或区间内其它未确认的任务占满
+        async with redis.client.pipeline(transaction=False) as pipe:
+            for entry_id in entry_ids:
+                pipe.xpending_range(STREAM, GROUP, min=entry_id, max=entry_id, count=1, consumername=self.consumer)
+            results = await pipe.execute()
+        return {item["message_id"]: item["times_delivered"] for pending in results for item in pending}
+
+    async def read(self) -> List[Tuple[str, Dict[str, str]]]:
+        """读取新任务.
+
+        Returns:
+            List[Tuple[str, Dict[str, str]]]: 任务列表.
+        """
+        result = await redis.client.xreadgroup(
+            GROUP,
+            self.consumer,
+            {STREAM: ">"},
+            count=self.batch_size,
+            block=self.block,
+        )
+        if not result:
+            return []
+        return result[0][1]
+
+    async def process(self, entries: List[Tuple[str, Dict[str, str]]], skip_probe: bool = False) -> None:
+        """解析一批音频并批量更新状态.
+
+        Args:
+            entries (List[Tuple[str, Dict[str, str]]]): 任务列表.
+            skip_probe (bool, optional): 不解析, 直接标记为损坏.
+        """
+        # 已被删除的任务直接确认
+        deleted = [entry_id for entry_id, fields in entries if not fields]
+        if deleted:
+            await redis.client.xack(STREAM, GROUP, *deleted)
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if not entries:
+            return
+        if skip_probe:
+            results = [None] * len(entries)
+        else:
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(self._executor, _probe, fields["path"])
+                for _, fields in entries
+            ])
+        # 旧任务没有sha256, 按音乐ID更新
+        infos = {fields["music_id"]: info for (_, fields), info in zip(entries, results) if not fields.get("sha256")}
+        blob_infos = {fields["sha256"]: info for (_, fields), info in zip(entries, results) if fields.get("sha256")}
+        blobs = await models.AudioBlob.filter(sha256__in=list(blob_infos)).only("sha256", "status", "duration", "bitrate")
+        # 引用同一音频的音乐复用校验结果
+        musics = await models.Music.filter(
+            Q(sha256__in=list(blob_infos)) | Q(id__in=list(infos))
+        ).only("id", "name", "singer", "sha256", "status", "duration", "bitrate", "updated_at")
+        # bulk_update 不会自动更新 updated_at, 手动设置, 搜索索引按 updated_at 增量同步
+        now = timezone.now()
+        for music in musics:
+            music.updated_at = now
+        for item in [*blobs, *musics]:
+            info = blob_infos[item.sha256] if item.sha256 in blob_infos else infos[str(item.id)]
+            if info is None:
+                item.status = MusicStatus.broken
+            else:
+                item.status = MusicStatus.ready
+                item.duration = info.duration
+                item.bitrate = info.bitrate
+        if blobs:
+            await models.AudioBlob.bulk_update(blobs, fields=["status", "duration", "bitrate"])
+        if musics:
+            await models.Music.bulk_update(musics, fields=["status", "duration", "bitrate", "updated_at"])
+            # 其它worker的索引通过增量同步更新
+            for music in musics:
+                search_index.add(music.id, music.name, music.singer, music.status)
+            await music_cache.invalidate(*[music.id for music in musics])
+            await playlist_cache.music_changed([music.id for music in musics])
+        await redis.client.xack(STREAM, GROUP, *[entry_id for entry_id, _ in entries])
+        broken = sum(1 for info in results if info is None)
+        log.info(f"media verify {len(entries)} jobs, {broken} broken")
+
+    async def process_claimed(self, entries: List[Tuple[str, Dict[str, str]]]) -> None:
+        """逐个处理重新认领的任务, 导致解析进程崩溃或处理出错的任务不会连累同批的其它任务.
+
+        Args:
+            entries (List[Tuple[str, Dict[str, str]]]): 重新认领的任务列表.
+        """
+        deliveries = await self.deliveries([entry_id for entry_id, _ in entries])
+        for entry in entries:
+            # xautoclaim 认领时已计入本次投递
+            if deliveries.get(entry[0], 0) > self.max_deliveries:
+                log.warning(f"media verify {entry[0]} delivered {deliveries[entry[0]]} times, mark broken")
+                await self.process([entry], skip_probe=True)
+            else:
+                await self.process([entry])
+
+    async def run(self) -> None:
+        """持续消费任务."""
+        await self.ensure_group()
+        while True:
+            try:
+                claimed = await self.claim()
+                if claimed:
+                    await self.process_claimed(claimed)
+                    continue
+                entries = await self.read()
+                if entries:
+                    await self.process(entries)
+            except asyncio.CancelledError:
+                raise
+            except BrokenProcessPool:
+                # 解析进程崩溃, 重建进程池, 未确认的任务稍后被重新认领
+                log.exception("media verify process pool broken")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            except Exception:
+                log.exception("media verify failed")
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        """启动消费任务."""
+        if self._task is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """停止消费任务."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+media_verifier = MediaVerifier(
+    workers=MEDIA_VERIFY_WORKERS,
+    batch_size=MEDIA_VERIFY_BATCH_SIZE,
+    claim_idle=MEDIA_VERIFY_CLAIM_IDLE,
+    max_deliveries=MEDIA_VERIFY_MAX_DELIVERIES,
+)
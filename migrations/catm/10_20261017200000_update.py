@@ -0,0 +1,11 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `key_pair` ADD `algorithm` VARCHAR(16) NOT NULL  COMMENT '签名算法' DEFAULT 'PS256';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `key_pair` DROP COLUMN `algorithm`;"""
@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `music` (
+    `id` CHAR(36) NOT NULL  PRIMARY KEY COMMENT '音乐ID',
+    `name` VARCHAR(128) NOT NULL  COMMENT '音乐名称',
+    `play_url` VARCHAR(128)   COMMENT '播放链接',
+    `singer` JSON   COMMENT '歌手',
+    `status` VARCHAR(32) NOT NULL  COMMENT '状态',
+    `creator` CHAR(36) NOT NULL  COMMENT '创建者ID',
+    `sha256` VARCHAR(64)   COMMENT '音频sha256',
+    `size` BIGINT   COMMENT '音频大小',
+    `mime` VARCHAR(64)   COMMENT '音频媒体类型',
+    `created_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6),
+    `updated_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+) CHARACTER SET utf8mb4 COMMENT='音乐表';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `music`;"""
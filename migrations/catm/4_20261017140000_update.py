@@ -0,0 +1,13 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `music` ADD `duration` DOUBLE   COMMENT '时长(秒)';
+        ALTER TABLE `music` ADD `bitrate` INT   COMMENT '码率(bit/s)';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `music` DROP COLUMN `duration`;
+        ALTER TABLE `music` DROP COLUMN `bitrate`;"""
@@ -0,0 +1,11 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `music` ADD INDEX `idx_music_creator_153f70` (`creator`, `created_at`, `id`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `music` DROP INDEX `idx_music_creator_153f70`;"""
@@ -0,0 +1,20 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `music_event` (
+    `id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `user_id` CHAR(36) NOT NULL  COMMENT '用户ID',
+    `music_id` CHAR(36) NOT NULL  COMMENT '音乐ID',
+    `type` VARCHAR(16) NOT NULL  COMMENT '事件类型',
+    `value` INT   COMMENT '事件值, 例如播放进度(秒)',
+    `occurred_at` DATETIME(6) NOT NULL  COMMENT '事件发生时间',
+    `created_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6),
+    KEY `idx_music_event_music_i_30e547` (`music_id`, `type`, `occurred_at`)
+) CHARACTER SET utf8mb4 COMMENT='音乐行为事件表';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `music_event`;"""
@@ -0,0 +1,28 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `playlist` (
+    `id` CHAR(36) NOT NULL  PRIMARY KEY COMMENT '榜单ID',
+    `name` VARCHAR(128) NOT NULL  COMMENT '榜单名称',
+    `description` VARCHAR(1024)   COMMENT '榜单描述',
+    `creator` CHAR(36) NOT NULL  COMMENT '创建者ID',
+    `version` INT NOT NULL  COMMENT '物化版本号, 内容变化时递增' DEFAULT 1,
+    `created_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6),
+    `updated_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+) CHARACTER SET utf8mb4 COMMENT='推荐榜单表';
+        CREATE TABLE IF NOT EXISTS `playlist_music` (
+    `id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `playlist_id` CHAR(36) NOT NULL  COMMENT '榜单ID',
+    `music_id` CHAR(36) NOT NULL  COMMENT '音乐ID',
+    `position` INT NOT NULL  COMMENT '排序位置',
+    UNIQUE KEY `uid_playlist_mu_playlis_12dfa3` (`playlist_id`, `music_id`),
+    KEY `idx_playlist_mu_music_i_056332` (`music_id`)
+) CHARACTER SET utf8mb4 COMMENT='榜单音乐表';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `playlist`;
+        DROP TABLE IF EXISTS `playlist_music`;"""
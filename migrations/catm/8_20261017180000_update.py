@@ -0,0 +1,30 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `comment` (
+    `id` CHAR(36) NOT NULL  PRIMARY KEY COMMENT '评论ID',
+    `target_type` VARCHAR(16) NOT NULL  COMMENT '评论对象类型',
+    `target_id` CHAR(36) NOT NULL  COMMENT '评论对象ID',
+    `user_id` CHAR(36) NOT NULL  COMMENT '评论用户ID',
+    `parent_id` CHAR(36)   COMMENT '回复的评论ID',
+    `content` VARCHAR(1024) NOT NULL  COMMENT '评论内容',
+    `reply_count` INT NOT NULL  COMMENT '回复数' DEFAULT 0,
+    `created_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6),
+    KEY `idx_comment_target__bf7f7e` (`target_type`, `target_id`, `created_at`),
+    KEY `idx_comment_parent__3108fb` (`parent_id`, `created_at`)
+) CHARACTER SET utf8mb4 COMMENT='评论表';
+        CREATE TABLE IF NOT EXISTS `comment_counter` (
+    `id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `target_type` VARCHAR(16) NOT NULL  COMMENT '评论对象类型',
+    `target_id` CHAR(36) NOT NULL  COMMENT '评论对象ID',
+    `count` INT NOT NULL  COMMENT '评论数' DEFAULT 0,
+    UNIQUE KEY `uid_comment_cou_target__4b3a14` (`target_type`, `target_id`)
+) CHARACTER SET utf8mb4 COMMENT='评论数表, 由redis计数定时写入';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `comment`;
+        DROP TABLE IF EXISTS `comment_counter`;"""
@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `music` ADD INDEX `idx_music_sha256_8c1da5` (`sha256`);
+        CREATE TABLE IF NOT EXISTS `audio_blob` (
+    `sha256` VARCHAR(64) NOT NULL  PRIMARY KEY COMMENT '音频sha256',
+    `size` BIGINT NOT NULL  COMMENT '音频大小',
+    `ref_count` INT NOT NULL  COMMENT '引用的音乐数' DEFAULT 0,
+    `status` VARCHAR(32) NOT NULL  COMMENT '校验状态',
+    `duration` DOUBLE   COMMENT '时长(秒)',
+    `bitrate` INT   COMMENT '码率(bit/s)',
+    `created_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6),
+    `updated_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    KEY `idx_audio_blob_ref_cou_b34157` (`ref_count`, `updated_at`)
+) CHARACTER SET utf8mb4 COMMENT='音频文件表, 相同内容只存储一份';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `music` DROP INDEX `idx_music_sha256_8c1da5`;
+        DROP TABLE IF EXISTS `audio_blob`;"""
@@ -0,0 +1,36 @@
+"""测试配置"""
+import os
+import tempfile
+
+import pytest
+
+# catm.settings 导入时读取, 需在导入catm之前设置
+os.environ.setdefault("FILE_STORAGE", tempfile.mkdtemp(prefix="catm-test-"))
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """模块均通过 catm.redis.client 访问redis, 替换为内存实现."""
+    import fakeredis
+
+    from catm import redis
+
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis, "client", client)
+    return client
+
+
+@pytest.fixture
+async def db():
+    """内存sqlite数据库."""
+    from tortoise import Tortoise
+
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["catm.models"]})
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise.close_connections()
@@ -0,0 +1,65 @@
+"""进程内缓存测试"""
+import time
+
+from catm.cache import TTLCache
+
+
+def test_get_set_and_stats():
+    cache: TTLCache[int] = TTLCache(maxsize=4)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("b", 0) == 0
+    assert cache.info() == {"hits": 1, "misses": 2, "size": 1, "maxsize": 4}
+
+
+def test_evicts_least_recently_used():
+    cache: TTLCache[int] = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # 访问后 a 变为最近使用, 淘汰 b
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_default_ttl_expires(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache: TTLCache[int] = TTLCache(ttl=10)
+    cache.set("a", 1)
+    monkeypatch.setattr(time, "time", lambda: now + 9.9)
+    assert cache.get("a") == 1
+    monkeypatch.setattr(time, "time", lambda: now + 10)
+    assert cache.get("a") is None
+    # 过期条目在读取时删除
+    assert len(cache) == 0
+
+
+def test_expire_at_overrides_ttl(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache: TTLCache[int] = TTLCache(ttl=10)
+    cache.set("a", 1, expire_at=now + 60)
+    monkeypatch.setattr(time, "time", lambda: now + 30)
+    assert cache.get("a") == 1
+
+
+def test_no_ttl_never_expires(monkeypatch):
+    cache: TTLCache[int] = TTLCache()
+    cache.set("a", 1)
+    monkeypatch.setattr(time, "time", lambda: float("inf"))
+    assert cache.get("a") == 1
+
+
+def test_pop_and_clear():
+    cache: TTLCache[int] = TTLCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", -1) == -1
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,89 @@
+"""行为事件批量写入测试"""
+from uuid import uuid4
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from catm import models, schemas
+from catm.events import EventBuffer, clamp_occurred_at
+
+
+NOW = datetime(2026, 10, 17, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "occurred_at, expected",
+    [
+        (None, NOW),
+        (NOW - timedelta(hours=1), NOW - timedelta(hours=1)),
+        # 不带时区按UTC
+        (datetime(2026, 10, 17, 11, 0), NOW - timedelta(hours=1)),
+        (NOW + timedelta(days=365), NOW),
+        (NOW - timedelta(days=365), NOW - timedelta(days=1)),
+    ],
+)
+def test_clamp_occurred_at(occurred_at, expected):
+    assert clamp_occurred_at(occurred_at, NOW, max_age=24 * 60 * 60) == expected
+
+
+@asynccontextmanager
+async def _no_transaction():
+    yield None
+
+
+def _events(count: int) -> list:
+    return [schemas.MusicEvent(music_id=uuid4(), type="play") for _ in range(count)]
+
+
+@pytest.fixture
+def fail_once(monkeypatch):
+    """下一次写入数据库失败."""
+    bulk_create = models.MusicEvent.bulk_create
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(len(args[0]))
+        if len(calls) == 1:
+            raise ConnectionError("db down")
+        return bulk_create(*args, **kwargs)
+
+    monkeypatch.setattr(models.MusicEvent, "bulk_create", flaky)
+    return calls
+
+
+@pytest.mark.anyio
+async def test_failed_flush_is_retried(redis_client, db, fail_once):
+    buffer = EventBuffer(max_size=10, flush_size=5)
+    buffer.add(uuid4(), _events(3))
+    assert await buffer.flush() == 0
+    assert len(buffer.buffer) == 3 and buffer.failures == 1 and buffer.dropped == 0
+    # 失败的批次在新事件之前
+    first = buffer.buffer[0]
+    buffer.add(uuid4(), _events(2))
+    assert buffer.buffer[0] == first
+    assert await buffer.flush() == 5
+    assert await models.MusicEvent.all().count() == 5
+    assert buffer.failures == 0
+    stats = buffer.stats()
+    assert (stats["accepted"], stats["flushed"], stats["dropped"], stats["buffered"]) == (5, 5, 0, 0)
+
+
+@pytest.mark.anyio
+async def test_requeue_drops_only_overflow(monkeypatch):
+    buffer = EventBuffer(max_size=5, flush_size=5)
+    buffer.add(uuid4(), _events(4))
+    batch = list(buffer.buffer)
+
+    async def write(*args, **kwargs):
+        # 写入中缓冲区又接收了新事件, 失败的批次只能放回一部分
+        buffer.add(uuid4(), _events(1))
+        buffer.max_size = 3
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(models.MusicEvent, "bulk_create", write)
+    monkeypatch.setattr("catm.events.in_transaction", _no_transaction)
+    assert await buffer.flush() == 0
+    assert buffer.dropped == 2
+    assert buffer.buffer[:2] == batch[2:]
+    assert len(buffer.buffer) == 3
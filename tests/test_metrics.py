@@ -0,0 +1,88 @@
+"""Prometheus指标测试"""
+import json
+import time
+
+import pytest
+
+from catm.metrics import Registry, merge, render
+
+
+def _registry(worker: str) -> Registry:
+    registry = Registry(report_interval=15)
+    registry.worker = worker
+    registry.counter("requests_total", "请求数", ("route",))
+    registry.gauge("in_flight", "执行中")
+    registry.histogram("duration_seconds", "耗时", ("route",), buckets=(0.1, 1.0))
+    return registry
+
+
+def _observe(registry: Registry, route: str, *values: float) -> None:
+    for value in values:
+        registry.metrics["requests_total"].inc(route)
+        registry.metrics["duration_seconds"].observe(value, route)
+
+
+def test_histogram_buckets():
+    registry = _registry("a")
+    # 等于桶上限的值计入该桶
+    _observe(registry, "/a", 0.05, 0.1, 0.5, 5.0)
+    assert registry.metrics["duration_seconds"].samples[("/a",)] == [[2, 1, 1], 5.65, 4]
+
+
+def test_timer_observes_elapsed():
+    registry = _registry("a")
+    with registry.metrics["duration_seconds"].time("/a"):
+        pass
+    counts, total, count = registry.metrics["duration_seconds"].samples[("/a",)]
+    assert counts[0] == 1 and count == 1 and total >= 0
+
+
+def test_merge_sums_workers():
+    a, b = _registry("a"), _registry("b")
+    _observe(a, "/a", 0.05)
+    _observe(b, "/a", 0.5)
+    _observe(b, "/b", 5.0)
+    a.metrics["in_flight"].inc()
+    b.metrics["in_flight"].inc(amount=2)
+    # 快照经过json序列化, 标签为列表
+    merged = merge([json.loads(json.dumps(a.snapshot())), json.loads(json.dumps(b.snapshot()))])
+    assert merged["requests_total"]["samples"] == {("/a",): 2, ("/b",): 1}
+    assert merged["in_flight"]["samples"] == {(): 3}
+    assert merged["duration_seconds"]["samples"][("/a",)] == [[1, 1, 0], 0.55, 2]
+    assert merged["duration_seconds"]["samples"][("/b",)] == [[0, 0, 1], 5.0, 1]
+
+
+def test_render():
+    registry = _registry("a")
+    _observe(registry, '/say "hi"\\', 0.05, 0.5)
+    registry.metrics["in_flight"].inc()
+    text = render(merge([registry.snapshot()]))
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    assert lines[:2] == ["# HELP duration_seconds 耗时", "# TYPE duration_seconds histogram"]
+    route = 'route="/say \\"hi\\"\\\\"'
+    # 桶为累计数量
+    assert f'duration_seconds_bucket{{{route},le="0.1"}} 1' in lines
+    assert f'duration_seconds_bucket{{{route},le="1.0"}} 2' in lines
+    assert f'duration_seconds_bucket{{{route},le="+Inf"}} 2' in lines
+    assert f"duration_seconds_sum{{{route}}} 0.55" in lines
+    assert f"duration_seconds_count{{{route}}} 2" in lines
+    assert "in_flight 1" in lines
+    assert f"requests_total{{{route}}} 2" in lines
+
+
+@pytest.mark.anyio
+async def test_collect_merges_live_workers_and_drops_stale(redis_client):
+    a, b, stale = _registry("a"), _registry("b"), _registry("stale")
+    _observe(a, "/a", 0.05)
+    _observe(b, "/a", 0.05)
+    _observe(stale, "/a", 0.05)
+    await b.report()
+    await redis_client.hset(
+        a.key,
+        stale.worker,
+        json.dumps({"at": time.time() - a.report_interval * 3 - 1, "metrics": stale.snapshot()}),
+    )
+    text = await a.collect()
+    assert 'requests_total{route="/a"} 2' in text.splitlines()
+    assert await redis_client.hkeys(a.key) == ["b"]
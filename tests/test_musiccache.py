@@ -0,0 +1,62 @@
+"""音乐信息缓存测试"""
+from uuid import uuid4
+
+import pytest
+
+from catm import models
+from catm.musiccache import MusicCache
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def cache(redis_client, db) -> MusicCache:
+    return MusicCache()
+
+
+async def _music(name: str = "晴天") -> models.Music:
+    return await models.Music.create(name=name, creator=uuid4(), status="ready")
+
+
+async def test_read_through_and_negative_cache(cache, redis_client):
+    music, missing = await _music(), str(uuid4())
+    result = await cache.get_many([music.id, missing, music.id])
+    assert list(result) == [str(music.id), missing]
+    assert result[str(music.id)]["name"] == "晴天"
+    assert result[missing] is None
+    assert await redis_client.get(cache.key(missing)) == ""
+    # 数据库修改未失效前命中缓存
+    await models.Music.filter(id=music.id).update(name="稻香")
+    cache.local.clear()
+    assert (await cache.get(music.id))["name"] == "晴天"
+    await cache.invalidate(music.id)
+    assert (await cache.get(music.id))["name"] == "稻香"
+
+
+async def test_fill_after_invalidate_is_not_cached(cache, redis_client):
+    music = await _music()
+    fill = cache.script
+
+    async def invalidate_during_query(**kwargs):
+        # 查询数据库之后, 写入缓存之前, 其它请求修改了音乐
+        await models.Music.filter(id=music.id).update(name="稻香")
+        await cache.invalidate(music.id)
+        return await fill(**kwargs)
+
+    cache.script = invalidate_during_query
+    assert (await cache.get(music.id))["name"] == "晴天"
+    cache.script = fill
+    assert await redis_client.get(cache.key(str(music.id))) is None
+    assert cache.local.get(str(music.id)) is None
+    assert (await cache.get(music.id))["name"] == "稻香"
+
+
+async def test_returns_independent_copies(cache):
+    music = await _music()
+    first = await cache.get(music.id)
+    first["name"] = "改"
+    first["singer"] = ["改"]
+    assert (await cache.get(music.id))["name"] == "晴天"
+    cache.local.clear()
+    assert (await cache.get(music.id))["name"] == "晴天"
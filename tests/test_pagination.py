@@ -0,0 +1,41 @@
+"""游标分页测试"""
+from uuid import uuid4
+from datetime import datetime, timezone
+
+import pytest
+
+from catm.auth import base64url_encode
+from catm.pagination import encode_cursor, decode_cursor
+from catm.exceptions import InvalidCursorException
+
+
+def test_round_trip():
+    created_at = datetime(2024, 3, 1, 12, 30, tzinfo=timezone.utc)
+    id = uuid4()
+    cursor = encode_cursor(created_at.isoformat(), id)
+    assert decode_cursor(cursor, 2) == [created_at.isoformat(), str(id)]
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor("\xff" * 64, 2**60)
+    assert "=" not in cursor
+    assert "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor, 2) == ["\xff" * 64, 2**60]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "not a cursor!",
+        base64url_encode(b"{not json").decode(),
+        # 不是列表
+        base64url_encode(b'{"a": 1}').decode(),
+        # 排序键数量不一致
+        encode_cursor("2024-03-01T12:30:00"),
+        encode_cursor("2024-03-01T12:30:00", "id", "extra"),
+    ],
+)
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(cursor, 2)
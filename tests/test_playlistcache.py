@@ -0,0 +1,29 @@
+"""榜单物化缓存测试"""
+import json
+from uuid import uuid4
+
+import pytest
+
+from catm import models
+from catm.playlistcache import PlaylistCache
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_build_and_read(redis_client, db):
+    playlist = await models.Playlist.create(name="夏日", creator=uuid4())
+    musics = [await models.Music.create(name=name, creator=uuid4(), status="ready") for name in ("晴天", "稻香")]
+    for position, music in enumerate(reversed(musics)):
+        await models.PlaylistMusic.create(playlist_id=playlist.id, music_id=music.id, position=position)
+    cache = PlaylistCache()
+    built = await cache.build(playlist.id)
+    data = json.loads(built.body)
+    assert data["id"] == str(playlist.id)
+    assert data["created_at"] == playlist.created_at.isoformat()
+    assert [music["name"] for music in data["musics"]] == ["稻香", "晴天"]
+    # 不转义中文
+    assert "夏日".encode() in built.body
+    cache.local.clear()
+    assert await cache.get(playlist.id) == built
+    assert await cache.get(uuid4()) is None
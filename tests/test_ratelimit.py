@@ -0,0 +1,135 @@
+"""限流和准入控制测试"""
+import asyncio
+
+import pytest
+
+from catm.ratelimit import AdmissionGate, SlidingWindowLimiter, retry_after
+from catm.exceptions import ServerBusyException, TooManyAttemptsException
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("seconds, expected", [(0, "1"), (0.2, "1"), (1.0, "1"), (1.01, "2"), (59.5, "60")])
+def test_retry_after(seconds, expected):
+    assert retry_after(seconds) == expected
+
+
+@pytest.fixture
+def limiter(redis_client) -> SlidingWindowLimiter:
+    return SlidingWindowLimiter("test", limit=3, window=60)
+
+
+async def test_hit_limits_within_window(limiter):
+    for _ in range(3):
+        await limiter.hit("1.2.3.4")
+    with pytest.raises(TooManyAttemptsException) as e:
+        await limiter.hit("1.2.3.4")
+    assert 0 < e.value.retry_after <= 60
+    # 其它标识不受影响
+    await limiter.hit("5.6.7.8")
+
+
+async def test_rejected_hits_are_not_recorded(limiter, redis_client):
+    for _ in range(3):
+        await limiter.hit("ip")
+    for _ in range(2):
+        with pytest.raises(TooManyAttemptsException):
+            await limiter.hit("ip")
+    assert await redis_client.zcard(limiter.key("ip")) == 3
+    assert 0 < await redis_client.pttl(limiter.key("ip")) <= 60 * 1000
+
+
+async def test_window_slides(limiter, redis_client):
+    key = limiter.key("ip")
+    await limiter.hit("ip")
+    await limiter.hit("ip")
+    # 窗口外的旧记录被移除
+    await redis_client.zadd(key, {"old": 0})
+    await limiter.hit("ip")
+    assert await redis_client.zscore(key, "old") is None
+
+
+async def test_concurrent_hits_do_not_exceed_limit(limiter):
+    results = await asyncio.gather(*[limiter.hit("user") for _ in range(10)], return_exceptions=True)
+    assert sum(1 for result in results if isinstance(result, str)) == 3
+    assert sum(1 for result in results if isinstance(result, TooManyAttemptsException)) == 7
+
+
+async def test_refund_and_reset(limiter, redis_client):
+    attempts = [await limiter.hit("user") for _ in range(3)]
+    with pytest.raises(TooManyAttemptsException):
+        await limiter.hit("user")
+    await limiter.refund("user", attempts[0])
+    assert await redis_client.zcard(limiter.key("user")) == 2
+    await limiter.hit("user")
+    await limiter.reset("user")
+    assert await redis_client.exists(limiter.key("user")) == 0
+
+
+async def test_username_attempt_refunds_when_busy(redis_client, monkeypatch):
+    from catm.api import user
+
+    limiter = SlidingWindowLimiter("test", limit=3, window=60)
+    monkeypatch.setattr(user, "auth_username_limiter", limiter)
+    attempt = await limiter.hit("user")
+    with pytest.raises(ServerBusyException):
+        async with user.username_attempt("user", attempt):
+            raise ServerBusyException()
+    assert await redis_client.zcard(limiter.key("user")) == 0
+    # 密码错误时保留计数
+    attempt = await limiter.hit("user")
+    async with user.username_attempt("user", attempt):
+        pass
+    assert await redis_client.zcard(limiter.key("user")) == 1
+
+
+async def test_gate_limits_concurrency():
+    gate = AdmissionGate("test", concurrency=2, queue_size=10, timeout=1)
+    running = peak = 0
+
+    async def job():
+        nonlocal running, peak
+        async with gate:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*[job() for _ in range(6)])
+    assert peak == 2
+    assert gate.waiting == 0
+    assert not gate.semaphore.locked()
+
+
+async def test_gate_rejects_when_queue_full():
+    gate = AdmissionGate("test", concurrency=1, queue_size=1, timeout=1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with gate:
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert gate.waiting == 1
+    with pytest.raises(ServerBusyException):
+        async with gate:
+            pass
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert gate.waiting == 0
+
+
+async def test_gate_rejects_on_timeout():
+    gate = AdmissionGate("test", concurrency=1, queue_size=1, timeout=0.01)
+    async with gate:
+        with pytest.raises(ServerBusyException):
+            async with gate:
+                pass
+        assert gate.waiting == 0
+    # 超时的请求没有占用并发数
+    async with gate:
+        pass
@@ -0,0 +1,143 @@
+"""文件响应测试"""
+import os
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+from starlette.datastructures import Headers
+
+from catm.response import RangeFileResponse, is_not_modified, parse_range
+from catm.exceptions import RangeNotSatisfiableException
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", [(0, 100)]),
+        ("bytes=100-", [(100, 1000)]),
+        ("bytes=-100", [(900, 1000)]),
+        # 后缀超过文件大小时返回整个文件
+        ("bytes=-5000", [(0, 1000)]),
+        # 结束位置超过文件大小时截断
+        ("bytes=900-5000", [(900, 1000)]),
+        ("BYTES = 0-0", [(0, 1)]),
+        ("bytes=0-9, 20-29", [(0, 10), (20, 30)]),
+        # 重叠和相邻区间合并, 按起始位置排序
+        ("bytes=20-29,0-9,5-14", [(0, 15), (20, 30)]),
+        ("bytes=0-9,10-19", [(0, 20)]),
+        # 超出文件范围的区间忽略
+        ("bytes=0-9,5000-6000", [(0, 10)]),
+        ("bytes=-0,0-9", [(0, 10)]),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize(
+    "header",
+    ["items=0-9", "bytes=", "bytes=abc", "bytes=5", "bytes=10-5", "bytes=a-b", "bytes=-x"],
+)
+def test_parse_range_invalid_is_ignored(header):
+    assert parse_range(header, 1000) is None
+
+
+def test_parse_range_too_many_ranges_is_ignored():
+    header = "bytes=" + ",".join(f"{i * 10}-{i * 10}" for i in range(17))
+    assert parse_range(header, 1000) is None
+    assert len(parse_range(header, 1000, max_ranges=17)) == 17
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"if-none-match": '"p-2"'}, True),
+        ({"if-none-match": 'W/"p-2"'}, True),
+        ({"if-none-match": '"p-1", W/"p-2"'}, True),
+        ({"if-none-match": "*"}, True),
+        ({"if-none-match": '"p-1"'}, False),
+        # 只有etag时忽略 if-modified-since
+        ({"if-modified-since": "Sat, 17 Oct 2026 12:00:00 GMT"}, False),
+        ({}, False),
+    ],
+)
+def test_is_not_modified_etag_only(headers, expected):
+    assert is_not_modified(Headers(headers), {"etag": '"p-2"'}) is expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-3000", "bytes=-0", "bytes=1000-1999,-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiableException):
+        parse_range(header, 1000)
+
+
+@pytest.fixture
+def client(tmp_path):
+    data = bytes(range(256)) * 4
+    path = tmp_path / "audio.m4a"
+    path.write_bytes(data)
+
+    async def endpoint(request: Request):
+        return RangeFileResponse(str(path), request.headers.get("range"), media_type="audio/mp4")
+
+    app = Starlette(routes=[Route("/file", endpoint, methods=["GET", "HEAD"])])
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test"), data
+
+
+@pytest.mark.anyio
+async def test_full_response(client):
+    client, data = client
+    response = await client.get("/file")
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == data
+
+
+@pytest.mark.anyio
+async def test_single_range(client):
+    client, data = client
+    response = await client.get("/file", headers={"range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {len(data) - 10}-{len(data) - 1}/{len(data)}"
+    assert response.content == data[-10:]
+
+
+@pytest.mark.anyio
+async def test_multipart_ranges(client):
+    client, data = client
+    response = await client.get("/file", headers={"range": "bytes=0-3,100-109"})
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.partition("boundary=")[2].encode()
+    body = response.content
+    assert int(response.headers["content-length"]) == len(body)
+    assert body.endswith(b"--" + boundary + b"--\r\n")
+    parts = body.split(b"--" + boundary)[1:-1]
+    assert len(parts) == 2
+    for part, (start, end) in zip(parts, [(0, 4), (100, 110)]):
+        head, _, content = part.partition(b"\r\n\r\n")
+        assert b"content-type: audio/mp4" in head
+        assert f"content-range: bytes {start}-{end - 1}/{len(data)}".encode() in head
+        assert content == data[start:end] + b"\r\n"
+
+
+@pytest.mark.anyio
+async def test_range_not_satisfiable(client):
+    client, data = client
+    response = await client.get("/file", headers={"range": f"bytes={len(data)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(data)}"
+    assert response.content == b""
+
+
+@pytest.mark.anyio
+async def test_head_has_no_body(client):
+    client, data = client
+    response = await client.head("/file", headers={"range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "10"
+    assert response.content == b""
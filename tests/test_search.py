@@ -0,0 +1,91 @@
+"""搜索索引测试"""
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from catm.constants import MusicStatus
+from catm.search import SNAPSHOT_VERSION, SearchIndex, normalize, tokenize, query_tokens
+
+
+@pytest.fixture
+def index(tmp_path) -> SearchIndex:
+    index = SearchIndex(str(tmp_path / "music.snapshot"))
+    index.add("1", "晴天", ["周杰伦"], MusicStatus.ready)
+    index.add("2", "晴天娃娃", ["某歌手"], MusicStatus.ready)
+    index.add("3", "说好的晴天", ["某歌手"], MusicStatus.ready)
+    index.add("4", "Yesterday", ["The Beatles"], MusicStatus.ready)
+    index.add("5", "七里香", ["周杰伦"], MusicStatus.ready)
+    index.add("6", "晴天", ["翻唱"], MusicStatus.pending)
+    return index
+
+
+def test_normalize_and_tokenize():
+    assert normalize("ＡＢＣ Def") == "abc def"
+    assert tokenize("晴天 ab") == {"晴", "天", "晴天", "a", "b", "ab"}
+    assert query_tokens("晴天 a") == {"晴天", "a"}
+
+
+def test_rank_order(index):
+    # 完全匹配 > 前缀匹配 > 包含
+    assert index.search("晴天") == (["1", "2", "3"], False)
+
+
+def test_matches_singer_and_ignores_case(index):
+    ids, _ = index.search("周杰伦")
+    assert sorted(ids) == ["1", "5"]
+    assert index.search("ＹＥＳＴＥＲ") == (["4"], False)
+    assert index.search("beatles") == (["4"], False)
+
+
+def test_all_words_must_match(index):
+    assert index.search("晴天 周杰伦") == (["1"], False)
+    assert index.search("晴天 七里香") == ([], False)
+    # 倒排表命中但原文不连续的词不匹配
+    assert index.search("天晴") == ([], False)
+
+
+def test_status_filter(index):
+    assert "6" not in index.search("晴天")[0]
+    assert "6" in index.search("晴天", status=None)[0]
+
+
+def test_popularity_breaks_ties(index):
+    index.add("7", "晴天", ["另一个"], MusicStatus.ready)
+    index.popularity = {"7": 10.0}
+    assert index.search("晴天")[0][:2] == ["7", "1"]
+
+
+def test_pagination(index):
+    assert index.search("晴天", limit=2) == (["1", "2"], True)
+    assert index.search("晴天", limit=2, offset=2) == (["3"], False)
+
+
+def test_update_and_remove(index):
+    index.add("1", "稻香", ["周杰伦"], MusicStatus.ready)
+    assert index.search("晴天")[0] == ["2", "3"]
+    assert index.search("稻香")[0] == ["1"]
+    index.remove("1")
+    index.remove("missing")
+    assert index.search("稻香") == ([], False)
+    # 没有文档引用的词项被删除
+    assert "稻香" not in index.postings
+
+
+def test_empty_query(index):
+    assert index.search("  ,. ") == ([], False)
+    assert index.search("不存在") == ([], False)
+
+
+@pytest.mark.anyio
+async def test_snapshot_round_trip(index, tmp_path):
+    index.watermark = datetime(2026, 10, 17, 12, 30, tzinfo=timezone.utc)
+    await index.save()
+    # 快照为json, 加载时不会执行任意代码
+    assert json.loads((tmp_path / "music.snapshot").read_bytes())["version"] == SNAPSHOT_VERSION
+    restored = SearchIndex(str(tmp_path / "music.snapshot"))
+    assert restored._load_snapshot()
+    assert restored.docs == index.docs
+    assert restored.postings == index.postings
+    assert restored.watermark == index.watermark
+    assert restored.search("晴天") == index.search("晴天")
@@ -0,0 +1,54 @@
+"""请求链路追踪测试"""
+import asyncio
+
+import httpx
+import pytest
+from structlog.testing import capture_logs
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from catm.tracing import TRACE_HEADER, TracingMiddleware, span
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def slow_handler(request):
+    with span("db.query"):
+        await asyncio.sleep(0.06)
+    return PlainTextResponse("ok")
+
+
+async def slow_body(request):
+    async def body():
+        for _ in range(3):
+            await asyncio.sleep(0.03)
+            yield b"x"
+
+    return StreamingResponse(body())
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[Route("/slow", slow_handler), Route("/download", slow_body)])
+    transport = httpx.ASGITransport(app=TracingMiddleware(app, slow_threshold=50))
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+async def test_slow_request_logs_span_tree(client):
+    with capture_logs() as logs:
+        response = await client.get("/slow", headers={TRACE_HEADER: "upstream-trace-1"})
+    assert response.headers[TRACE_HEADER] == "upstream-trace-1"
+    [entry] = logs
+    assert entry["event"] == "slow request"
+    assert entry["trace_id"] == "upstream-trace-1"
+    assert entry["ms"] >= 50
+    assert [child["name"] for child in entry["spans"]] == ["db.query"]
+
+
+async def test_streaming_body_is_not_slow(client):
+    with capture_logs() as logs:
+        response = await client.get("/download")
+    assert response.content == b"xxx"
+    assert logs == []
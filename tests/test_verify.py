@@ -0,0 +1,51 @@
+"""音频校验队列测试"""
+import pytest
+
+from catm.verify import STREAM, GROUP, MediaVerifier
+
+
+pytestmark = pytest.mark.anyio
+
+
+def _verifier(consumer: str, **kwargs) -> MediaVerifier:
+    verifier = MediaVerifier(block=10, **kwargs)
+    verifier.consumer = consumer
+    return verifier
+
+
+async def _enqueue(redis_client, count: int) -> list:
+    return [
+        await redis_client.xadd(STREAM, {"music_id": str(i), "path": f"/tmp/{i}", "sha256": ""})
+        for i in range(count)
+    ]
+
+
+async def test_deliveries_only_counts_own_claims(redis_client):
+    crashed, alive = _verifier("crashed"), _verifier("alive")
+    await crashed.ensure_group()
+    ids = await _enqueue(redis_client, 3)
+    await crashed.read()
+    # 只认领首尾两个任务, 中间的任务仍属于崩溃的消费者
+    await redis_client.xclaim(STREAM, GROUP, alive.consumer, 0, [ids[0], ids[2]])
+    assert await alive.deliveries([ids[0], ids[2]]) == {ids[0]: 2, ids[2]: 2}
+    assert await crashed.deliveries([ids[1]]) == {ids[1]: 1}
+    assert await alive.deliveries([ids[1]]) == {}
+    assert await alive.deliveries([]) == {}
+
+
+async def test_process_claimed_skips_probe_after_max_deliveries(redis_client):
+    first, second = _verifier("first", max_deliveries=2), _verifier("second", max_deliveries=2)
+    await first.ensure_group()
+    ids = await _enqueue(redis_client, 2)
+    await first.read()
+    # 第一个任务再被重新投递两次, 第二个任务一次
+    await redis_client.xclaim(STREAM, GROUP, second.consumer, 0, ids)
+    await redis_client.xclaim(STREAM, GROUP, second.consumer, 0, [ids[0]])
+    processed = []
+
+    async def process(entries, skip_probe=False):
+        processed.extend((entry_id, skip_probe) for entry_id, _ in entries)
+
+    second.process = process
+    await second.process_claimed(await redis_client.xrange(STREAM))
+    assert processed == [(ids[0], True), (ids[1], False)]